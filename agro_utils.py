@@ -2,7 +2,11 @@
 # VERSÃO: GEMINI MASTER INTELLIGENCE (VPD + Fisiologia Avançada)
 
 import streamlit as st
+import functools
 import math
+import re
+import numpy as np
+import pandas as pd
 
 class AgroBrain:
     """
@@ -10,9 +14,14 @@ class AgroBrain:
     Responsável por transformar dados brutos em decisões de campo.
     """
     
+    # Texto padrão quando o banco não tem a informação
+    PADRAO_INFO = "Consulte a bula ou Engenheiro Agrônomo."
+
     # --- 1. INTELIGÊNCIA DE DADOS (ANTI-FALHA) ---
+    # Os registros do data_engine já chegam canonizados (ver data_engine.SINONIMOS);
+    # esta busca por sinônimos fica para dicionários vindos de outras fontes.
     @staticmethod
-    def get_info_segura(dicionario, lista_chaves, padrao="Consulte a bula ou Engenheiro Agrônomo."):
+    def get_info_segura(dicionario, lista_chaves, padrao=PADRAO_INFO):
         """
         Busca inteligente: tenta encontrar a informação por vários sinônimos.
         Se não achar nada, retorna um texto padrão seguro.
@@ -49,6 +58,25 @@ class AgroBrain:
         except:
             return 0.0
 
+    # --- 2B. STATUS DO COCKPIT (mesma régua na tela e no processamento em lote) ---
+    @staticmethod
+    def status_cockpit(temp, delta_t, vpd):
+        """Devolve {'temp': (texto, cor), 'delta_t': (...), 'vpd': (...)} para os KPIs."""
+        # Temperatura
+        t = ("Ótima ✅", "#16a34a") if 18 <= temp <= 32 else ("Crítica 🔥", "#dc2626")
+
+        # Delta T (Janela de Aplicação)
+        if 2 <= delta_t <= 8: d = ("APTO ✅", "#16a34a")
+        elif 8 < delta_t <= 10: d = ("ATENÇÃO ⚠️", "#ca8a04")
+        else: d = ("PARE 🛑", "#dc2626")
+
+        # VPD
+        if 0.5 <= vpd <= 1.5: v = ("Ideal 💧", "#2563eb") # Azul
+        elif vpd > 2.0: v = ("Estresse 🌵", "#dc2626") # Vermelho (Seco)
+        else: v = ("Baixo ☁️", "#ca8a04") # Amarelo (Muito Úmido/Doença)
+
+        return {"temp": t, "delta_t": d, "vpd": v}
+
     # --- 3. ANÁLISE CLIMÁTICA PARA PULVERIZAÇÃO (DELTA T + MODO DE AÇÃO) ---
     @staticmethod
     def analisar_risco_aplicacao(temp, umid, delta_t, tipo_produto="Sistêmico"):
@@ -86,85 +114,193 @@ class AgroBrain:
 
         return status_geral, cor_status, alertas
 
+    # --- 3B. AGENDADOR DE JANELAS (TODO O HORIZONTE DA PREVISÃO) ---
+    # Mesmas regras de analisar_risco_aplicacao, aplicadas a todos os slots de 3h
+    # e a todos os tipos de produto de uma vez. Ordem = gravidade.
+    STATUS_JANELA = ["APTO", "ATENÇÃO", "EVITAR", "PARE"]
+    COR_STATUS = {"APTO": "#16a34a", "ATENÇÃO": "#ca8a04", "EVITAR": "#ca8a04", "PARE": "#dc2626"}
+    LIMITANTES = ["-", "Delta T baixo (deriva/inversão)", "Delta T alto (evaporação)",
+                  "Delta T crítico (evaporação)", "Estresse fisiológico (VPD/temperatura)"]
+    # Orientação por fator limitante (mesmos textos de analisar_risco_aplicacao)
+    ORIENTACAO = {
+        "Delta T baixo (deriva/inversão)": "Gotas muito finas podem não decantar ou evaporar muito lentamente.",
+        "Delta T alto (evaporação)": "Obrigatório uso de óleo/adjuvante redutor de deriva.",
+        "Delta T crítico (evaporação)": "Perda imediata da gota. Aplicação proibida.",
+        "Estresse fisiológico (VPD/temperatura)": "Planta fechando estômatos. Produto sistêmico não será absorvido.",
+    }
+
+    @staticmethod
+    def calcular_vpd_vec(temp, umid):
+        """calcular_vpd para arrays (mesma fórmula, sem arredondamento, mínimo 0)."""
+        t = np.asarray(temp, dtype=float)
+        es = 0.6108 * np.exp((17.27 * t) / (t + 237.3))
+        return np.maximum(0.0, es - es * (np.asarray(umid, dtype=float) / 100.0))
+
+    @staticmethod
+    def avaliar_slots(df_3h, tipos):
+        """
+        Matriz de status por (tipo de produto x slot de 3h).
+        Devolve (tipos, status[T, N], limitante[T, N]) com códigos inteiros
+        indexando STATUS_JANELA e LIMITANTES.
+        """
+        tipos = list(dict.fromkeys(tipos or ["Sistêmico"]))
+        dt = df_3h['Delta T'].to_numpy(dtype=float)
+        temp = df_3h['Temp'].to_numpy(dtype=float)
+        vpd = AgroBrain.calcular_vpd_vec(temp, df_3h['Umid'].to_numpy(dtype=float))
+
+        # A. Delta T (vale para qualquer produto)
+        status = np.select([dt < 2, dt > 10, dt > 8], [3, 3, 1], 0)
+        limit = np.select([dt < 2, dt > 10, dt > 8], [1, 3, 2], 0)
+
+        # B. Fisiologia (só sistêmicos): rebaixa APTO para EVITAR
+        estresse = (vpd > 2.0) | (temp > 32)
+        evitar = (status == 0) & estresse
+        status_sist = np.where(evitar, 2, status)
+        limit_sist = np.where(evitar, 4, limit)
+
+        sist = np.array(["Sistêmico" in str(t) for t in tipos])[:, None]
+        return tipos, np.where(sist, status_sist, status), np.where(sist, limit_sist, limit)
+
+    @staticmethod
+    def agendar_janelas_aplicacao(df_3h, lista_produtos=None, tipos=None):
+        """
+        Janelas contíguas de aplicação para cada Tipo de produto da fase.
+
+        Slots consecutivos com o mesmo status e o mesmo fator limitante viram uma
+        janela (Inicio, Fim, Horas, Status, Limitante). O resultado vem ranqueado:
+        melhor status primeiro, depois janelas mais longas, depois as mais cedo.
+        """
+        colunas = ['Rank', 'Tipo', 'Inicio', 'Fim', 'Horas', 'Status', 'Cor', 'Limitante']
+        if df_3h is None or df_3h.empty:
+            return pd.DataFrame(columns=colunas)
+        if tipos is None:
+            tipos = [p.get('Tipo') or 'Geral' for p in (lista_produtos or []) if isinstance(p, dict)]
+        tipos, status, limit = AgroBrain.avaliar_slots(df_3h, tipos)
+
+        inicio_slot = df_3h['DataHora'].to_numpy()
+        fim_slot = inicio_slot + np.timedelta64(3, 'h')
+        n = status.shape[1]
+
+        # Run-length por linha: quebra onde status ou limitante muda
+        codigo = status * len(AgroBrain.LIMITANTES) + limit
+        quebra = np.ones_like(codigo, dtype=bool)
+        quebra[:, 1:] = codigo[:, 1:] != codigo[:, :-1]
+        lin, ini = np.nonzero(quebra)
+        fim = np.empty_like(ini)
+        fim[:-1] = np.where(lin[1:] == lin[:-1], ini[1:] - 1, n - 1)
+        fim[-1] = n - 1
+
+        st_cod = status[lin, ini]
+        df = pd.DataFrame({
+            'Tipo': np.array(tipos, dtype=object)[lin],
+            'Inicio': inicio_slot[ini],
+            'Fim': fim_slot[fim],
+            'Horas': (fim - ini + 1) * 3,
+            'Status': np.array(AgroBrain.STATUS_JANELA, dtype=object)[st_cod],
+            'Limitante': np.array(AgroBrain.LIMITANTES, dtype=object)[limit[lin, ini]],
+            '_grav': st_cod,
+        })
+        df['Cor'] = df['Status'].map(AgroBrain.COR_STATUS)
+        df = df.sort_values(['_grav', 'Horas', 'Inicio'], ascending=[True, False, True], kind='stable').reset_index(drop=True)
+        df['Rank'] = np.arange(1, len(df) + 1)
+        return df[colunas]
+
+    @staticmethod
+    def melhor_janela_por_tipo(df_janelas):
+        """Primeira janela do ranking de cada Tipo (o agendador já ordena por status, duração e início)."""
+        return df_janelas.drop_duplicates('Tipo', keep='first').reset_index(drop=True)
+
     # --- 4. RENDERIZADORES VISUAIS (HTML/CSS) ---
     @staticmethod
     def gerar_cartao_kpi(titulo, valor, unidade, status_texto, cor_status, tooltip=""):
-        """Gera o HTML do cartão de KPI do Cockpit."""
-        return f"""
-        <div class="kpi-box" title="{tooltip}">
-            <div class="kpi-header">{titulo}</div>
-            <div class="kpi-value">{valor}<span class="kpi-unit">{unidade}</span></div>
-            <div class="kpi-footer" style="background-color: {cor_status};">
-                {status_texto}
-            </div>
-        </div>
-        """
+        """Gera o HTML do cartão de KPI do Cockpit (memoizado pelos argumentos)."""
+        return _html_kpi(str(titulo), str(valor), str(unidade), str(status_texto), str(cor_status), str(tooltip))
+
+    @staticmethod
+    def gerar_painel_kpi(cartoes):
+        """Vários cartões (tuplas de argumentos de `gerar_cartao_kpi`) numa única linha HTML."""
+        return '<div class="kpi-grid">' + "".join(AgroBrain.gerar_cartao_kpi(*c) for c in cartoes) + '</div>'
+
+    @staticmethod
+    def html_protocolo_quimico(lista_produtos):
+        """HTML de todos os cards da fase numa string só (cada card memoizado pelo conteúdo)."""
+        return "".join(_html_produto(*_campos_produto(p)) for p in lista_produtos or [])
 
     @staticmethod
     def render_protocolo_quimico(lista_produtos):
         """
         Renderiza os cards de produtos químicos com blindagem visual e inteligência de cor.
+        A fase inteira vai ao navegador num único st.markdown.
         """
         if not lista_produtos:
             return st.warning("⚠️ Nenhum produto cadastrado especificamente para esta fase no banco de dados.")
-            
-        for prod in lista_produtos:
-            # Busca Inteligente de Dados
-            alvo = AgroBrain.get_info_segura(prod, ['Alvo', 'Doenca', 'Praga'], "Alvo Biológico")
-            ativo = AgroBrain.get_info_segura(prod, ['Ativo', 'Ingrediente', 'Produto'], "Ingrediente não informado")
-            estrategia = AgroBrain.get_info_segura(prod, ['Estrategia', 'Obs', 'Manejo', 'Nota'], "Seguir recomendação de bula.")
-            grupo = AgroBrain.get_info_segura(prod, ['Grupo', 'Codigos', 'Mecanismo'], "")
-            tipo = prod.get('Tipo', 'Geral')
-            
-            # Lógica de Cores Semântica
-            if "Químico" in tipo: 
-                cor_borda = "#ef4444"; bg_icon = "#fee2e2"; icone = "☠️" # Vermelho
-            elif "Biológico" in tipo: 
-                cor_borda = "#22c55e"; bg_icon = "#dcfce7"; icone = "🦠" # Verde
-            elif "Nutri" in tipo: 
-                cor_borda = "#eab308"; bg_icon = "#fef9c3"; icone = "⚡" # Amarelo
-            else:
-                cor_borda = "#3b82f6"; bg_icon = "#dbeafe"; icone = "🧪" # Azul
-            
-            # HTML Robusto
-            html_grupo = f'<span style="background:#f1f5f9; color:#64748b; padding:2px 6px; border-radius:4px; font-size:0.75rem; margin-left:10px;">🧬 {grupo}</span>' if grupo else ""
-            
-            st.markdown(f"""
-            <div style="
-                background: white; 
-                border-left: 5px solid {cor_borda}; 
-                border-radius: 8px; 
-                padding: 16px; 
-                margin-bottom: 12px; 
-                box-shadow: 0 2px 4px rgba(0,0,0,0.05); 
-                border: 1px solid #e2e8f0;">
-                
-                <div style="display:flex; align-items:flex-start; gap:15px;">
-                    <div style="
-                        background:{bg_icon}; 
-                        min-width: 45px; height: 45px; 
-                        border-radius: 50%; 
-                        display:flex; align-items:center; justify-content:center; 
-                        font-size:1.4rem;">
-                        {icone}
-                    </div>
-                    
-                    <div style="flex-grow:1;">
-                        <div style="display:flex; justify-content:space-between; align-items:center; flex-wrap:wrap;">
-                            <span style="font-weight:700; font-size:1.05rem; color:#1e293b;">{alvo}</span>
-                            <span style="background:{cor_borda}; color:white; padding:3px 8px; border-radius:12px; font-size:0.7rem; font-weight:700; text-transform:uppercase;">{tipo}</span>
-                        </div>
-                        
-                        <div style="margin-top:6px; color:#475569; font-size:0.95rem;">
-                            <b>Princípio Ativo:</b> {ativo} {html_grupo}
-                        </div>
-                        
-                        <div style="margin-top:10px; background:#f8fafc; padding:10px; border-radius:6px; border:1px dashed #cbd5e1;">
-                            <div style="font-size:0.85rem; color:#334155; line-height:1.5;">
-                                💡 <b>Estratégia Técnica:</b> {estrategia}
-                            </div>
-                        </div>
-                    </div>
-                </div>
+        st.markdown(AgroBrain.html_protocolo_quimico(lista_produtos), unsafe_allow_html=True)
+
+
+# --- 5. MODELOS HTML (compilados 1x na carga do módulo) ---
+def _compactar(html):
+    """Remove a indentação/quebras do modelo: menos bytes por rerun e nada vira bloco de código no Markdown."""
+    return re.sub(r"\s*\n\s*", " ", html).replace("> <", "><").strip()
+
+
+_TPL_KPI = _compactar("""
+<div class="kpi-box" title="{tooltip}">
+    <div class="kpi-header">{titulo}</div>
+    <div class="kpi-value">{valor}<span class="kpi-unit">{unidade}</span></div>
+    <div class="kpi-footer" style="background-color: {cor_status};">{status_texto}</div>
+</div>
+""")
+
+_TPL_GRUPO = '<span style="background:#f1f5f9; color:#64748b; padding:2px 6px; border-radius:4px; font-size:0.75rem; margin-left:10px;">🧬 {grupo}</span>'
+
+_TPL_PRODUTO = _compactar("""
+<div style="background: white; border-left: 5px solid {cor_borda}; border-radius: 8px; padding: 16px;
+    margin-bottom: 12px; box-shadow: 0 2px 4px rgba(0,0,0,0.05); border: 1px solid #e2e8f0;">
+    <div style="display:flex; align-items:flex-start; gap:15px;">
+        <div style="background:{bg_icon}; min-width: 45px; height: 45px; border-radius: 50%;
+            display:flex; align-items:center; justify-content:center; font-size:1.4rem;">{icone}</div>
+        <div style="flex-grow:1;">
+            <div style="display:flex; justify-content:space-between; align-items:center; flex-wrap:wrap;">
+                <span style="font-weight:700; font-size:1.05rem; color:#1e293b;">{alvo}</span>
+                <span style="background:{cor_borda}; color:white; padding:3px 8px; border-radius:12px; font-size:0.7rem; font-weight:700; text-transform:uppercase;">{tipo}</span>
+            </div>
+            <div style="margin-top:6px; color:#475569; font-size:0.95rem;">
+                <b>Princípio Ativo:</b> {ativo} {html_grupo}
             </div>
-            """, unsafe_allow_html=True)
+            <div style="margin-top:10px; background:#f8fafc; padding:10px; border-radius:6px; border:1px dashed #cbd5e1;">
+                <div style="font-size:0.85rem; color:#334155; line-height:1.5;">💡 <b>Estratégia Técnica:</b> {estrategia}</div>
+            </div>
+        </div>
+    </div>
+</div>
+""")
+
+# Lógica de Cores Semântica: (trecho no Tipo, cor da borda, fundo do ícone, ícone)
+_CORES_TIPO = (
+    ("Químico", "#ef4444", "#fee2e2", "☠️"),    # Vermelho
+    ("Biológico", "#22c55e", "#dcfce7", "🦠"),  # Verde
+    ("Nutri", "#eab308", "#fef9c3", "⚡"),      # Amarelo
+)
+_COR_PADRAO = ("#3b82f6", "#dbeafe", "🧪")      # Azul
+
+
+def _campos_produto(prod):
+    # Campos canônicos (sinônimos resolvidos na carga do banco)
+    campos = (prod.get('Alvo') or "Alvo Biológico", prod.get('Ativo') or "Ingrediente não informado",
+              prod.get('Estrategia') or "Seguir recomendação de bula.", prod.get('Grupo') or "", prod.get('Tipo') or 'Geral')
+    return tuple(str(c) for c in campos)  # texto puro: chave do memo
+
+
+@functools.lru_cache(maxsize=256)
+def _html_kpi(titulo, valor, unidade, status_texto, cor_status, tooltip):
+    return _TPL_KPI.format(titulo=titulo, valor=valor, unidade=unidade, status_texto=status_texto,
+                           cor_status=cor_status, tooltip=tooltip)
+
+
+@functools.lru_cache(maxsize=4096)
+def _html_produto(alvo, ativo, estrategia, grupo, tipo):
+    cor_borda, bg_icon, icone = next((c[1:] for c in _CORES_TIPO if c[0] in tipo), _COR_PADRAO)
+    return _TPL_PRODUTO.format(
+        cor_borda=cor_borda, bg_icon=bg_icon, icone=icone, alvo=alvo, tipo=tipo, ativo=ativo,
+        html_grupo=_TPL_GRUPO.format(grupo=grupo) if grupo else "", estrategia=estrategia,
+    )
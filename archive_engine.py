@@ -0,0 +1,211 @@
+# ARQUIVO: archive_engine.py
+# VERSÃO: Arquivo colunar append-only (memory-mapped) das previsões baixadas
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl  # Trava entre processos (Linux/macOS)
+except ImportError:
+    fcntl = None
+
+from gda_engine import DATA_DIR, chave_local
+
+# Uma coluna = um arquivo binário com um array tipado
+COLUNAS = {
+    "dt": np.dtype("<i8"),
+    "temp": np.dtype("<f4"),
+    "umid": np.dtype("<f4"),
+    "vento": np.dtype("<f4"),   # km/h
+    "chuva": np.dtype("<f4"),   # mm em 3h
+}
+
+COLUNAS_CONSULTA = ["loc", "dt", "DataHora", "Temp", "Umid", "Vento", "Chuva", "fetched"]
+
+# Índice de blocos: uma linha por previsão gravada (local + faixa de tempo + posição)
+BLOCO = np.dtype([
+    ("loc", "<i4"), ("fuso", "<i4"), ("fetched", "<i8"),
+    ("dt_min", "<i8"), ("dt_max", "<i8"), ("start", "<i8"), ("n", "<i8"),
+])
+
+
+class WeatherArchive:
+    """
+    Arquivo local append-only das previsões (replay, auditoria e modo offline).
+
+    Cada variável fica num arquivo próprio (`<coluna>.bin`) e as leituras usam
+    `np.memmap`: nada é carregado em RAM além das linhas pedidas. O índice
+    `blocos.bin` (uma linha por previsão gravada) é o ponto de commit: linhas
+    de coluna além do último bloco são descartadas na próxima gravação.
+    """
+
+    def __init__(self, pasta=None):
+        self.pasta = Path(pasta) if pasta else DATA_DIR / "arquivo_clima"
+        self._lock = threading.Lock()
+        self._locais = None
+
+    # --- LOCAIS ---
+    def _arquivo_locais(self):
+        return self.pasta / "locais.json"
+
+    def _carregar_locais(self):
+        if self._locais is None:
+            try:
+                self._locais = json.loads(self._arquivo_locais().read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._locais = {}
+        return self._locais
+
+    def _id_local(self, lat, lon, criar=False):
+        locais = self._carregar_locais()
+        chave = chave_local(lat, lon)
+        if chave not in locais and criar:
+            locais[chave] = len(locais)
+            tmp = self._arquivo_locais().with_suffix(".tmp")
+            tmp.write_text(json.dumps(locais), encoding="utf-8")
+            os.replace(tmp, self._arquivo_locais())
+        return locais.get(chave)
+
+    # --- LEITURA BAIXO NÍVEL ---
+    def _memmap(self, nome, dtype, linhas):
+        path = self.pasta / f"{nome}.bin"
+        if linhas == 0 or not path.exists():
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(linhas,))
+
+    def blocos(self):
+        path = self.pasta / "blocos.bin"
+        if not path.exists():
+            return np.empty(0, dtype=BLOCO)
+        n = path.stat().st_size // BLOCO.itemsize
+        return self._memmap("blocos", BLOCO, n)
+
+    def _linhas_confirmadas(self, blocos):
+        if len(blocos) == 0:
+            return 0
+        return int(blocos["start"][-1] + blocos["n"][-1])
+
+    # --- ESCRITA ---
+    def gravar_previsao(self, lat, lon, df_3h, fuso=0, fetched=None):
+        """Acrescenta os pontos de 3h de uma previsão (colunas dt, Temp, Umid, Vento, Chuva)."""
+        if df_3h is None or df_3h.empty:
+            return 0
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.pasta / ".lock", "a") as trava:
+            if fcntl:
+                fcntl.flock(trava, fcntl.LOCK_EX)
+            self._locais = None  # outro processo pode ter criado locais
+            loc = self._id_local(lat, lon, criar=True)
+            blocos = self.blocos()
+            start = self._linhas_confirmadas(blocos)
+            n_blocos = len(blocos)
+            del blocos
+
+            dados = {
+                "dt": df_3h["dt"].to_numpy(),
+                "temp": df_3h["Temp"].to_numpy(),
+                "umid": df_3h["Umid"].to_numpy(),
+                "vento": df_3h["Vento"].to_numpy() if "Vento" in df_3h else np.full(len(df_3h), np.nan),
+                "chuva": df_3h["Chuva"].to_numpy(),
+            }
+            for nome, dtype in COLUNAS.items():
+                path = self.pasta / f"{nome}.bin"
+                with open(path, "ab") as f:
+                    # Descarta restos de uma gravação interrompida
+                    f.truncate(start * dtype.itemsize)
+                    f.write(np.ascontiguousarray(dados[nome], dtype=dtype).tobytes())
+
+            dt = dados["dt"]
+            bloco = np.array([(loc, int(fuso), int(fetched or pd.Timestamp.now("UTC").timestamp()),
+                               int(dt.min()), int(dt.max()), start, len(dt))], dtype=BLOCO)
+            with open(self.pasta / "blocos.bin", "ab") as f:
+                f.truncate(n_blocos * BLOCO.itemsize)
+                f.write(bloco.tobytes())
+        return len(dt)
+
+    # --- CONSULTA ---
+    def consultar(self, lat=None, lon=None, inicio=None, fim=None, ultima=True):
+        """
+        Pontos arquivados no intervalo [inicio, fim] (datetime/Timestamp UTC ou epoch).
+        Sem lat/lon, traz todos os locais. Com `ultima=True` cada (local, dt)
+        aparece uma vez, com o valor da previsão mais recente.
+        """
+        blocos = self.blocos()
+        if len(blocos) == 0:
+            return pd.DataFrame(columns=COLUNAS_CONSULTA)
+        sel = np.ones(len(blocos), dtype=bool)
+        if lat is not None and lon is not None:
+            loc = self._id_local(lat, lon)
+            if loc is None:
+                return pd.DataFrame(columns=COLUNAS_CONSULTA)
+            sel &= blocos["loc"] == loc
+        t0 = _epoch(inicio) if inicio is not None else None
+        t1 = _epoch(fim) if fim is not None else None
+        if t0 is not None:
+            sel &= blocos["dt_max"] >= t0
+        if t1 is not None:
+            sel &= blocos["dt_min"] <= t1
+
+        escolhidos = blocos[sel]
+        total = self._linhas_confirmadas(blocos)
+        cols = {nome: self._memmap(nome, dtype, total) for nome, dtype in COLUNAS.items()}
+        # Índices de linha de todos os blocos escolhidos, sem loop Python
+        n = escolhidos["n"]
+        idx = np.arange(n.sum()) + np.repeat(escolhidos["start"] - (np.cumsum(n) - n), n)
+        df = pd.DataFrame({
+            "loc": np.repeat(escolhidos["loc"], escolhidos["n"]),
+            "dt": cols["dt"][idx],
+            "Temp": cols["temp"][idx],
+            "Umid": cols["umid"][idx],
+            "Vento": cols["vento"][idx],
+            "Chuva": cols["chuva"][idx],
+            "fetched": np.repeat(escolhidos["fetched"], escolhidos["n"]),
+        })
+        if t0 is not None:
+            df = df[df["dt"] >= t0]
+        if t1 is not None:
+            df = df[df["dt"] <= t1]
+        if ultima and not df.empty:
+            # Blocos estão em ordem de gravação: o último de cada (loc, dt) é o mais novo
+            df = df.drop_duplicates(["loc", "dt"], keep="last")
+        df = df.sort_values(["loc", "dt"], kind="stable").reset_index(drop=True)
+        df.insert(2, "DataHora", pd.to_datetime(df["dt"], unit="s", utc=True))
+        return df
+
+    def ultima_previsao(self, lat, lon):
+        """Última previsão gravada para o local (modo offline). Devolve (DataFrame, fuso) ou (None, 0)."""
+        loc = self._id_local(lat, lon)
+        blocos = self.blocos()
+        if loc is None or len(blocos) == 0:
+            return None, 0
+        pos = np.nonzero(blocos["loc"] == loc)[0]
+        if len(pos) == 0:
+            return None, 0
+        b = blocos[pos[-1]]
+        sl = slice(int(b["start"]), int(b["start"] + b["n"]))
+        total = self._linhas_confirmadas(blocos)
+        df = pd.DataFrame({
+            "dt": self._memmap("dt", COLUNAS["dt"], total)[sl],
+            "Temp": self._memmap("temp", COLUNAS["temp"], total)[sl].astype(float),
+            "Umid": self._memmap("umid", COLUNAS["umid"], total)[sl].astype(float),
+            "Vento": self._memmap("vento", COLUNAS["vento"], total)[sl].astype(float),
+            "Chuva": self._memmap("chuva", COLUNAS["chuva"], total)[sl].astype(float),
+        })
+        return df, int(b["fuso"])
+
+
+def _epoch(t):
+    if isinstance(t, (int, float, np.integer, np.floating)):
+        return int(t)
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.timestamp())
+
+
+# Instância do processo
+ARCHIVE = WeatherArchive()
@@ -0,0 +1,233 @@
+# ARQUIVO: batch_runner.py
+# VERSÃO: Processamento em lote de talhões (sem Streamlit na tela, pool de processos)
+"""
+Roda o mesmo pipeline do cockpit (previsão -> KPIs -> Delta T/VPD -> progresso
+de GDA) para uma lista de talhões e grava uma tabela de resultados.
+
+Uso:
+    python batch_runner.py talhoes.csv resultado.csv --w-key CHAVE [--workers 8]
+        [--base-url http://127.0.0.1:8765/data/2.5] [--data-ref 2026-01-15]
+        [--receitas pasta_receitas]
+
+Entrada (CSV ou JSON): id, lat, lon, cultura, variedade, plantio (AAAA-MM-DD), fase.
+Talhões na mesma célula de clima (geo_engine.GRID, env AGRO_GRID) compartilham
+uma única busca de previsão, feita no centro da célula.
+
+Com --receitas, cada worker também emite o receituário em PDF de cada talhão
+(receita_engine) e grava direto na pasta, à medida que avalia.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import pandas as pd
+
+import query_engine
+from calc_engine import WeatherConn
+from gda_engine import GDA_STORE
+from geo_engine import GRID
+from http_engine import TransportError
+
+COLUNAS_RESULTADO = [
+    "id", "cultura", "variedade", "fase", "plantio", "lat", "lon", "celula",
+    "temp", "umid", "delta_t", "vpd", "status_temp", "status_delta_t", "status_vpd",
+    "janela_apta_inicio", "janela_apta_horas",
+    "dias", "gda_acum", "gda_estimado", "gda_meta", "progresso", "receita", "erro",
+]
+
+
+def ler_talhoes(caminho):
+    if str(caminho).lower().endswith(".json"):
+        df = pd.read_json(caminho)
+    else:
+        df = pd.read_csv(caminho)
+    df.columns = [c.strip().lower() for c in df.columns]
+    faltando = {"lat", "lon", "cultura", "variedade", "plantio", "fase"} - set(df.columns)
+    if faltando:
+        raise ValueError(f"Colunas ausentes no arquivo de talhões: {', '.join(sorted(faltando))}")
+    if "id" not in df.columns:
+        df["id"] = range(1, len(df) + 1)
+    return df
+
+
+def preparar_talhoes(df, indice):
+    """Resolve cultura/genética no banco e agrupa os talhões por célula de clima."""
+    talhoes, erros = [], []
+    for reg in df.to_dict("records"):
+        cultura = indice.resolver_cultura(str(reg["cultura"]))
+        variedade = indice.variedade(cultura, reg["variedade"]) if cultura else {}
+        if not cultura or not variedade:
+            erros.append({**_base(reg), "erro": "cultura/genética não encontrada no banco"})
+            continue
+        dados_fase = indice.fase(cultura, reg["fase"])
+        talhao = {
+            **_base(reg),
+            "cultura": cultura,
+            "kc": float(variedade.get("kc", 1.0)),
+            "t_base": float(indice.cultura(cultura).get("t_base", 10)),
+            "gda_meta": float(variedade.get("gda_meta", 1500)),
+            "quimica": dados_fase.get("quimica") or [],
+            "desc": dados_fase.get("desc"),
+            "manejo": dados_fase.get("manejo"),
+        }
+        talhoes.append(talhao)
+    return GRID.agrupar(talhoes), erros
+
+
+def _base(reg):
+    return {k: reg.get(k) for k in ("id", "cultura", "variedade", "fase", "lat", "lon", "plantio")}
+
+
+# --- WORKER (roda em cada processo do pool) ---
+def _init_worker(base_url, w_key, pasta_receitas=None):
+    if base_url:
+        WeatherConn.BASE_URL = base_url.rstrip("/")
+    os.environ["AGRO_BATCH_W_KEY"] = w_key or ""
+    os.environ["AGRO_BATCH_RECEITAS"] = pasta_receitas or ""
+
+
+def processar_celulas(lote, data_ref, registrar=True):
+    """Busca a previsão de cada célula uma vez e avalia todos os talhões dela."""
+    from agro_utils import AgroBrain  # import local: só os workers precisam
+
+    w_key = os.environ.get("AGRO_BATCH_W_KEY", "")
+    pasta_receitas = os.environ.get("AGRO_BATCH_RECEITAS")
+    saida = []
+    for celula, talhoes in lote:
+        lat, lon = GRID.centro(celula)
+        try:
+            bruto = WeatherConn.fetch_forecast_raw(w_key, lat, lon)
+        except TransportError as e:
+            for t in talhoes:
+                res = {k: v for k, v in t.items() if k != "quimica"}
+                res.update({"celula": celula, "erro": str(e)})
+                if pasta_receitas:
+                    _emitir_receita(t, res, pasta_receitas, data_ref)  # receita sai sem o quadro de clima
+                saida.append(res)
+            continue
+
+        # Um parse por combinação (kc, t_base) presente na célula
+        por_param = {}
+        for t in talhoes:
+            chave = (t["kc"], t["t_base"])
+            if chave not in por_param:
+                por_param[chave] = WeatherConn.parse_forecast(bruto, *chave)
+                if registrar and len(por_param) == 1:
+                    WeatherConn.registrar_historico(lat, lon, por_param[chave])
+            res = _avaliar_talhao(AgroBrain, t, por_param[chave], celula, data_ref)
+            if pasta_receitas:
+                _emitir_receita(t, res, pasta_receitas, data_ref)
+            saida.append(res)
+    return saida
+
+
+def _emitir_receita(t, res, pasta, data_ref):
+    """Gera e grava o PDF do talhão no próprio worker (só o caminho volta ao processo principal)."""
+    from receita_engine import MODELO, dados_receita
+
+    clima = None
+    if not res.get("erro"):
+        janela = res.get("janela_apta_inicio")
+        clima = {"temp": res["temp"], "umid": res["umid"], "delta_t": res["delta_t"], "vpd": res["vpd"],
+                 "status_delta_t": res["status_delta_t"],
+                 "janela": f"{pd.Timestamp(janela):%d/%m %H:%M} ({res['janela_apta_horas']}h)" if janela is not None else None}
+    dados = dados_receita(t["cultura"], t["variedade"], t["fase"], t, talhao=t["id"], plantio=t["plantio"],
+                          clima=clima, data=data_ref)
+    try:
+        res["receita"] = str(MODELO.gravar(dados, pasta))
+    except OSError as e:
+        res["erro"] = (res.get("erro") or "") + f" | receita: {e}"
+
+
+def _avaliar_talhao(AgroBrain, t, df_3h, celula, data_ref):
+    res = {k: v for k, v in t.items() if k != "quimica"}
+    res.update({"celula": celula, "erro": ""})
+    try:
+        agora = df_3h.iloc[0]
+        temp, umid, delta_t = float(agora["Temp"]), float(agora["Umid"]), float(agora["Delta T"])
+        vpd = AgroBrain.calcular_vpd(temp, umid)
+        status = AgroBrain.status_cockpit(temp, delta_t, vpd)
+
+        plantio = pd.Timestamp(t["plantio"]).date()
+        dias = (data_ref - plantio).days
+        hist = GDA_STORE.gda_acumulado(*GRID.centro(celula), t["t_base"], plantio, data_ref)
+        gda = hist["gda"] if hist["gda"] is not None else dias * df_3h["GDA"].mean()
+
+        janelas = AgroBrain.agendar_janelas_aplicacao(df_3h, t["quimica"])
+        aptas = janelas[janelas["Status"] == "APTO"].sort_values("Inicio")
+
+        res.update({
+            "temp": temp, "umid": umid, "delta_t": delta_t, "vpd": round(vpd, 2),
+            "status_temp": status["temp"][0], "status_delta_t": status["delta_t"][0], "status_vpd": status["vpd"][0],
+            "janela_apta_inicio": aptas["Inicio"].iloc[0] if not aptas.empty else None,
+            "janela_apta_horas": int(aptas["Horas"].iloc[0]) if not aptas.empty else 0,
+            "dias": dias, "gda_acum": round(gda, 1), "gda_estimado": hist["estimado"],
+            "progresso": round(min(1.0, gda / t["gda_meta"]), 4),
+        })
+    except Exception as e:
+        res["erro"] = f"{type(e).__name__}: {e}"
+    return res
+
+
+def executar(talhoes_df, w_key, workers=None, base_url=None, data_ref=None, celulas_por_tarefa=16, registrar=True,
+             pasta_receitas=None):
+    """Roda o lote e devolve o DataFrame de resultados (uma linha por talhão)."""
+    data_ref = data_ref or date.today()
+    celulas, erros = preparar_talhoes(talhoes_df, query_engine.get_index())
+    itens = list(celulas.items())
+    lotes = [itens[i:i + celulas_por_tarefa] for i in range(0, len(itens), celulas_por_tarefa)]
+
+    linhas = list(erros)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(base_url, w_key, pasta_receitas)) as pool:
+        futuros = [pool.submit(processar_celulas, lote, data_ref, registrar) for lote in lotes]
+        for fut in as_completed(futuros):
+            linhas.extend(fut.result())
+
+    df = pd.DataFrame(linhas)
+    for col in COLUNAS_RESULTADO:
+        if col not in df.columns:
+            df[col] = None
+    return df[COLUNAS_RESULTADO].sort_values("id", kind="stable").reset_index(drop=True)
+
+
+def gravar_resultado(df, caminho):
+    if str(caminho).lower().endswith(".parquet"):
+        df.to_parquet(caminho, index=False)
+    else:
+        df.to_csv(caminho, index=False)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Agro SDI - processamento em lote de talhões")
+    p.add_argument("talhoes", help="CSV/JSON com id, lat, lon, cultura, variedade, plantio, fase")
+    p.add_argument("saida", help="Arquivo de resultado (.csv ou .parquet)")
+    p.add_argument("--w-key", default=os.environ.get("OPENWEATHER_KEY", ""), help="Chave OpenWeather (ou env OPENWEATHER_KEY)")
+    p.add_argument("--workers", type=int, default=None, help="Processos do pool (padrão: nº de CPUs)")
+    p.add_argument("--base-url", default=None,
+                   help="URL base da API de clima (padrão: env AGRO_WEATHER_BASE_URL; ex: weather_stub.py)")
+    p.add_argument("--data-ref", default=None, help="Data de referência AAAA-MM-DD (padrão: hoje)")
+    p.add_argument("--celulas-por-tarefa", type=int, default=16)
+    p.add_argument("--sem-historico", action="store_true", help="Não grava as previsões no histórico/arquivo local")
+    p.add_argument("--receitas", default=None, help="Pasta onde gravar o receituário em PDF de cada talhão")
+    args = p.parse_args(argv)
+
+    inicio = time.perf_counter()
+    talhoes = ler_talhoes(args.talhoes)
+    data_ref = date.fromisoformat(args.data_ref) if args.data_ref else None
+    df = executar(talhoes, args.w_key, args.workers, args.base_url, data_ref,
+                  args.celulas_por_tarefa, registrar=not args.sem_historico, pasta_receitas=args.receitas)
+    gravar_resultado(df, args.saida)
+
+    dur = time.perf_counter() - inicio
+    n_erros = int((df["erro"].fillna("") != "").sum())
+    print(f"✅ {len(df)} talhões em {dur:.1f}s ({len(df) / dur * 60:.0f}/min), {n_erros} com erro -> {args.saida}")
+    if args.receitas:
+        print(f"📄 {int(df['receita'].notna().sum())} receituários em {args.receitas}")
+    return 0 if n_erros < len(df) or len(df) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
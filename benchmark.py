@@ -0,0 +1,513 @@
+# ARQUIVO: benchmark.py
+# VERSÃO: Micro-benchmarks dos caminhos quentes (física, regras, banco, previsão)
+"""
+Mede os caminhos quentes com entradas sintéticas de tamanho crescente e compara
+com uma linha de base gravada, apontando regressões acima do limite.
+
+Uso:
+    python benchmark.py                      # roda e compara com a linha de base
+    python benchmark.py --salvar             # roda e grava a linha de base
+    python benchmark.py --filtro physics     # só os casos cujo nome contém o texto
+    python benchmark.py --limite 1.3 --rapido
+    python benchmark.py --imports            # tempo de import da partida do cockpit
+
+Saída com código 1 se algum caso ficou mais lento que `limite` x linha de base
+(para usar antes de cada deploy). A linha de base é por máquina: grave-a no
+mesmo hardware em que o relatório vai rodar. Fica em AGRO_DATA_DIR
+(benchmark_baseline.json), junto dos outros dados locais gerados.
+
+Com --imports, mede em interpretadores novos os imports que o main.py faz antes
+de desenhar a tela e sai com código 1 se passarem do orçamento ou se algum
+módulo pesado reservado às abas (PROIBIDOS_NA_PARTIDA) for carregado na partida.
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import data_engine
+from agro_utils import AgroBrain
+from calc_engine import AgroPhysics, WeatherConn
+from gda_engine import DATA_DIR
+from ledger_engine import CATEGORIAS, CostLedger
+from weather_stub import WeatherStub, gerar_forecast, iniciar_em_thread
+
+BASE_DIR = Path(__file__).parent.resolve()
+BASELINE_PADRAO = DATA_DIR / "benchmark_baseline.json"  # por máquina: fica com os dados locais, fora do git
+LIMITE_PADRAO = 1.25      # 25% mais lento que a linha de base = regressão
+TEMPO_MIN_RODADA = 0.05   # segundos por rodada (calibra o nº de chamadas)
+
+SCRIPT_APP = BASE_DIR / "main.py"
+ORCAMENTO_IMPORT_MS = float(os.environ.get("AGRO_IMPORT_ORCAMENTO_MS", 800))  # imports do app, sem o Streamlit
+# Importados só dentro da aba/recurso que os usa (GIS, gráficos, IA): não podem aparecer na partida
+PROIBIDOS_NA_PARTIDA = ("plotly", "folium", "streamlit_folium", "branca", "PIL", "google.generativeai")
+
+CASOS = []
+
+
+def caso(nome, tamanhos):
+    """Registra um caso. A função recebe o tamanho e devolve o callable medido."""
+    def deco(preparar):
+        CASOS.append((nome, tamanhos, preparar))
+        return preparar
+    return deco
+
+
+# --- ENTRADAS SINTÉTICAS ---
+def clima_sintetico(n, seed=42):
+    rng = np.random.default_rng(seed)
+    temp = rng.uniform(8, 40, n)
+    umid = rng.uniform(15, 100, n)
+    return temp, umid
+
+
+def payload_forecast(n_pontos=40, seed=42, inicio=1767225600):
+    """Resposta /forecast pronta (mesmo gerador do servidor local, horário fixo)."""
+    return gerar_forecast(-13.414, -41.285, n_pontos, inicio=inicio, seed=seed)
+
+
+def slots_sinteticos(n, seed=42):
+    """Pontos de 3h já enriquecidos (entrada do agendador de janelas)."""
+    payload = payload_forecast(n, seed)
+    return WeatherConn.parse_forecast(payload, 1.0, 10)
+
+
+def arvore_sintetica(profundidade, largura=4, seed=0):
+    """Dicionário aninhado com largura^profundidade folhas."""
+    rng = random.Random(seed)
+
+    def no(nivel):
+        if nivel == 0:
+            return rng.random()
+        return {f"k{i}": no(nivel - 1) for i in range(largura)}
+    return no(profundidade)
+
+
+def banco_sintetico(pasta, n_arquivos, fases=8, produtos=6):
+    """Gera `n_arquivos` JSONs no formato do banco (culturas espalhadas em subpastas)."""
+    for i in range(n_arquivos):
+        cultura = f"Cultura {i // 2:04d}"  # 2 arquivos por cultura: exercita o merge
+        dados = {cultura: {
+            "t_base": 10,
+            "vars": {f"Var {i}-{v}": {"kc": 1.1, "gda_meta": 1500, "info": "Sintético"} for v in range(3)},
+            "fases": {f"F{f}": {
+                "desc": "Fase sintética", "manejo": "Manejo sintético",
+                "quimica": [{"Alvo": f"Alvo {p}", "Ativo": f"Ativo {p}", "Tipo": "Sistêmico",
+                             "Grupo": f"FRAC {p}"} for p in range(produtos)],
+            } for f in range(fases)},
+        }}
+        destino = Path(pasta) / f"{i % 10:02d}_Grupo" / f"arquivo_{i:04d}.json"
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_text(json.dumps(dados, ensure_ascii=False), encoding="utf-8")
+
+
+# --- CASOS: FÍSICA ---
+@caso("physics.calc_vpd", (1_000, 10_000))
+def _(n):
+    t, h = clima_sintetico(n)
+    return lambda: [AgroPhysics.calc_vpd(a, b) for a, b in zip(t, h)]
+
+
+@caso("physics.calc_delta_t", (1_000, 10_000))
+def _(n):
+    t, h = clima_sintetico(n)
+    return lambda: [AgroPhysics.calc_delta_t(a, b) for a, b in zip(t, h)]
+
+
+@caso("physics.calc_etc", (1_000, 10_000))
+def _(n):
+    t, _h = clima_sintetico(n)
+    return lambda: [AgroPhysics.calc_etc(a, 1.1) for a in t]
+
+
+@caso("physics.calc_vpd_vec", (1_000, 100_000, 1_000_000))
+def _(n):
+    t, h = clima_sintetico(n)
+    return lambda: AgroPhysics.calc_vpd_vec(t, h)
+
+
+@caso("physics.calc_delta_t_vec", (1_000, 100_000, 1_000_000))
+def _(n):
+    t, h = clima_sintetico(n)
+    return lambda: AgroPhysics.calc_delta_t_vec(t, h)
+
+
+@caso("physics.enrich", (1_000, 100_000))
+def _(n):
+    t, h = clima_sintetico(n)
+    df = pd.DataFrame({"Temp": t, "Umid": h})
+    return lambda: AgroPhysics.enrich(df, kc=1.1, t_base=10)
+
+
+# --- CASOS: REGRAS AGRONÔMICAS ---
+@caso("agro.calcular_vpd", (1_000, 10_000))
+def _(n):
+    t, h = clima_sintetico(n)
+    return lambda: [AgroBrain.calcular_vpd(a, b) for a, b in zip(t, h)]
+
+
+@caso("agro.analisar_risco_aplicacao", (1_000, 10_000))
+def _(n):
+    t, h = clima_sintetico(n)
+    dt = AgroPhysics.calc_delta_t_vec(t, h)
+    return lambda: [AgroBrain.analisar_risco_aplicacao(a, b, c) for a, b, c in zip(t, h, dt)]
+
+
+@caso("agro.agendar_janelas_aplicacao", (40, 400, 4_000))
+def _(n):
+    df = slots_sinteticos(n)
+    produtos = [{"Tipo": "Sistêmico"}, {"Tipo": "Contato"}, {"Tipo": "Biológico"}]
+    return lambda: AgroBrain.agendar_janelas_aplicacao(df, produtos)
+
+
+@caso("agro.html_protocolo", (6, 60))
+def _(n):
+    # HTML da fase inteira a cada rerun (cards memoizados pelo conteúdo)
+    produtos = [{"Alvo": f"Alvo {i}", "Ativo": f"Ativo {i}", "Tipo": ("Químico", "Biológico", "Nutri")[i % 3],
+                 "Grupo": f"FRAC {i}", "Estrategia": "Sintética"} for i in range(n)]
+    return lambda: AgroBrain.html_protocolo_quimico(produtos)
+
+
+# --- CASOS: BANCO DE CONHECIMENTO ---
+@caso("data.deep_update", (3, 5, 7))
+def _(profundidade):
+    base = arvore_sintetica(profundidade, seed=1)
+    novo = arvore_sintetica(profundidade, seed=2)
+    # Cópia rasa por chamada não basta (deep_update altera no lugar): refaz a base via JSON
+    texto = json.dumps(base)
+    return lambda: data_engine.deep_update(json.loads(texto), novo)
+
+
+class _RecursosTemporarios:
+    """Pastas de banco sintético (e servidores locais) criados por execução e desfeitos no fim."""
+    pastas = {}
+    servidores = []
+
+    @classmethod
+    def pasta(cls, n_arquivos):
+        if n_arquivos not in cls.pastas:
+            p = Path(tempfile.mkdtemp(prefix=f"agro_bench_{n_arquivos}_"))
+            banco_sintetico(p, n_arquivos)
+            cls.pastas[n_arquivos] = p
+        return cls.pastas[n_arquivos]
+
+    @classmethod
+    def limpar(cls):
+        for p in cls.pastas.values():
+            shutil.rmtree(p, ignore_errors=True)
+        cls.pastas.clear()
+        for s in cls.servidores:
+            s.shutdown()
+            s.server_close()
+        cls.servidores.clear()
+
+
+@caso("data.build_database", (10, 100, 500))
+def _(n):
+    # Carga completa, sem snapshot: todas as fontes lidas e fundidas
+    pasta = _RecursosTemporarios.pasta(n)
+    return lambda: data_engine.KnowledgeBase(pasta).load(use_snapshot=False)
+
+
+@caso("data.load_snapshot", (10, 100, 500))
+def _(n):
+    # Partida a frio do processo: snapshot em dia + conferência do manifesto
+    pasta = _RecursosTemporarios.pasta(n)
+    data_engine.compile_snapshot(pasta)
+    return lambda: data_engine.KnowledgeBase(pasta).load()
+
+
+@caso("data.refresh_sem_mudanca", (10, 100, 500))
+def _(n):
+    kb = data_engine.KnowledgeBase(_RecursosTemporarios.pasta(n))
+    kb.load(use_snapshot=False)
+    return lambda: kb.refresh(save=False)
+
+
+@caso("data.get_database", (1,))
+def _(_n):
+    data_engine.get_database()  # primeira carga fora da medição
+    return data_engine.get_database
+
+
+@caso("data.ledger_lancar_total", (1_000, 100_000))
+def _(n):
+    # Inclusão + total + agregados + 1ª página: deve custar o mesmo com 1k ou 100k lançamentos
+    pasta = Path(tempfile.mkdtemp(prefix=f"agro_bench_ledger_{n}_"))
+    _RecursosTemporarios.pastas[("ledger", n)] = pasta
+    ledger = CostLedger(pasta / "custos.sqlite")
+    rng = random.Random(n)
+    ledger.lancar_varios(({"item": f"Item {i}", "valor": rng.uniform(10, 5000), "categoria": rng.choice(CATEGORIAS),
+                          "talhao": f"T{i % 40:02d}"} for i in range(n)), fazenda="bench")
+
+    def rodar():
+        ledger.lancar("Bench", 1.0, categoria="Outros", fazenda="bench")
+        ledger.total(fazenda="bench")
+        ledger.por_categoria(fazenda="bench")
+        ledger.pagina(fazenda="bench", limite=50)
+    return rodar
+
+
+# --- CASOS: PREVISÃO (payloads prontos, sem rede) ---
+@caso("forecast.parse_forecast", (40, 400, 4_000))
+def _(n):
+    payload = payload_forecast(n)
+    return lambda: WeatherConn.parse_forecast(payload, 1.1, 10)
+
+
+@caso("forecast.dataframe_amostrado", (40, 400, 4_000))
+def _(n):
+    payload = payload_forecast(n)
+    return lambda: WeatherConn.amostrar_24h(WeatherConn.parse_forecast(payload, 1.1, 10))
+
+
+@caso("forecast.dataframe_diario", (40, 400, 4_000))
+def _(n):
+    payload = payload_forecast(n)
+    return lambda: WeatherConn.agregar_diario(WeatherConn.parse_forecast(payload, 1.1, 10), 1.1, 10)
+
+
+@caso("forecast.http_servidor_local", (1, 8))
+def _(n_locais):
+    # Requisição real (keep-alive + parse) contra o weather_stub, sem latência simulada
+    servidor, base_url, _geo = iniciar_em_thread(WeatherStub(agora=1767225600))
+    _RecursosTemporarios.servidores.append(servidor)
+    locais = [(-13.414 + 0.05 * i, -41.285) for i in range(n_locais)]
+
+    def rodar():
+        antiga, WeatherConn.BASE_URL = WeatherConn.BASE_URL, base_url
+        try:
+            for lat, lon in locais:
+                WeatherConn.parse_forecast(WeatherConn.fetch_forecast_raw("bench", lat, lon), 1.1, 10)
+        finally:
+            WeatherConn.BASE_URL = antiga
+    return rodar
+
+
+# --- MEDIÇÃO ---
+def medir(fn, rodadas=5, tempo_min=TEMPO_MIN_RODADA):
+    """Segundos por chamada: mínimo e mediana de `rodadas` (nº de chamadas calibrado)."""
+    fn()  # aquecimento (imports, caches de numpy/pandas)
+    chamadas = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(chamadas):
+            fn()
+        dur = time.perf_counter() - t0
+        if dur >= tempo_min or chamadas >= 1_000_000:
+            break
+        chamadas *= 2 if dur <= 0 else max(2, min(10, int(tempo_min / dur) + 1))
+    tempos = [dur / chamadas]
+    for _ in range(rodadas - 1):
+        t0 = time.perf_counter()
+        for _ in range(chamadas):
+            fn()
+        tempos.append((time.perf_counter() - t0) / chamadas)
+    return {"min": min(tempos), "mediana": statistics.median(tempos), "chamadas": chamadas}
+
+
+def executar(filtro=None, rodadas=5, rapido=False):
+    """Roda os casos e devolve {'caso[tamanho]': {'min', 'mediana', 'chamadas'}}."""
+    resultados = {}
+    try:
+        for nome, tamanhos, preparar in CASOS:
+            if filtro and filtro not in nome:
+                continue
+            for n in (tamanhos[:2] if rapido else tamanhos):
+                chave = f"{nome}[{n}]"
+                resultados[chave] = medir(preparar(n), rodadas=2 if rapido else rodadas)
+                print(f"  {chave:<45} {_fmt(resultados[chave]['min'])}")
+    finally:
+        _RecursosTemporarios.limpar()
+    return resultados
+
+
+def _fmt(seg):
+    if seg < 1e-3:
+        return f"{seg * 1e6:9.1f} µs"
+    if seg < 1:
+        return f"{seg * 1e3:9.2f} ms"
+    return f"{seg:9.3f} s "
+
+
+# --- LINHA DE BASE ---
+def salvar_baseline(resultados, caminho=BASELINE_PADRAO):
+    payload = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "maquina": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "resultados": {k: v["min"] for k, v in resultados.items()},
+    }
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    Path(caminho).write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def carregar_baseline(caminho=BASELINE_PADRAO):
+    try:
+        return json.loads(Path(caminho).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def relatorio(resultados, baseline, limite=LIMITE_PADRAO):
+    """Tabela caso x (atual, base, razão, situação). Devolve (DataFrame, nº de regressões)."""
+    base = (baseline or {}).get("resultados", {})
+    linhas = []
+    for chave, r in resultados.items():
+        ref = base.get(chave)
+        razao = r["min"] / ref if ref else None
+        if razao is None:
+            situacao = "NOVO"
+        elif razao > limite:
+            situacao = "REGRESSÃO"
+        elif razao < 1 / limite:
+            situacao = "MELHORA"
+        else:
+            situacao = "OK"
+        linhas.append({"caso": chave, "atual": _fmt(r["min"]), "base": _fmt(ref) if ref else "-",
+                       "razao": f"{razao:.2f}x" if razao else "-", "situacao": situacao})
+    df = pd.DataFrame(linhas, columns=["caso", "atual", "base", "razao", "situacao"])
+    return df, int((df["situacao"] == "REGRESSÃO").sum())
+
+
+# --- PARTIDA: TEMPO DE IMPORT DO COCKPIT ---
+def imports_da_partida(script=SCRIPT_APP):
+    """
+    Imports que rodam antes da primeira linha de tela: os do nível do módulo
+    (inclusive o `try` de topo). Os de dentro de abas e funções ficam de fora.
+    """
+    arvore = ast.parse(Path(script).read_text(encoding="utf-8"))
+    linhas = []
+    for no in arvore.body:
+        for n in (no.body if isinstance(no, ast.Try) else [no]):
+            if isinstance(n, (ast.Import, ast.ImportFrom)):
+                linhas.append(ast.unparse(n))
+    return linhas
+
+
+def _ler_importtime(saida):
+    """
+    Lê a saída de `python -X importtime`. Tudo até o `streamlit` de 1º nível
+    (inclusive) é o runtime; depois, cada import de 1º nível do app com seu
+    tempo acumulado (ms) e os módulos que ele puxou.
+    """
+    runtime_ms, app, pendentes, depois_do_streamlit = 0.0, [], [], False
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        _self, acumulado, nome = linha.split("|", 2)
+        nome = nome[1:]
+        nivel = (len(nome) - len(nome.lstrip())) // 2
+        nome = nome.strip()
+        pendentes.append(nome)
+        if nivel:
+            continue
+        if not depois_do_streamlit:
+            if nome == "streamlit":
+                runtime_ms, depois_do_streamlit = int(acumulado) / 1000, True
+        else:
+            app.append((nome, int(acumulado) / 1000, pendentes))
+        pendentes = []
+    return runtime_ms, app
+
+
+def medir_imports(linhas, rodadas=3):
+    """
+    Roda `import streamlit` + os imports da partida em `rodadas` interpretadores
+    novos. Devolve (ms do runtime, {import de 1º nível: ms (mínimo)}, {proibido: quem puxou}).
+    """
+    codigo = "import streamlit\n" + "\n".join(linhas)
+    runtime, tempos, proibidos = [], {}, {}
+    for _ in range(rodadas):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                              cwd=BASE_DIR, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"imports da partida falharam: {proc.stderr.strip().splitlines()[-1]}")
+        ms_runtime, app = _ler_importtime(proc.stderr)
+        runtime.append(ms_runtime)
+        for nome, ms, puxados in app:
+            tempos[nome] = min(ms, tempos.get(nome, ms))
+            for mod in puxados:
+                if any(mod == p or mod.startswith(p + ".") for p in PROIBIDOS_NA_PARTIDA):
+                    proibidos.setdefault(mod.split(".")[0] if not mod.startswith("google.") else mod, nome)
+    return min(runtime), tempos, proibidos
+
+
+def relatorio_imports(orcamento_ms=ORCAMENTO_IMPORT_MS, rodadas=3, script=SCRIPT_APP):
+    """Imprime o tempo de import da partida por módulo e devolve o código de saída (0 = dentro do orçamento)."""
+    linhas = imports_da_partida(script)
+    runtime_ms, tempos, proibidos = medir_imports(linhas, rodadas)
+    total = sum(tempos.values())
+    print(f"⏱️ Imports da partida de {Path(script).name} ({len(linhas)} linhas, mínimo de {rodadas} interpretadores)")
+    print(f"  {'streamlit (runtime, fora do orçamento)':<40} {runtime_ms:9.1f} ms")
+    for nome, ms in sorted(tempos.items(), key=lambda kv: -kv[1]):
+        if ms >= 0.5:
+            print(f"  {nome:<40} {ms:9.1f} ms")
+    print(f"\n  Total do app: {total:.0f} ms (orçamento {orcamento_ms:.0f} ms)")
+    codigo = 0
+    for mod, via in sorted(proibidos.items()):
+        print(f"🛑 {mod} carregado na partida (via {via}): importe dentro da aba que o usa")
+        codigo = 1
+    if total > orcamento_ms:
+        print(f"🛑 Partida acima do orçamento em {total - orcamento_ms:.0f} ms")
+        codigo = 1
+    if codigo == 0:
+        print("✅ Partida dentro do orçamento, sem módulos pesados antecipados")
+    return codigo
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Agro SDI - micro-benchmarks dos caminhos quentes")
+    p.add_argument("--filtro", default=None, help="Só casos cujo nome contém o texto (ex: physics, data.)")
+    p.add_argument("--salvar", action="store_true", help="Grava os resultados como nova linha de base")
+    p.add_argument("--baseline", default=str(BASELINE_PADRAO), help="Arquivo da linha de base")
+    p.add_argument("--limite", type=float, default=LIMITE_PADRAO, help="Razão atual/base que conta como regressão")
+    p.add_argument("--rodadas", type=int, default=5)
+    p.add_argument("--rapido", action="store_true", help="Menos rodadas e só os dois menores tamanhos")
+    p.add_argument("--imports", action="store_true", help="Só o relatório de tempo de import da partida do main.py")
+    p.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_IMPORT_MS,
+                   help="Orçamento dos imports da partida (padrão: env AGRO_IMPORT_ORCAMENTO_MS ou 800)")
+    args = p.parse_args(argv)
+
+    if args.imports:
+        return relatorio_imports(args.orcamento_ms)
+
+    print(f"⏱️ Rodando benchmarks (Python {platform.python_version()}, numpy {np.__version__}, pandas {pd.__version__})")
+    resultados = executar(args.filtro, args.rodadas, args.rapido)
+
+    if args.salvar:
+        salvar_baseline(resultados, args.baseline)
+        print(f"✅ Linha de base gravada em {args.baseline} ({len(resultados)} casos)")
+        return 0
+
+    baseline = carregar_baseline(args.baseline)
+    if baseline is None:
+        print(f"⚠️ Sem linha de base em {args.baseline}: rode com --salvar para criar.")
+        return 0
+    df, n_reg = relatorio(resultados, baseline, args.limite)
+    print(f"\nComparação com a linha de base de {baseline.get('gerado_em')} ({baseline.get('maquina')}), limite {args.limite:.2f}x:")
+    print(df.to_string(index=False))
+    if n_reg:
+        print(f"\n🛑 {n_reg} caso(s) com regressão acima de {args.limite:.2f}x")
+        return 1
+    print("\n✅ Nenhuma regressão acima do limite")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
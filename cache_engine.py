@@ -0,0 +1,104 @@
+# ARQUIVO: cache_engine.py
+# VERSÃO: Cache de processo (TTL + LRU + stale-while-revalidate)
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Cache em memória compartilhado por todo o processo (todas as sessões Streamlit).
+
+    - TTL: até `ttl` segundos a entrada é servida como fresca.
+    - Stale-while-revalidate: entre `ttl` e `ttl + stale_ttl` a entrada antiga é
+      devolvida na hora e uma atualização roda em segundo plano.
+    - LRU: acima de `max_size` entradas, a menos usada recentemente sai.
+    """
+
+    def __init__(self, ttl, stale_ttl=0, max_size=256, nome="cache"):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.nome = nome
+        self._dados = OrderedDict()  # chave -> (timestamp, valor)
+        self._lock = threading.Lock()
+        self._em_atualizacao = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get_or_load(self, chave, loader, valido=lambda v: v is not None):
+        """
+        Devolve o valor da chave, chamando `loader()` apenas quando necessário.
+        Valores que não passam em `valido` (ex: DataFrame vazio de uma falha)
+        não são guardados, para não cachear erro.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is not None:
+                idade = agora - item[0]
+                if idade < self.ttl:
+                    self._dados.move_to_end(chave)
+                    self.hits += 1
+                    return item[1]
+                if idade < self.ttl + self.stale_ttl:
+                    self._dados.move_to_end(chave)
+                    self.stale_hits += 1
+                    if chave not in self._em_atualizacao:
+                        self._em_atualizacao.add(chave)
+                        threading.Thread(target=self._revalidar, args=(chave, loader, valido), daemon=True).start()
+                    return item[1]
+            self.misses += 1
+
+        valor = loader()
+        if valido(valor):
+            self._guardar(chave, valor)
+        return valor
+
+    def _revalidar(self, chave, loader, valido):
+        try:
+            valor = loader()
+            if valido(valor):
+                self._guardar(chave, valor)
+        except Exception as e:
+            print(f"⚠️ Falha ao revalidar {self.nome} {chave}: {e}")
+        finally:
+            with self._lock:
+                self._em_atualizacao.discard(chave)
+
+    def _guardar(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = (time.monotonic(), valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_size:
+                self._dados.popitem(last=False)
+
+    def guardar(self, chave, valor):
+        """Grava um valor obtido fora do `get_or_load` (ex: resposta que chegou atrasada)."""
+        self._guardar(chave, valor)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.stale_hits + self.misses
+            return {
+                "nome": self.nome,
+                "entradas": len(self._dados),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.stale_hits) / total if total else 0.0,
+            }
+
+
+def env_float(nome, padrao):
+    """Lê um número de variável de ambiente, caindo no padrão se ausente/inválido."""
+    try:
+        return float(os.environ.get(nome, padrao))
+    except ValueError:
+        return padrao
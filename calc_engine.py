@@ -1,8 +1,17 @@
 # ARQUIVO: calc_engine.py
 import math
-import requests
+import os
+import threading
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from cache_engine import TTLCache, env_float
+from http_engine import HttpTransport, TransportError
+from gda_engine import GDA_STORE
+from archive_engine import ARCHIVE
+from geo_engine import GRID
+from trace_engine import TRACER, traced
 
 class AgroPhysics:
     @staticmethod
@@ -28,55 +37,391 @@ class AgroPhysics:
         et0 = 0.0023 * (temp + 17.8) * (temp ** 0.5) * 0.408 * 23.0
         return round(et0 * kc, 2)
 
+    # --- VERSÕES VETORIZADAS (LOTE) ---
+    # Mesmas fórmulas das versões escalares, aplicadas a arrays NumPy ou
+    # pandas Series inteiras de uma vez (sem loop Python por ponto).
+    @staticmethod
+    def calc_vpd_vec(temp, umid):
+        t = np.asarray(temp, dtype=float)
+        rh = np.asarray(umid, dtype=float)
+        es = 0.61078 * np.exp((17.27 * t) / (t + 237.3))
+        ea = es * (rh / 100.0)
+        return AgroPhysics._como_entrada(np.round(es - ea, 2), temp)
+
+    @staticmethod
+    def calc_delta_t_vec(temp, umid):
+        t = np.asarray(temp, dtype=float)
+        rh = np.asarray(umid, dtype=float)
+        atan = np.arctan
+        tw = t * atan(0.151977 * np.sqrt(rh + 8.313659)) + atan(t + rh) - atan(rh - 1.676331) + 0.00391838 * rh**1.5 * atan(0.023101 * rh) - 4.686035
+        return AgroPhysics._como_entrada(np.round(t - tw, 1), temp)
+
+    @staticmethod
+    def calc_etc_vec(temp, kc):
+        t = np.asarray(temp, dtype=float)
+        # Temperaturas negativas não têm raiz real: resultado NaN (o escalar falharia)
+        with np.errstate(invalid='ignore'):
+            et0 = 0.0023 * (t + 17.8) * np.sqrt(t) * 0.408 * 23.0
+        return AgroPhysics._como_entrada(np.round(et0 * np.asarray(kc, dtype=float), 2), temp)
+
+    @staticmethod
+    def calc_gda_vec(temp, t_base):
+        t = np.asarray(temp, dtype=float)
+        return AgroPhysics._como_entrada(np.maximum(0.0, t - np.asarray(t_base, dtype=float)), temp)
+
+    @staticmethod
+    def enrich(df, kc=1.0, t_base=10, col_temp='Temp', col_umid='Umid'):
+        """
+        Adiciona as colunas VPD, Delta T, ETc e GDA a um DataFrame com
+        Temp/Umid numa única passada vetorizada. `kc` e `t_base` podem ser
+        escalares ou colunas (um valor por linha, ex: vários talhões).
+        Retorna um novo DataFrame; o original não é alterado.
+        `df` também pode ser um dict de colunas (arrays): o DataFrame final é
+        montado de uma vez, sem cópia intermediária (caminho do parse da previsão).
+        """
+        t = np.asarray(df[col_temp], dtype=float)
+        h = np.asarray(df[col_umid], dtype=float)
+        novas = {
+            'VPD': AgroPhysics.calc_vpd_vec(t, h),
+            'Delta T': AgroPhysics.calc_delta_t_vec(t, h),
+            'ETc': AgroPhysics.calc_etc_vec(t, np.asarray(kc, dtype=float)),
+            'GDA': AgroPhysics.calc_gda_vec(t, np.asarray(t_base, dtype=float)),
+        }
+        if not isinstance(df, pd.DataFrame):
+            return pd.DataFrame({**df, **novas})
+        novas = pd.DataFrame(novas, index=df.index)
+        # Um único concat em vez de quatro inserções de coluna
+        return pd.concat([df.drop(columns=novas.columns, errors='ignore'), novas], axis=1)
+
+    @staticmethod
+    def _como_entrada(resultado, entrada):
+        """Devolve no mesmo formato da entrada (Series com o mesmo índice, escalar ou array)."""
+        if isinstance(entrada, pd.Series):
+            return pd.Series(resultado, index=entrada.index)
+        if np.ndim(resultado) == 0:
+            return float(resultado)
+        return resultado
+
 class WeatherConn:
-    BASE_URL = "https://api.openweathermap.org/data/2.5"
+    # Configuráveis para apontar o app para o servidor local (weather_stub.py)
+    BASE_URL = os.environ.get("AGRO_WEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5").rstrip("/")
+
+    # Cache de previsão compartilhado entre sessões. O OpenWeather publica a
+    # previsão em blocos de 3h, então o TTL padrão acompanha essa cadência.
+    FORECAST_CACHE = TTLCache(
+        ttl=env_float("AGRO_FORECAST_TTL", 3 * 3600),
+        stale_ttl=env_float("AGRO_FORECAST_STALE_TTL", 3600),
+        max_size=int(env_float("AGRO_FORECAST_CACHE_SIZE", 512)),
+        nome="previsao",
+    )
+    # Resultado offline (previsão do arquivo local, ou vazio sem arquivo) por célula:
+    # TTL curto para os reruns seguintes não esperarem de novo os timeouts e retries
+    # da rede; vencido, a próxima chamada volta a tentar a API.
+    OFFLINE_CACHE = TTLCache(
+        ttl=env_float("AGRO_FORECAST_OFFLINE_TTL", 120),
+        max_size=int(env_float("AGRO_FORECAST_CACHE_SIZE", 512)),
+        nome="previsao_offline",
+    )
+    # Tempo atual por célula da grade (radar). Curto: o /weather muda a cada ~10 min
+    RADAR_CACHE = TTLCache(
+        ttl=env_float("AGRO_RADAR_TTL", 600),
+        max_size=int(env_float("AGRO_RADAR_CACHE_SIZE", 4096)),
+        nome="radar",
+    )
+
+    # Grade do radar: N direções igualmente espaçadas em cada raio (graus)
+    RADAR_BEARINGS = int(env_float("AGRO_RADAR_BEARINGS", 8))
+    RADAR_RADII = (0.1,)
+    RADAR_MAX_WORKERS = 16
+
+    GEO_URL = os.environ.get("AGRO_GEO_BASE_URL", "http://api.openweathermap.org/geo/1.0").rstrip("/")
+
+    # Transporte HTTP único (keep-alive + retries) para todas as chamadas
+    HTTP = HttpTransport(
+        endpoints={
+            "geo": {"timeout": 3, "retries": 2},
+            "forecast": {"timeout": 3, "retries": 2},
+            # Radar: 1 retry só, para não estourar o tempo da aba
+            "weather": {"timeout": 2, "retries": 1},
+        },
+        pool_maxsize=RADAR_MAX_WORKERS,
+    )
+
+    _radar_pool = None
+    _init_lock = threading.Lock()
+
+    @staticmethod
+    def _get_radar_pool():
+        if WeatherConn._radar_pool is None:
+            with WeatherConn._init_lock:
+                if WeatherConn._radar_pool is None:
+                    WeatherConn._radar_pool = ThreadPoolExecutor(max_workers=WeatherConn.RADAR_MAX_WORKERS, thread_name_prefix="radar")
+        return WeatherConn._radar_pool
     
     @staticmethod
+    @traced("weather.get_coords")
     def get_coords(city_name, api_key):
         try:
-            url = f"http://api.openweathermap.org/geo/1.0/direct?q={city_name}&limit=1&appid={api_key}"
-            r = requests.get(url, timeout=3).json()
+            r = WeatherConn.HTTP.get_json("geo", f"{WeatherConn.GEO_URL}/direct", {"q": city_name, "limit": 1, "appid": api_key})
             if r: return r[0]['lat'], r[0]['lon']
             return None, None
-        except: return None, None
+        except (TransportError, KeyError, IndexError, TypeError) as e:
+            print(f"⚠️ Geocodificação falhou para '{city_name}': {e}")
+            return None, None
+
+    # Colunas da visão legada (1 ponto a cada 24h)
+    COLS_AMOSTRADO = ['Data', 'Temp', 'Umid', 'VPD', 'Delta T', 'ETc', 'GDA', 'Chuva']
+    # Faixas agronômicas contadas em horas por dia na visão diária
+    FAIXA_DELTA_T_APTO = (2.0, 8.0)
+    FAIXA_VPD_IDEAL = (0.5, 1.5)
+
+    @staticmethod
+    def _forecast_key(lat, lon, kc, t_base):
+        return (GRID.celula(lat, lon), float(kc), float(t_base))
+
+    @staticmethod
+    @traced("weather.get_forecast")
+    def get_forecast(api_key, lat, lon, kc, t_base):
+        """
+        Previsão completa com cache de processo (chave: célula da grade + kc + t_base).
+        A busca usa o centro da célula, então talhões e pontos vizinhos geram
+        uma única requisição. Devolve {'3h': 40 pontos de 3h, 'diario': agregados
+        por dia}; as duas visões saem do mesmo parse da resposta. Vazias se a API falhar.
+        """
+        _, lat_c, lon_c = GRID.encaixar(lat, lon)
+        chave = WeatherConn._forecast_key(lat, lon, kc, t_base)
+        previsao = WeatherConn.FORECAST_CACHE.get_or_load(
+            chave,
+            # Offline recente: devolve o mesmo resultado sem nova tentativa de rede
+            lambda: WeatherConn.OFFLINE_CACHE.get_or_load(
+                chave,
+                lambda: WeatherConn._fetch_forecast(api_key, lat_c, lon_c, kc, t_base),
+                valido=WeatherConn._offline,
+            ),
+            # Falha ou dado offline (arquivo) não entra no cache longo: só no OFFLINE_CACHE
+            valido=lambda p: not WeatherConn._offline(p),
+        )
+        # Cópias: quem chama pode alterar os DataFrames sem contaminar o cache
+        return {k: v.copy() for k, v in previsao.items()}
+
+    @staticmethod
+    def _offline(previsao):
+        return previsao['3h'].empty or previsao['3h'].attrs.get('fonte') == 'arquivo'
+
+    @staticmethod
+    def get_forecast_dataframe(api_key, lat, lon, kc, t_base, modo="amostrado"):
+        """
+        Uma visão da previsão:
+        - "amostrado": 1 ponto a cada 24h com chuva das 24h seguintes (formato legado);
+        - "3h": todos os pontos de 3h;
+        - "diario": min/máx/média, chuva total e horas em faixa por dia.
+        """
+        previsao = WeatherConn.get_forecast(api_key, lat, lon, kc, t_base)
+        if modo == "amostrado":
+            return WeatherConn.amostrar_24h(previsao['3h'])
+        return previsao[modo]
+
+    @staticmethod
+    @traced("weather.fetch_forecast_raw")
+    def fetch_forecast_raw(api_key, lat, lon):
+        """JSON bruto do /forecast (levanta TransportError). Não depende de kc/t_base."""
+        return WeatherConn.HTTP.get_json("forecast", f"{WeatherConn.BASE_URL}/forecast",
+                                         {"lat": lat, "lon": lon, "appid": api_key, "units": "metric", "lang": "pt_br"})
+
+    @staticmethod
+    @traced("weather.registrar_historico")
+    def registrar_historico(lat, lon, df_3h):
+        """Alimenta o histórico de GDA e o arquivo colunar com uma previsão recém-baixada."""
+        try:
+            GDA_STORE.registrar_previsao(lat, lon, df_3h)
+        except Exception as e:
+            print(f"⚠️ Histórico de GDA não atualizado: {e}")
+        try:
+            ARCHIVE.gravar_previsao(lat, lon, df_3h, fuso=df_3h.attrs.get('fuso', 0))
+        except Exception as e:
+            print(f"⚠️ Arquivo de clima não atualizado: {e}")
+
+    @staticmethod
+    @traced("weather.fetch_forecast")
+    def _fetch_forecast(api_key, lat, lon, kc, t_base):
+        try:
+            r = WeatherConn.fetch_forecast_raw(api_key, lat, lon)
+            df_3h = WeatherConn.parse_forecast(r, kc, t_base)
+        except (TransportError, KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"⚠️ Previsão indisponível ({lat}, {lon}): {e}")
+            # Sem rede: usa a última previsão arquivada para o local (se houver)
+            df_3h = WeatherConn.forecast_from_archive(lat, lon, kc, t_base)
+            return {'3h': df_3h, 'diario': WeatherConn.agregar_diario(df_3h, kc, t_base)}
+        # Cada previsão baixada alimenta o histórico local de temperatura (GDA real)
+        # e o arquivo colunar (replay/auditoria/offline)
+        WeatherConn.registrar_historico(lat, lon, df_3h)
+        return {'3h': df_3h, 'diario': WeatherConn.agregar_diario(df_3h, kc, t_base)}
+
+    @staticmethod
+    @traced("weather.parse_forecast")
+    def parse_forecast(r, kc, t_base):
+        """Resposta /forecast -> DataFrame tipado com todos os pontos de 3h + índices agronômicos."""
+        itens = r['list']
+        df = pd.DataFrame({
+            'dt': np.array([it['dt'] for it in itens], dtype=np.int64),
+            'Temp': np.array([it['main']['temp'] for it in itens], dtype=float),
+            'Umid': np.array([it['main']['humidity'] for it in itens], dtype=float),
+            'Vento': np.array([it.get('wind', {}).get('speed', np.nan) for it in itens], dtype=float) * 3.6,  # m/s -> km/h
+            'Chuva': np.array([it.get('rain', {}).get('3h', 0) for it in itens], dtype=float),
+        })
+        # Horário local da lavoura (fuso da resposta); sem ele, o do servidor
+        fuso = r.get('city', {}).get('timezone')
+        if fuso is None:
+            fuso = datetime.now().astimezone().utcoffset().total_seconds()
+        return WeatherConn._montar_3h(df, int(fuso), kc, t_base)
+
+    @staticmethod
+    def _montar_3h(df, fuso, kc, t_base):
+        """Completa pontos brutos (dt, Temp, Umid, Vento, Chuva) com horário local e índices."""
+        # Colunas brutas em arrays; os índices vêm do enrich, que monta o DataFrame de uma vez
+        dt = df['dt'].to_numpy(dtype=np.int64)
+        data_hora = pd.to_datetime(dt + fuso, unit='s')
+        out = AgroPhysics.enrich({
+            'dt': dt,
+            'DataHora': data_hora,
+            'Data': data_hora.strftime('%d/%m'),
+            'Temp': df['Temp'].to_numpy(dtype=float),
+            'Umid': df['Umid'].to_numpy(dtype=float),
+            'Vento': df['Vento'].to_numpy(dtype=float),
+            'Chuva': df['Chuva'].to_numpy(dtype=float),
+        }, kc, t_base)
+        out.attrs['fuso'] = fuso
+        return out
 
     @staticmethod
-    def get_forecast_dataframe(api_key, lat, lon, kc, t_base):
+    @traced("weather.forecast_from_archive")
+    def forecast_from_archive(lat, lon, kc, t_base):
+        """Última previsão arquivada do local, no mesmo formato de parse_forecast (vazia se não houver)."""
         try:
-            url = f"{WeatherConn.BASE_URL}/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric&lang=pt_br"
-            r = requests.get(url, timeout=3).json()
-            
-            data = []
-            # Pega um ponto a cada 24h (indices 0, 8, 16...) para simplicidade visual no gráfico
-            for i in range(0, 40, 8):
-                if i < len(r['list']):
-                    item = r['list'][i]
-                    t = item['main']['temp']
-                    h = item['main']['humidity']
-                    
-                    data.append({
-                        'Data': datetime.fromtimestamp(item['dt']).strftime('%d/%m'),
-                        'Temp': t,
-                        'Umid': h,
-                        'VPD': AgroPhysics.calc_vpd(t, h),
-                        'Delta T': AgroPhysics.calc_delta_t(t, h),
-                        'ETc': AgroPhysics.calc_etc(t, kc),
-                        'GDA': max(0, t - t_base),
-                        # Soma chuva das próximas 24h (8 blocos de 3h)
-                        'Chuva': sum([r['list'][x].get('rain', {}).get('3h', 0) for x in range(i, min(i+8, len(r['list'])))])
-                    })
-            return pd.DataFrame(data)
-        except: return pd.DataFrame()
-
-    @staticmethod
-    def get_radar_simulation(api_key, lat, lon):
+            df, fuso = ARCHIVE.ultima_previsao(lat, lon)
+        except Exception as e:
+            print(f"⚠️ Arquivo de clima ilegível: {e}")
+            df = None
+        if df is None or df.empty:
+            return pd.DataFrame()
+        df = WeatherConn._montar_3h(df, fuso, kc, t_base)
+        df.attrs['fonte'] = 'arquivo'
+        return df
+
+    @staticmethod
+    def amostrar_24h(df_3h):
+        """Visão legada: pontos 0, 8, 16... com a chuva somada das 8 janelas seguintes."""
+        if df_3h.empty:
+            return pd.DataFrame()
+        chuva = df_3h['Chuva'].to_numpy()
+        acum = np.concatenate(([0.0], np.cumsum(chuva)))
+        idx = np.arange(0, len(df_3h), 8)
+        fim = np.minimum(idx + 8, len(df_3h))
+        df = df_3h.iloc[idx].reset_index(drop=True)
+        df['Chuva'] = acum[fim] - acum[idx]
+        return df[WeatherConn.COLS_AMOSTRADO]
+
+    @staticmethod
+    @traced("weather.agregar_diario")
+    def agregar_diario(df_3h, kc, t_base):
+        """Agregação diária vetorizada (groupby) sobre os pontos de 3h."""
+        if df_3h.empty:
+            return pd.DataFrame()
+        d = df_3h.assign(
+            Dia=df_3h['DataHora'].dt.normalize(),
+            Apto=df_3h['Delta T'].between(*WeatherConn.FAIXA_DELTA_T_APTO) * 3,
+            Ideal=df_3h['VPD'].between(*WeatherConn.FAIXA_VPD_IDEAL) * 3,
+        )
+        g = d.groupby('Dia', sort=True)
+        df = g.agg(**{
+            'Temp': ('Temp', 'mean'), 'Temp Min': ('Temp', 'min'), 'Temp Max': ('Temp', 'max'),
+            'Umid': ('Umid', 'mean'), 'Umid Min': ('Umid', 'min'), 'Umid Max': ('Umid', 'max'),
+            'VPD': ('VPD', 'mean'), 'VPD Max': ('VPD', 'max'),
+            'Delta T': ('Delta T', 'mean'), 'Delta T Min': ('Delta T', 'min'), 'Delta T Max': ('Delta T', 'max'),
+            'Vento Max': ('Vento', 'max'),
+            'Chuva': ('Chuva', 'sum'),
+            'Horas Aptas': ('Apto', 'sum'),
+            'Horas VPD Ideal': ('Ideal', 'sum'),
+            'Pontos': ('Temp', 'size'),
+        }).reset_index()
+        df['Data'] = df['Dia'].dt.strftime('%d/%m')
+        # ETc do dia pela temperatura média; GDA pelo método da média (Tmax+Tmin)/2
+        df['ETc'] = AgroPhysics.calc_etc_vec(df['Temp'], kc)
+        df['GDA'] = AgroPhysics.calc_gda_vec((df['Temp Max'] + df['Temp Min']) / 2.0, t_base)
+        for col in ('Temp', 'Umid', 'Delta T'):
+            df[col] = df[col].round(1)
+        df['VPD'] = df['VPD'].round(2)
+        df['Chuva'] = df['Chuva'].round(1)
+        return df
+
+    # Rosa dos ventos (16 rumos); para 4 ou 8 direções usa-se um subconjunto
+    _ROSA = ["Norte", "NNE", "NE", "ENE", "Leste", "ESE", "SE", "SSE",
+             "Sul", "SSO", "SO", "OSO", "Oeste", "ONO", "NO", "NNO"]
+
+    @staticmethod
+    def radar_points(lat, lon, bearings=None, radii=None):
+        """
+        Gera a grade de amostragem do radar: `bearings` direções igualmente
+        espaçadas (a partir do Norte, sentido horário) em cada raio de `radii` graus.
+        """
+        bearings = bearings or WeatherConn.RADAR_BEARINGS
+        radii = radii or WeatherConn.RADAR_RADII
+        pontos = []
+        for raio in radii:
+            for k in range(bearings):
+                ang = 360.0 * k / bearings
+                nome = WeatherConn._ROSA[int(round(ang / 22.5)) % 16] if 16 % bearings == 0 else f"{ang:.0f}°"
+                if len(radii) > 1:
+                    nome = f"{nome} {raio * 111:.0f}km"
+                rad = math.radians(ang)
+                pontos.append({
+                    "Direcao": nome,
+                    "Rumo": ang,
+                    "Raio": raio,
+                    "Lat": round(lat + raio * math.cos(rad), 5),
+                    "Lon": round(lon + raio * math.sin(rad), 5),
+                })
+        return pontos
+
+    @staticmethod
+    def _fetch_current(api_key, lat, lon):
+        """Tempo atual (/weather) de uma coordenada (levanta TransportError/KeyError)."""
+        r = WeatherConn.HTTP.get_json("weather", f"{WeatherConn.BASE_URL}/weather",
+                                      {"lat": lat, "lon": lon, "appid": api_key, "units": "metric"})
+        is_raining = "rain" in r or "chuva" in r['weather'][0]['description']
+        return {"Temp": r['main']['temp'], "Chuva": "Sim" if is_raining else "Não", "OK": True}
+
+    @staticmethod
+    @traced("weather.sample_radar_cell")
+    def _sample_radar_cell(api_key, celula):
+        """Amostra uma célula (cache curto); em caso de falha devolve a célula marcada sem dados."""
+        lat_c, lon_c = GRID.centro(celula)
         try:
-            # Simulação de pontos cardeais
-            points = {"Norte": (lat+0.1, lon), "Sul": (lat-0.1, lon), "Leste": (lat, lon+0.1), "Oeste": (lat, lon-0.1)}
-            res = []
-            for d, p in points.items():
-                r = requests.get(f"{WeatherConn.BASE_URL}/weather?lat={p[0]}&lon={p[1]}&appid={api_key}&units=metric", timeout=2).json()
-                is_raining = "rain" in r or "chuva" in r['weather'][0]['description']
-                res.append({"Direcao": d, "Temp": r['main']['temp'], "Chuva": "Sim" if is_raining else "Não"})
-            return pd.DataFrame(res)
-        except: return pd.DataFrame()
+            # Exceção não entra no cache: a próxima consulta tenta de novo
+            return WeatherConn.RADAR_CACHE.get_or_load(
+                celula, lambda: WeatherConn._fetch_current(api_key, lat_c, lon_c))
+        except (TransportError, KeyError, IndexError, TypeError) as e:
+            print(f"⚠️ Radar sem dados na célula {celula}: {e}")
+            return {"Temp": float('nan'), "Chuva": "Sem dados", "OK": False}
+
+    @staticmethod
+    @traced("weather.get_radar_simulation")
+    def get_radar_simulation(api_key, lat, lon, bearings=None, radii=None):
+        """
+        Amostra todos os pontos da grade em paralelo (tempo total ~ 1 requisição).
+        Pontos na mesma célula de clima (deste radar ou de radares vizinhos)
+        compartilham uma única amostra. Pontos que falharem vêm com OK=False em
+        vez de derrubar o radar inteiro.
+        """
+        pontos = WeatherConn.radar_points(lat, lon, bearings, radii)
+        celulas = [GRID.celula(p['Lat'], p['Lon']) for p in pontos]
+        unicas = list(dict.fromkeys(celulas))
+        pool = WeatherConn._get_radar_pool()
+        ctx = TRACER.contexto()  # spans das threads do pool entram no mesmo trace
+
+        def amostrar(celula):
+            with TRACER.adotar(ctx):
+                return WeatherConn._sample_radar_cell(api_key, celula)
+        amostras = dict(zip(unicas, pool.map(amostrar, unicas)))
+        res = [{**p, "Celula": c, **amostras[c]} for p, c in zip(pontos, celulas)]
+        return pd.DataFrame(res)
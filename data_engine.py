@@ -1,10 +1,27 @@
 # ARQUIVO: data_engine.py
 # VERSÃO: Enterprise Silent (Ignora falhas sem travar o app)
 import json
-import streamlit as st
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
 from pathlib import Path
 import collections.abc
 
+from trace_engine import traced
+
+BASE_DIR = Path(__file__).parent.resolve()
+DB_FOLDER = BASE_DIR / "database"
+
+# Snapshot binário do banco já fundido (gerado por compile_snapshot)
+SNAPSHOT_NAME = ".snapshot.pkl"
+# Incrementar sempre que o formato/conteúdo do snapshot mudar
+SNAPSHOT_VERSION = 3
+# Intervalo (s) do watcher que procura arquivos alterados na pasta database/
+WATCH_INTERVAL = float(os.environ.get("AGRO_DB_WATCH_INTERVAL", 2.0))
+
 def deep_update(d, u):
     """
     Função recursiva para fundir dicionários (Merge Profundo).
@@ -17,47 +34,290 @@ def deep_update(d, u):
             d[k] = v
     return d
 
-@st.cache_data(show_spinner=False)
-def get_database():
-    combined_data = {}
-    
-    # 1. Localiza a pasta database de forma robusta
-    base_dir = Path(__file__).parent.resolve()
-    db_folder = base_dir / "database"
-    
-    # Se a pasta não existir, retorna vazio silenciosamente (sem erro vermelho)
-    if not db_folder.exists():
-        print(f"⚠️ Alerta: Pasta {db_folder} não encontrada.")
-        return {}
-
-    # 2. Varre todos os arquivos .json em todas as subpastas
-    json_files = list(db_folder.rglob("*.json"))
-    
-    for json_file in json_files:
+def _list_json_files(db_folder):
+    # Ordenado: a ordem do merge fica igual em todas as máquinas/processos
+    return sorted(db_folder.rglob("*.json"))
+
+def build_manifest(db_folder=DB_FOLDER):
+    """Manifesto das fontes: {caminho relativo: [tamanho, mtime_ns]}. Só faz stat, não lê."""
+    manifest = {}
+    for json_file in _list_json_files(db_folder):
         try:
-            # --- BLINDAGEM NÍVEL 1: Tamanho do Arquivo ---
-            # Se for menor que 5 bytes (vazio ou só "{}"), pula silenciosamente.
-            if json_file.stat().st_size < 5:
-                continue 
-
-            # --- BLINDAGEM NÍVEL 2: Leitura Segura ---
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # Verifica se o JSON realmente tem dados (não é uma lista vazia ou null)
-                if data:
-                    combined_data = deep_update(combined_data, data)
-                
-        except (json.JSONDecodeError, OSError, UnicodeDecodeError):
-            # --- BLINDAGEM NÍVEL 3: Supressão de Erro ---
-            # Se der QUALQUER erro de leitura, nós NÃO mostramos st.error.
-            # Apenas imprimimos no console (invisível para o usuário final) e continuamos.
-            print(f"⚠️ Arquivo ignorado (corrompido/vazio): {json_file.name}")
-            continue
-            
-        except Exception as e:
-            # Erros genéricos também são apenas logados
-            print(f"⚠️ Erro inesperado em {json_file.name}: {e}")
+            st_ = json_file.stat()
+        except OSError:
             continue
+        manifest[json_file.relative_to(db_folder).as_posix()] = [st_.st_size, st_.st_mtime_ns]
+    return manifest
+
+def load_json_file(json_file):
+    """Lê um arquivo do banco com as blindagens de sempre. Devolve None se for ignorado."""
+    try:
+        # --- BLINDAGEM NÍVEL 1: Tamanho do Arquivo ---
+        # Se for menor que 5 bytes (vazio ou só "{}"), pula silenciosamente.
+        if json_file.stat().st_size < 5:
+            return None
+
+        # --- BLINDAGEM NÍVEL 2: Leitura Segura ---
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # Verifica se o JSON realmente tem dados (não é uma lista vazia ou null)
+        return data or None
+
+    except (json.JSONDecodeError, OSError, UnicodeDecodeError):
+        # --- BLINDAGEM NÍVEL 3: Supressão de Erro ---
+        # Se der QUALQUER erro de leitura, nós NÃO mostramos st.error.
+        # Apenas imprimimos no console (invisível para o usuário final) e continuamos.
+        print(f"⚠️ Arquivo ignorado (corrompido/vazio): {json_file.name}")
+        return None
+
+    except Exception as e:
+        # Erros genéricos também são apenas logados
+        print(f"⚠️ Erro inesperado em {json_file.name}: {e}")
+        return None
+
+# Sinônimos aceitos nos JSONs -> campo canônico (primeiro valor não vazio vence).
+# Aplicado uma vez na carga: a interface lê só o campo canônico.
+SINONIMOS = {
+    "variedade": {
+        "info": ["info", "desc", "detalhes"],
+    },
+    "fase": {
+        "desc": ["desc", "diagnostico"],
+        "fisiologia": ["fisiologia", "desenvolvimento"],
+        "manejo": ["manejo", "recomendacao"],
+    },
+    "produto": {
+        "Alvo": ["Alvo", "Doenca", "Praga"],
+        "Ativo": ["Ativo", "Ingrediente", "Produto"],
+        "Estrategia": ["Estrategia", "Obs", "Manejo", "Nota"],
+        "Grupo": ["Grupo", "Codigos", "Mecanismo"],
+        "Tipo": ["Tipo"],
+    },
+}
 
+def canonicalize_record(registro, sinonimos):
+    """
+    Cópia do registro com os campos canônicos preenchidos a partir dos
+    sinônimos (busca sem diferenciar maiúsculas). Chaves originais são mantidas.
+    """
+    if not isinstance(registro, dict):
+        return registro
+    novo = dict(registro)
+    chaves_norm = {k.lower(): v for k, v in registro.items()}
+    for canonico, lista in sinonimos.items():
+        for chave in lista:
+            valor = chaves_norm.get(chave.lower())
+            if valor and str(valor).strip() != "":
+                novo[canonico] = valor
+                break
+    return novo
+
+def canonicalize_crop(dados):
+    """Aplica SINONIMOS em genéticas, fases e produtos de uma cultura já fundida."""
+    if not isinstance(dados, dict):
+        return dados
+    dados = dict(dados)
+    if isinstance(dados.get("vars"), dict):
+        dados["vars"] = {v: canonicalize_record(reg, SINONIMOS["variedade"]) for v, reg in dados["vars"].items()}
+    if isinstance(dados.get("fases"), dict):
+        fases = {}
+        for nome, fase in dados["fases"].items():
+            fase = canonicalize_record(fase, SINONIMOS["fase"])
+            if isinstance(fase, dict) and isinstance(fase.get("quimica"), list):
+                fase["quimica"] = [canonicalize_record(p, SINONIMOS["produto"]) for p in fase["quimica"]]
+            fases[nome] = fase
+        dados["fases"] = fases
+    return dados
+
+def merge_files(files, keys=None):
+    """
+    Funde os JSONs já lidos ({caminho: dados}) em ordem de caminho.
+    Com `keys`, recalcula só essas chaves de topo (culturas).
+    """
+    combined_data = {}
+    for rel in sorted(files):
+        data = files[rel]
+        if keys is not None:
+            data = {k: v for k, v in data.items() if k in keys}
+        if data:
+            combined_data = deep_update(combined_data, data)
     return combined_data
+
+
+class KnowledgeBase:
+    """
+    Banco de conhecimento em memória com recarga incremental.
+
+    Guarda cada arquivo-fonte já lido e o manifesto (tamanho + mtime). Em
+    `refresh()` só os arquivos alterados são relidos, só as culturas (chaves de
+    topo) tocadas por eles são refundidas, e o dicionário final é trocado de
+    uma vez (troca de referência atômica): quem já tem o banco antigo continua
+    com ele, as próximas leituras pegam o novo.
+    """
+
+    def __init__(self, db_folder=DB_FOLDER):
+        self.db_folder = Path(db_folder)
+        self.version = 0
+        self._files = {}
+        self._manifest = {}
+        self._data = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.load()
+        return self._data
+
+    @traced("data.load")
+    def load(self, use_snapshot=True):
+        """Carga inicial: parte do snapshot (se houver) e relê só o que mudou."""
+        with self._lock:
+            if self._data is not None:
+                return self._data
+            self._data = {}
+            if not self.db_folder.exists():
+                # Se a pasta não existir, retorna vazio silenciosamente (sem erro vermelho)
+                print(f"⚠️ Alerta: Pasta {self.db_folder} não encontrada.")
+                return self._data
+            if use_snapshot:
+                payload = _read_snapshot(self.db_folder)
+                if payload:
+                    self._files = payload["files"]
+                    self._manifest = payload["manifest"]
+                    self._data = payload["data"]
+        mudou = self.refresh(save=use_snapshot)
+        if use_snapshot and not mudou and not (self.db_folder / SNAPSHOT_NAME).exists():
+            self.save_snapshot()
+        return self._data
+
+    @traced("data.refresh")
+    def refresh(self, save=True):
+        """
+        Compara o manifesto atual com o anterior e aplica só a diferença.
+        Devolve o conjunto de culturas recalculadas (vazio se nada mudou).
+        """
+        with self._lock:
+            novo_manifest = build_manifest(self.db_folder)
+            if novo_manifest == self._manifest:
+                return set()
+            inicial = not self._manifest
+
+            alterados = [rel for rel, meta in novo_manifest.items() if self._manifest.get(rel) != meta]
+            removidos = [rel for rel in self._manifest if rel not in novo_manifest]
+
+            files = dict(self._files)
+            afetadas = set()
+            for rel in removidos:
+                afetadas.update(files.pop(rel, {}).keys())
+            for rel in alterados:
+                afetadas.update(files.get(rel, {}).keys())
+                data = load_json_file(self.db_folder / rel)
+                if isinstance(data, dict):
+                    files[rel] = data
+                    afetadas.update(data.keys())
+                else:
+                    files.pop(rel, None)
+
+            parcial = merge_files(files, keys=afetadas)
+            novo = dict(self._data or {})
+            for crop in afetadas:
+                if crop in parcial:
+                    novo[crop] = canonicalize_crop(parcial[crop])
+                else:
+                    novo.pop(crop, None)
+
+            # Troca atômica do banco publicado
+            self._files, self._manifest, self._data = files, novo_manifest, novo
+            self.version += 1
+
+        if afetadas and not inicial:
+            print(f"🔄 Banco recarregado: {len(alterados) + len(removidos)} arquivo(s), culturas: {', '.join(sorted(afetadas))}")
+        if save:
+            self.save_snapshot()
+        return afetadas
+
+    def save_snapshot(self):
+        with self._lock:
+            payload = {"version": SNAPSHOT_VERSION, "manifest": self._manifest, "files": self._files, "data": self._data}
+        _write_snapshot(self.db_folder, payload)
+
+    def start_watcher(self, interval=WATCH_INTERVAL):
+        """Thread de fundo que chama refresh() periodicamente (idempotente)."""
+        if self._watcher is not None or interval <= 0:
+            return
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"⚠️ Watcher do banco: {e}")
+        self._watcher = threading.Thread(target=_loop, name="db-watcher", daemon=True)
+        self._watcher.start()
+
+
+def _read_snapshot(db_folder):
+    path = db_folder / SNAPSHOT_NAME
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"⚠️ Snapshot ignorado (ilegível): {e}")
+        return None
+    if payload.get("version") != SNAPSHOT_VERSION:
+        return None
+    return payload
+
+def _write_snapshot(db_folder, payload):
+    try:
+        # Escrita atômica: vários workers podem compilar ao mesmo tempo
+        fd, tmp = tempfile.mkstemp(dir=db_folder, prefix=".snapshot-", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, db_folder / SNAPSHOT_NAME)
+    except OSError as e:
+        # Pasta somente leitura: segue sem snapshot
+        print(f"⚠️ Snapshot não gravado: {e}")
+
+@traced("data.compile_snapshot")
+def compile_snapshot(db_folder=DB_FOLDER):
+    """
+    Passo de compilação: funde todas as fontes e grava um snapshot binário
+    com o manifesto (tamanho + mtime de cada fonte). Devolve o banco fundido.
+    """
+    kb = KnowledgeBase(db_folder)
+    data = kb.load(use_snapshot=False)
+    kb.save_snapshot()
+    return data
+
+
+# Instância do processo: compartilhada por todas as sessões Streamlit
+KB = KnowledgeBase()
+
+@traced("data.get_database")
+def get_database():
+    """
+    Banco fundido atual. A primeira chamada carrega (snapshot + diferenças) e
+    liga o watcher; as seguintes devolvem a versão mais recente sem custo.
+    O dicionário é compartilhado: trate-o como somente leitura.
+    """
+    data = KB.data
+    KB.start_watcher()
+    return data
+
+@traced("data.reload_database")
+def reload_database():
+    """Força a verificação imediata das fontes (ex: após rodar um script de correção)."""
+    return KB.refresh()
+
+if __name__ == "__main__":
+    # Uso: python data_engine.py  -> (re)compila o snapshot do banco
+    pasta = Path(sys.argv[1]).resolve() if len(sys.argv) > 1 else DB_FOLDER
+    banco = compile_snapshot(pasta)
+    print(f"✅ Snapshot compilado: {len(banco)} culturas, {len(build_manifest(pasta))} arquivos-fonte.")
@@ -0,0 +1,163 @@
+# ARQUIVO: gda_engine.py
+# VERSÃO: Acúmulo real de Graus-Dia (SQLite + somas de prefixo)
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+from geo_engine import GRID
+
+BASE_DIR = Path(__file__).parent.resolve()
+DATA_DIR = Path(os.environ.get("AGRO_DATA_DIR", BASE_DIR / "dados_locais"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pontos (
+    loc TEXT NOT NULL, dt INTEGER NOT NULL, dia TEXT NOT NULL, temp REAL NOT NULL,
+    PRIMARY KEY (loc, dt)
+);
+CREATE TABLE IF NOT EXISTS diario (
+    loc TEXT NOT NULL, dia TEXT NOT NULL, tmin REAL NOT NULL, tmax REAL NOT NULL, n INTEGER NOT NULL,
+    PRIMARY KEY (loc, dia)
+);
+CREATE TABLE IF NOT EXISTS prefixo (
+    loc TEXT NOT NULL, t_base REAL NOT NULL, dia TEXT NOT NULL, gda REAL NOT NULL, acum REAL NOT NULL, ordem INTEGER NOT NULL,
+    PRIMARY KEY (loc, t_base, dia)
+);
+"""
+
+
+def chave_local(lat, lon):
+    """Mesma célula de clima do cache de previsão (geo_engine.GRID)."""
+    return GRID.celula(lat, lon)
+
+
+class GDAStore:
+    """
+    Armazém local de temperatura diária por localização.
+
+    - `pontos`: cada ponto de 3h já recebido (uma previsão nova sobrescreve o mesmo dt).
+    - `diario`: Tmin/Tmax por dia local, recalculado só para os dias tocados.
+    - `prefixo`: para cada (local, t_base), GDA do dia e soma acumulada desde o
+      primeiro dia guardado. GDA de qualquer intervalo = diferença de dois
+      prefixos (duas buscas em índice), não importa o tamanho da safra.
+    GDA diário pelo método da média: max(0, (Tmax + Tmin) / 2 - t_base).
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DATA_DIR / "clima_gda.sqlite"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # --- ESCRITA ---
+    def registrar_previsao(self, lat, lon, df_3h):
+        """
+        Grava os pontos de 3h de uma previsão (colunas dt, DataHora, Temp) e
+        atualiza diário e prefixos a partir do primeiro dia alterado.
+        Devolve a lista de dias tocados.
+        """
+        if df_3h is None or df_3h.empty:
+            return []
+        loc = chave_local(lat, lon)
+        dias = df_3h['DataHora'].dt.strftime('%Y-%m-%d').tolist()
+        linhas = list(zip([loc] * len(df_3h), df_3h['dt'].astype(int).tolist(), dias, df_3h['Temp'].astype(float).tolist()))
+        tocados = sorted(set(dias))
+
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO pontos (loc, dt, dia, temp) VALUES (?, ?, ?, ?)", linhas)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO diario (loc, dia, tmin, tmax, n) "
+                    "SELECT loc, dia, MIN(temp), MAX(temp), COUNT(*) FROM pontos WHERE loc = ? AND dia = ? GROUP BY loc, dia",
+                    [(loc, d) for d in tocados],
+                )
+                bases = [b for (b,) in conn.execute("SELECT DISTINCT t_base FROM prefixo WHERE loc = ?", (loc,))]
+                for t_base in bases:
+                    self._recalcular_prefixo(conn, loc, t_base, tocados[0])
+        return tocados
+
+    def _recalcular_prefixo(self, conn, loc, t_base, desde_dia):
+        """Refaz o prefixo de `desde_dia` em diante (normalmente só os últimos dias)."""
+        ant = conn.execute(
+            "SELECT acum, ordem FROM prefixo WHERE loc = ? AND t_base = ? AND dia < ? ORDER BY dia DESC LIMIT 1",
+            (loc, t_base, desde_dia),
+        ).fetchone()
+        acum, ordem = ant if ant else (0.0, 0)
+        conn.execute("DELETE FROM prefixo WHERE loc = ? AND t_base = ? AND dia >= ?", (loc, t_base, desde_dia))
+        novos = []
+        for dia, tmin, tmax in conn.execute(
+            "SELECT dia, tmin, tmax FROM diario WHERE loc = ? AND dia >= ? ORDER BY dia", (loc, desde_dia)
+        ):
+            gda = max(0.0, (tmin + tmax) / 2.0 - t_base)
+            acum += gda
+            ordem += 1
+            novos.append((loc, t_base, dia, gda, acum, ordem))
+        conn.executemany("INSERT INTO prefixo (loc, t_base, dia, gda, acum, ordem) VALUES (?, ?, ?, ?, ?, ?)", novos)
+
+    def _garantir_base(self, conn, loc, t_base):
+        """Primeira consulta de um t_base para o local: monta o prefixo inteiro uma vez."""
+        existe = conn.execute("SELECT 1 FROM prefixo WHERE loc = ? AND t_base = ? LIMIT 1", (loc, t_base)).fetchone()
+        if existe:
+            return
+        if not conn.execute("SELECT 1 FROM diario WHERE loc = ? LIMIT 1", (loc,)).fetchone():
+            return  # local sem histórico: nada a montar
+        with self._lock:
+            with conn:
+                self._recalcular_prefixo(conn, loc, t_base, "0000-00-00")
+
+    # --- CONSULTA ---
+    def _prefixo_ate(self, conn, loc, t_base, dia):
+        return conn.execute(
+            "SELECT acum, ordem FROM prefixo WHERE loc = ? AND t_base = ? AND dia <= ? ORDER BY dia DESC LIMIT 1",
+            (loc, t_base, dia),
+        ).fetchone()
+
+    def gda_acumulado(self, lat, lon, t_base, desde, ate=None):
+        """
+        Graus-dia de `desde` (data de plantio) até `ate` (padrão: hoje), inclusive.
+
+        Devolve dict com 'gda', 'dias' (no intervalo), 'dias_cobertos' (com dado
+        real) e 'estimado' (True se dias sem dado foram preenchidos pela média
+        diária do histórico guardado). 'gda' é None se não há dado algum.
+        """
+        ate = ate or date.today()
+        loc = chave_local(lat, lon)
+        t_base = float(t_base)
+        conn = self._conn()
+        self._garantir_base(conn, loc, t_base)
+
+        dias_total = (ate - desde).days + 1
+        if dias_total <= 0:
+            return {"gda": 0.0, "dias": 0, "dias_cobertos": 0, "estimado": False}
+
+        fim = self._prefixo_ate(conn, loc, t_base, ate.isoformat())
+        if fim is None:
+            return {"gda": None, "dias": dias_total, "dias_cobertos": 0, "estimado": True}
+        ini = self._prefixo_ate(conn, loc, t_base, (desde - timedelta(days=1)).isoformat()) or (0.0, 0)
+
+        gda = fim[0] - ini[0]
+        cobertos = fim[1] - ini[1]
+        faltando = dias_total - cobertos
+        if faltando > 0:
+            # Média diária de todo o histórico do local (último prefixo / nº de dias)
+            ult = conn.execute(
+                "SELECT acum, ordem FROM prefixo WHERE loc = ? AND t_base = ? ORDER BY dia DESC LIMIT 1", (loc, t_base)
+            ).fetchone()
+            gda += faltando * (ult[0] / ult[1])
+        return {"gda": gda, "dias": dias_total, "dias_cobertos": cobertos, "estimado": faltando > 0}
+
+
+# Instância do processo
+GDA_STORE = GDAStore()
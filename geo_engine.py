@@ -0,0 +1,121 @@
+# ARQUIVO: geo_engine.py
+# VERSÃO: Grade de células de clima (deduplicação geoespacial de talhões/pontos)
+import math
+import os
+from collections import defaultdict
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precisao=6):
+    """Geohash padrão (precisão 6 ~ 1,2 x 0,6 km; 5 ~ 4,9 x 4,9 km)."""
+    lat_int, lon_int = [-90.0, 90.0], [-180.0, 180.0]
+    bits, bit, ch, par = [16, 8, 4, 2, 1], 0, 0, True
+    out = []
+    while len(out) < precisao:
+        intervalo, valor = (lon_int, lon) if par else (lat_int, lat)
+        meio = (intervalo[0] + intervalo[1]) / 2
+        if valor >= meio:
+            ch |= bits[bit]
+            intervalo[0] = meio
+        else:
+            intervalo[1] = meio
+        par = not par
+        if bit < 4:
+            bit += 1
+        else:
+            out.append(_BASE32[ch])
+            bit, ch = 0, 0
+    return "".join(out)
+
+
+def geohash_decode(gh):
+    """Centro (lat, lon) da célula geohash."""
+    lat_int, lon_int = [-90.0, 90.0], [-180.0, 180.0]
+    par = True
+    for c in gh:
+        cd = _BASE32.index(c)
+        for mask in (16, 8, 4, 2, 1):
+            intervalo = lon_int if par else lat_int
+            meio = (intervalo[0] + intervalo[1]) / 2
+            if cd & mask:
+                intervalo[0] = meio
+            else:
+                intervalo[1] = meio
+            par = not par
+    return (lat_int[0] + lat_int[1]) / 2, (lon_int[0] + lon_int[1]) / 2
+
+
+class WeatherGrid:
+    """
+    Encaixa coordenadas numa grade de células de clima.
+
+    Modos: "grau:<tamanho>" (ex: "grau:0.01" ~ 1,1 km) ou "geohash:<precisão>".
+    Tudo que cai na mesma célula usa a mesma coordenada (o centro da célula)
+    nas chamadas externas, então é buscado e calculado uma única vez.
+    """
+
+    def __init__(self, spec="grau:0.01"):
+        modo, _, valor = str(spec).partition(":")
+        if modo == "geohash":
+            self.modo, self.precisao = "geohash", int(valor or 6)
+        else:
+            self.modo, self.tamanho = "grau", float(valor or modo or 0.01)
+            # Casas decimais suficientes para escrever o centro sem ruído de float
+            self._casas = max(0, -int(math.floor(math.log10(self.tamanho)))) + 1
+
+    def __repr__(self):
+        return f"WeatherGrid({self.modo}:{self.precisao if self.modo == 'geohash' else self.tamanho})"
+
+    def celula(self, lat, lon):
+        """Identificador estável (texto) da célula que contém o ponto."""
+        if self.modo == "geohash":
+            return geohash_encode(float(lat), float(lon), self.precisao)
+        ix = math.floor(float(lat) / self.tamanho)
+        iy = math.floor(float(lon) / self.tamanho)
+        c_lat, c_lon = self._centro_grau(ix, iy)
+        return f"{c_lat:.{self._casas}f},{c_lon:.{self._casas}f}"
+
+    def _centro_grau(self, ix, iy):
+        return (ix + 0.5) * self.tamanho, (iy + 0.5) * self.tamanho
+
+    def centro(self, celula):
+        """Coordenada (lat, lon) usada nas chamadas externas para a célula."""
+        if self.modo == "geohash":
+            return geohash_decode(celula)
+        lat, lon = celula.split(",")
+        return float(lat), float(lon)
+
+    def encaixar(self, lat, lon):
+        """(celula, lat_centro, lon_centro) para um ponto."""
+        cel = self.celula(lat, lon)
+        return (cel, *self.centro(cel))
+
+    def _indices_por_celula(self, itens, lat_key, lon_key):
+        """{celula: [posições em itens]}, na ordem em que as células aparecem."""
+        grupos = defaultdict(list)
+        for i, it in enumerate(itens):
+            grupos[self.celula(it[lat_key], it[lon_key])].append(i)
+        return grupos
+
+    def agrupar(self, itens, lat_key="lat", lon_key="lon"):
+        """{celula: [itens]} para dicts com lat/lon (talhões do lote, pontos do mapa)."""
+        itens = list(itens)
+        return {cel: [itens[i] for i in pos] for cel, pos in self._indices_por_celula(itens, lat_key, lon_key).items()}
+
+    def resolver(self, itens, funcao, lat_key="lat", lon_key="lon"):
+        """
+        Chama `funcao(lat_centro, lon_centro)` uma vez por célula e devolve a
+        lista de resultados na mesma ordem de `itens` (fan-out).
+        """
+        itens = list(itens)
+        out = [None] * len(itens)
+        for cel, pos in self._indices_por_celula(itens, lat_key, lon_key).items():
+            res = funcao(*self.centro(cel))
+            for i in pos:
+                out[i] = res
+        return out
+
+
+# Grade padrão do processo (env AGRO_GRID, ex: "grau:0.01" ou "geohash:6")
+GRID = WeatherGrid(os.environ.get("AGRO_GRID", "grau:0.01"))
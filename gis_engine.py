@@ -0,0 +1,175 @@
+# ARQUIVO: gis_engine.py
+# VERSÃO: Pontos GIS persistentes (SQLite + R-Tree) e camadas leves do mapa
+import html
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from gda_engine import DATA_DIR
+
+# Máximo de pontos enviados ao navegador por render (o resto fica para o zoom)
+MAX_PONTOS_MAPA = int(os.environ.get("AGRO_GIS_MAX_PONTOS", 5000))
+
+TILE_SATELITE = "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pontos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    grupo TEXT NOT NULL, nome TEXT NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL, criado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pontos_grupo ON pontos (grupo, id);
+"""
+_SCHEMA_RTREE = "CREATE VIRTUAL TABLE IF NOT EXISTS pontos_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+_SCHEMA_SEM_RTREE = "CREATE INDEX IF NOT EXISTS pontos_latlon ON pontos (lat, lon)"
+
+
+class PointStore:
+    """
+    Pontos de campo (monitoramento/scouting) persistidos em SQLite.
+
+    Consulta por janela do mapa via R-Tree (módulo rtree do SQLite); sem ele,
+    cai num índice B-tree em (lat, lon). Sobrevive a recargas; o arquivo é do
+    processo, e `grupo` (obrigatório, sem padrão) separa as fazendas: cada
+    sessão só grava e enxerga os pontos do seu grupo.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DATA_DIR / "pontos_gis.sqlite"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.rtree = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.execute(_SCHEMA_RTREE)
+                self.rtree = True
+            except sqlite3.OperationalError:
+                conn.execute(_SCHEMA_SEM_RTREE)
+                self.rtree = False
+            self._local.conn = conn
+        return conn
+
+    # --- ESCRITA ---
+    def adicionar(self, nome, lat, lon, *, grupo):
+        lat, lon = float(lat), float(lon)
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                cur = conn.execute("INSERT INTO pontos (grupo, nome, lat, lon, criado) VALUES (?, ?, ?, ?, ?)",
+                                   (grupo, str(nome or "Ponto"), lat, lon, time.time()))
+                if self.rtree:
+                    conn.execute("INSERT INTO pontos_rtree VALUES (?, ?, ?, ?, ?)", (cur.lastrowid, lat, lat, lon, lon))
+        return cur.lastrowid
+
+    def adicionar_varios(self, pontos, *, grupo):
+        """Importação em lote: [(nome, lat, lon), ...] numa transação só."""
+        agora = time.time()
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                for nome, lat, lon in pontos:
+                    cur = conn.execute("INSERT INTO pontos (grupo, nome, lat, lon, criado) VALUES (?, ?, ?, ?, ?)",
+                                       (grupo, str(nome or "Ponto"), float(lat), float(lon), agora))
+                    if self.rtree:
+                        conn.execute("INSERT INTO pontos_rtree VALUES (?, ?, ?, ?, ?)",
+                                     (cur.lastrowid, float(lat), float(lat), float(lon), float(lon)))
+
+    def remover(self, ponto_id, *, grupo):
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                if not conn.execute("DELETE FROM pontos WHERE id = ? AND grupo = ?", (ponto_id, grupo)).rowcount:
+                    return
+                if self.rtree:
+                    conn.execute("DELETE FROM pontos_rtree WHERE id = ?", (ponto_id,))
+
+    # --- CONSULTA ---
+    def contar(self, *, grupo):
+        return self._conn().execute("SELECT COUNT(*) FROM pontos WHERE grupo = ?", (grupo,)).fetchone()[0]
+
+    def recentes(self, *, grupo, limite=20):
+        """Últimos pontos gravados: [{'id', 'n', 'lat', 'lon'}]."""
+        linhas = self._conn().execute(
+            "SELECT id, nome, lat, lon FROM pontos WHERE grupo = ? ORDER BY id DESC LIMIT ?", (grupo, limite))
+        return [{"id": i, "n": n, "lat": la, "lon": lo} for i, n, la, lo in linhas]
+
+    def na_janela(self, sul, oeste, norte, leste, *, grupo, limite=MAX_PONTOS_MAPA):
+        """
+        Pontos dentro do retângulo visível (mais novos primeiro, até `limite`).
+        Devolve (pontos, total_na_janela).
+        """
+        conn = self._conn()
+        if self.rtree:
+            # CROSS JOIN fixa a ordem: R-Tree primeiro (o planner tende a varrer o índice de grupo)
+            base = ("FROM pontos_rtree r CROSS JOIN pontos p ON p.id = r.id "
+                    "WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ? AND p.grupo = ?")
+        else:
+            base = "FROM pontos p WHERE p.lat BETWEEN ? AND ? AND p.lon BETWEEN ? AND ? AND p.grupo = ?"
+        args = (sul, norte, oeste, leste, grupo)
+        total = conn.execute(f"SELECT COUNT(*) {base}", args).fetchone()[0]
+        linhas = conn.execute(f"SELECT p.id, p.nome, p.lat, p.lon {base} ORDER BY p.id DESC LIMIT ?", (*args, limite))
+        return [{"id": i, "n": n, "lat": la, "lon": lo} for i, n, la, lo in linhas], total
+
+
+# --- CAMADAS DO MAPA (folium importado só aqui: quem não desenha mapa não paga o import) ---
+def mapa_base(zoom=15):
+    """Mapa com satélite e plugins, sem pontos: montado uma vez e reaproveitado."""
+    import folium
+    from folium.plugins import Draw, Fullscreen, LocateControl
+
+    m = folium.Map(location=[0, 0], zoom_start=zoom)
+    folium.TileLayer(TILE_SATELITE, attr='Esri', name='Sat').add_to(m)
+    LocateControl().add_to(m)
+    Draw(export=True).add_to(m)
+    Fullscreen().add_to(m)
+    return m
+
+
+# Marcador com o nome do ponto no popup (roda no navegador, um por ponto visível)
+_CALLBACK_PONTO = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2]);
+    return marker;
+};
+"""
+
+
+def camada_pontos(pontos):
+    """
+    Uma única camada agrupada (cluster no navegador) com os pontos visíveis:
+    os dados vão como um array compacto, não um objeto folium por ponto.
+    """
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    fg = folium.FeatureGroup(name="Pontos")
+    if pontos:
+        FastMarkerCluster([[p["lat"], p["lon"], html.escape(str(p["n"]))] for p in pontos], callback=_CALLBACK_PONTO).add_to(fg)
+    return fg
+
+
+def janela_inicial(lat, lon, raio=0.02):
+    """Retângulo (sul, oeste, norte, leste) ao redor do centro, antes do 1º retorno de bounds."""
+    return lat - raio, lon - raio, lat + raio, lon + raio
+
+
+def janela_de_bounds(bounds):
+    """Converte o 'bounds' devolvido pelo st_folium em (sul, oeste, norte, leste)."""
+    try:
+        sw, ne = bounds["_southWest"], bounds["_northEast"]
+        return float(sw["lat"]), float(sw["lng"]), float(ne["lat"]), float(ne["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# Instância do processo
+POINT_STORE = PointStore()
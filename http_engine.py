@@ -0,0 +1,129 @@
+# ARQUIVO: http_engine.py
+# VERSÃO: Transporte HTTP compartilhado (keep-alive + retries + métricas)
+import random
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Chaves de API não podem vazar para o log junto com a URL do erro
+_RE_CHAVE = re.compile(r"((?:appid|key|api_key)=)[^&\s)'\"]+")
+
+
+class TransportError(Exception):
+    """Falha definitiva numa chamada externa (depois de esgotar as tentativas)."""
+
+    def __init__(self, endpoint, mensagem):
+        super().__init__(f"[{endpoint}] " + _RE_CHAVE.sub(r"\1***", mensagem))
+        self.endpoint = endpoint
+
+
+class HttpTransport:
+    """
+    Camada única de HTTP para as integrações externas.
+
+    - Uma `requests.Session` por processo: conexões TCP/TLS reaproveitadas (keep-alive).
+    - Retries limitados com backoff exponencial + jitter, só para erros transitórios
+      (timeout, conexão, 429 e 5xx). Erros 4xx (ex: chave inválida) falham na hora.
+    - Timeout e número de tentativas configuráveis por endpoint.
+    - Contadores de chamadas, erros, retries e latência por endpoint (`stats()`).
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, endpoints, pool_maxsize=16, backoff_base=0.2, backoff_max=2.0):
+        # endpoints: {"nome": {"timeout": s, "retries": n}}
+        self.endpoints = endpoints
+        self.pool_maxsize = pool_maxsize
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    s = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    self._session = s
+        return self._session
+
+    def _config(self, endpoint):
+        return self.endpoints.get(endpoint, {"timeout": 3, "retries": 1})
+
+    def _backoff(self, tentativa):
+        # "Full jitter": espera aleatória entre 0 e o teto exponencial
+        teto = min(self.backoff_max, self.backoff_base * (2 ** tentativa))
+        return random.uniform(0, teto)
+
+    def get_json(self, endpoint, url, params=None):
+        """GET com retries; devolve o JSON ou levanta `TransportError`."""
+        return self._request_json(endpoint, "GET", url, params=params)
+
+    def post_json(self, endpoint, url, corpo, params=None, headers=None, timeout=None, retries=None):
+        """
+        POST de um corpo JSON com as mesmas regras de retry/timeout do GET.
+        `timeout`/`retries` sobrepõem os do endpoint nesta chamada (ex: repartir um prazo total).
+        """
+        return self._request_json(endpoint, "POST", url, params=params, corpo=corpo, headers=headers,
+                                  timeout=timeout, retries=retries)
+
+    def _request_json(self, endpoint, metodo, url, params=None, corpo=None, headers=None, timeout=None, retries=None):
+        cfg = self._config(endpoint)
+        timeout = timeout if timeout is not None else cfg.get("timeout", 3)
+        tentativas = 1 + (retries if retries is not None else cfg.get("retries", 0))
+        ultimo_erro = None
+        for tentativa in range(tentativas):
+            if tentativa:
+                self._registrar(endpoint, retry=True)
+                time.sleep(self._backoff(tentativa - 1))
+            inicio = time.perf_counter()
+            try:
+                r = self.session.request(metodo, url, params=params, json=corpo, headers=headers, timeout=timeout)
+                if r.status_code in self.RETRY_STATUS:
+                    ultimo_erro = f"HTTP {r.status_code}"
+                    self._registrar(endpoint, time.perf_counter() - inicio, erro=True)
+                    continue
+                r.raise_for_status()
+                dados = r.json()
+                self._registrar(endpoint, time.perf_counter() - inicio)
+                return dados
+            except (requests.Timeout, requests.ConnectionError) as e:
+                ultimo_erro = f"{type(e).__name__}: {e}"
+                self._registrar(endpoint, time.perf_counter() - inicio, erro=True)
+            except (requests.RequestException, ValueError) as e:
+                # 4xx ou JSON inválido: repetir não resolve
+                self._registrar(endpoint, time.perf_counter() - inicio, erro=True)
+                raise TransportError(endpoint, f"{type(e).__name__}: {e}") from e
+        raise TransportError(endpoint, f"{tentativas} tentativa(s) falharam ({ultimo_erro})")
+
+    def _registrar(self, endpoint, latencia=None, erro=False, retry=False):
+        with self._lock:
+            st = self._stats.setdefault(endpoint, {"chamadas": 0, "erros": 0, "retries": 0, "latencia_total": 0.0, "latencia_max": 0.0})
+            if retry:
+                st["retries"] += 1
+                return
+            st["chamadas"] += 1
+            st["erros"] += int(erro)
+            st["latencia_total"] += latencia
+            st["latencia_max"] = max(st["latencia_max"], latencia)
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for ep, st in self._stats.items():
+                out[ep] = dict(st)
+                out[ep]["latencia_media"] = st["latencia_total"] / st["chamadas"] if st["chamadas"] else 0.0
+            return out
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,158 @@
+# ARQUIVO: ledger_engine.py
+# VERSÃO: Livro-caixa de custos (SQLite, só inclusão, totais incrementais)
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+from gda_engine import DATA_DIR
+
+CATEGORIAS = ["Defensivos", "Fertilizantes", "Sementes", "Operações", "Mão de obra", "Outros"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lancamentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fazenda TEXT NOT NULL, talhao TEXT NOT NULL, cultura TEXT NOT NULL, fase TEXT NOT NULL,
+    categoria TEXT NOT NULL, item TEXT NOT NULL, valor REAL NOT NULL, data TEXT NOT NULL,
+    criado REAL NOT NULL, acum REAL NOT NULL, estorno_de INTEGER
+);
+CREATE INDEX IF NOT EXISTS lanc_fazenda ON lancamentos (fazenda, id);
+CREATE INDEX IF NOT EXISTS lanc_categoria ON lancamentos (fazenda, categoria, id);
+CREATE TABLE IF NOT EXISTS totais (
+    fazenda TEXT NOT NULL, categoria TEXT NOT NULL, total REAL NOT NULL, n INTEGER NOT NULL,
+    PRIMARY KEY (fazenda, categoria)
+);
+"""
+
+_COLUNAS = "id, talhao, cultura, fase, categoria, item, valor, data, acum, estorno_de"
+
+
+class CostLedger:
+    """
+    Custos da fazenda em SQLite, só com inclusão (correção = estorno, nunca UPDATE/DELETE).
+
+    - Cada lançamento guarda o saldo acumulado da fazenda até ele (`acum`):
+      o total é o `acum` do último lançamento, uma busca no índice.
+    - `totais` mantém soma e contagem por categoria, atualizadas na mesma
+      transação da inclusão.
+    - A listagem é paginada por cursor (id), então a página 1 000 custa o mesmo
+      que a primeira.
+
+    O arquivo é um só para o processo; `fazenda` (obrigatório, sem padrão)
+    separa os livros: cada sessão só enxerga e estorna o da sua fazenda.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DATA_DIR / "custos.sqlite"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit: as escritas abrem a própria transação (BEGIN IMMEDIATE) em `_escrita`
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # --- ESCRITA ---
+    @contextmanager
+    def _escrita(self):
+        """
+        Transação de escrita com a trava do arquivo tomada já no BEGIN: ler o
+        último `acum` e inserir o lançamento viram uma operação só, também entre
+        processos (app, batch runner, vários workers no mesmo arquivo).
+        """
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _inserir(self, conn, fazenda, talhao, cultura, fase, categoria, item, valor, data, estorno_de=None):
+        ult = conn.execute("SELECT acum FROM lancamentos WHERE fazenda = ? ORDER BY id DESC LIMIT 1", (fazenda,)).fetchone()
+        acum = (ult[0] if ult else 0.0) + valor
+        cur = conn.execute(
+            "INSERT INTO lancamentos (fazenda, talhao, cultura, fase, categoria, item, valor, data, criado, acum, estorno_de) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (fazenda, talhao, cultura, fase, categoria, item, valor, data, time.time(), acum, estorno_de),
+        )
+        conn.execute(
+            "INSERT INTO totais (fazenda, categoria, total, n) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (fazenda, categoria) DO UPDATE SET total = total + excluded.total, n = n + 1",
+            (fazenda, categoria, valor),
+        )
+        return cur.lastrowid
+
+    def lancar(self, item, valor, categoria="Outros", talhao="Geral", cultura="", fase="", data=None, *, fazenda):
+        """Inclui um custo e devolve o id do lançamento."""
+        item = str(item).strip()
+        if not item:
+            raise ValueError("Descrição do custo vazia.")
+        data = (data or date.today()).isoformat()
+        with self._escrita() as conn:
+            return self._inserir(conn, fazenda, str(talhao or "Geral"), str(cultura or ""), str(fase or ""),
+                                 str(categoria or "Outros"), item, float(valor), data)
+
+    def lancar_varios(self, lancamentos, *, fazenda):
+        """Importação em lote: dicts com as chaves de `lancar`, numa transação só."""
+        with self._escrita() as conn:
+            for l in lancamentos:
+                self._inserir(conn, fazenda, str(l.get("talhao") or "Geral"), str(l.get("cultura") or ""),
+                              str(l.get("fase") or ""), str(l.get("categoria") or "Outros"), str(l["item"]),
+                              float(l["valor"]), (l.get("data") or date.today()).isoformat())
+
+    def estornar(self, lancamento_id, *, fazenda):
+        """Anula um lançamento com outro de valor oposto (o original permanece no histórico)."""
+        with self._escrita() as conn:
+            orig = conn.execute(
+                "SELECT talhao, cultura, fase, categoria, item, valor FROM lancamentos "
+                "WHERE id = ? AND fazenda = ? AND estorno_de IS NULL", (lancamento_id, fazenda)).fetchone()
+            if orig is None:
+                return None
+            if conn.execute("SELECT 1 FROM lancamentos WHERE estorno_de = ?", (lancamento_id,)).fetchone():
+                return None  # já estornado
+            talhao, cultura, fase, categoria, item, valor = orig
+            return self._inserir(conn, fazenda, talhao, cultura, fase, categoria, f"Estorno #{lancamento_id}: {item}",
+                                 -valor, date.today().isoformat(), estorno_de=lancamento_id)
+
+    # --- CONSULTA ---
+    def total(self, *, fazenda):
+        ult = self._conn().execute("SELECT acum FROM lancamentos WHERE fazenda = ? ORDER BY id DESC LIMIT 1", (fazenda,)).fetchone()
+        return ult[0] if ult else 0.0
+
+    def por_categoria(self, *, fazenda):
+        """{categoria: {'total', 'n'}}, lido da tabela de agregados."""
+        linhas = self._conn().execute("SELECT categoria, total, n FROM totais WHERE fazenda = ? ORDER BY total DESC", (fazenda,))
+        return {c: {"total": t, "n": n} for c, t, n in linhas}
+
+    def pagina(self, *, fazenda, limite=50, antes_de=None, categoria=None):
+        """
+        Lançamentos mais novos primeiro, `limite` por vez. Para a próxima página,
+        passe em `antes_de` o menor id recebido.
+        """
+        filtros, args = ["fazenda = ?"], [fazenda]
+        if categoria:
+            filtros.append("categoria = ?")
+            args.append(categoria)
+        if antes_de is not None:
+            filtros.append("id < ?")
+            args.append(antes_de)
+        linhas = self._conn().execute(
+            f"SELECT {_COLUNAS} FROM lancamentos WHERE {' AND '.join(filtros)} ORDER BY id DESC LIMIT ?", (*args, limite))
+        nomes = [c.strip() for c in _COLUNAS.split(",")]
+        return [dict(zip(nomes, l)) for l in linhas]
+
+
+# Instância do processo
+LEDGER = CostLedger()
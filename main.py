@@ -4,40 +4,64 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
+import copy
+import time
+import uuid
 from datetime import date
-import folium
-from folium.plugins import LocateControl, Fullscreen, Draw
-from streamlit_folium import st_folium
-from PIL import Image
-import google.generativeai as genai
+# plotly e streamlit_folium (folium/branca/jinja2) são importados dentro das abas
+# que os usam: a partida não paga por eles (ver `python benchmark.py --imports`)
 
 # --- 1. IMPORTAÇÃO DOS MOTORES DE INTELIGÊNCIA ---
 try:
-    from data_engine import get_database
+    from data_engine import KB, get_database
+    from query_engine import get_index
+    from gda_engine import GDA_STORE
+    from geo_engine import GRID
+    from gis_engine import POINT_STORE, mapa_base, camada_pontos, janela_inicial, janela_de_bounds
     from calc_engine import AgroPhysics, WeatherConn
     from styles import load_css             # Nossa nova "Roupa" Militar/Tech
     from agro_utils import AgroBrain        # Nosso novo "Cérebro" com VPD
+    from trace_engine import TRACER         # Spans de tempo por execução (painel ?debug=1)
+    from vision_engine import VisionConn    # Diagnóstico por imagem (foto reduzida + cache)
+    from ledger_engine import LEDGER, CATEGORIAS  # Livro-caixa de custos persistente
+    from receita_engine import MODELO as MODELO_RECEITA, dados_receita, nome_arquivo  # Receituário em PDF
 except ImportError as e:
     st.error(f"🚨 FALHA CRÍTICA DE SISTEMA: Módulo {e.name} ausente.")
     st.stop()
 
 # --- 2. CONFIGURAÇÃO INICIAL ---
 st.set_page_config(page_title="Agro SDI | Enterprise", page_icon="🛰️", layout="wide")
-load_css() # Injeta o CSS profissional
+TRACER.iniciar("cockpit")  # Um trace por rerun; fechado no fim do script (seção 8)
+with TRACER.span("main.css"):
+    load_css() # Injeta o CSS profissional
 
 # Variáveis de Estado (Memória do App)
 if 'loc_lat' not in st.session_state: st.session_state['loc_lat'] = -13.414
 if 'loc_lon' not in st.session_state: st.session_state['loc_lon'] = -41.285
-if 'pontos_mapa' not in st.session_state: st.session_state['pontos_mapa'] = []
-if 'custos' not in st.session_state: st.session_state['custos'] = []
+if 'custos_cursor' not in st.session_state: st.session_state['custos_cursor'] = [None]  # pilha de páginas do livro-caixa
 if 'd_plantio' not in st.session_state: st.session_state['d_plantio'] = date(2025, 11, 25)
 
-BANCO_MASTER = get_database()
+with TRACER.span("main.banco"):
+    # Versão lida antes do banco: numa recarga concorrente o memo refaz a conta, nunca fica velho
+    DB_VERSAO = KB.version  # Muda a cada recarga das fontes: entra na chave dos memos que leem o banco
+    BANCO_MASTER = get_database()
+    INDICE = get_index()  # Navegação e buscas indexadas (construído 1x por versão do banco)
 # Tenta pegar chaves da URL (Query Params)
 url_w = st.query_params.get("w_key", None)
 url_g = st.query_params.get("g_key", None)
 
+@st.cache_resource
+def _mapa_modelo():
+    """Modelo do mapa base do GIS (satélite + plugins), montado 1x por processo. Nunca é desenhado direto."""
+    return mapa_base()
+
+def mapa_base_cache():
+    """
+    Cópia do modelo para este render: o st_folium pendura a camada de pontos
+    no mapa recebido, então o objeto compartilhado entre sessões não pode ir para ele.
+    """
+    return copy.deepcopy(_mapa_modelo())
+
 # --- 3. TELA DE LOGIN SEGURA ---
 if not url_w:
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -45,7 +69,7 @@ if not url_w:
     with c2:
         st.markdown("""
         <div class="app-card" style="text-align:center; padding:40px;">
-            <h1 style="color:#064e3b; font-family:'Montserrat'; font-weight:900; font-size:3rem; margin:0;">AGRO SDI</h1>
+            <h1 style="color:#064e3b; font-family:'Montserrat', 'Roboto', sans-serif; font-weight:900; font-size:3rem; margin:0;">AGRO SDI</h1>
             <p style="text-transform:uppercase; color:#6b7280; font-weight:600; letter-spacing:2px; margin-top:5px;">Enterprise Access Portal</p>
         </div>""", unsafe_allow_html=True)
         
@@ -59,6 +83,14 @@ if not url_w:
                 st.rerun()
     st.stop()
 
+# Fazenda da sessão: separa o livro-caixa e os pontos GIS (persistentes, um arquivo por processo).
+# Vai na URL como as chaves, para a mesma aba/link voltar ao mesmo livro após recarregar.
+if 'fazenda' not in st.session_state:
+    st.session_state['fazenda'] = str(st.query_params.get("fazenda") or f"sessao-{uuid.uuid4().hex[:12]}")[:64]
+if st.query_params.get("fazenda") != st.session_state['fazenda']:
+    st.query_params["fazenda"] = st.session_state['fazenda']
+FAZENDA = st.session_state['fazenda']
+
 # --- 4. HERO HEADER (CABEÇALHO) ---
 st.markdown("""
 <div class="brand-container">
@@ -89,10 +121,10 @@ with c1:
 with c2:
     st.markdown("### 🚜 Cultura")
     if BANCO_MASTER:
-        cult_sel = st.selectbox("Cultura", sorted(list(BANCO_MASTER.keys())), label_visibility="collapsed")
+        cult_sel = st.selectbox("Cultura", INDICE.culturas(), label_visibility="collapsed")
         try:
-            vars_disponiveis = list(BANCO_MASTER[cult_sel].get('vars', {}).keys())
-            fases_disponiveis = list(BANCO_MASTER[cult_sel].get('fases', {}).keys())
+            vars_disponiveis = INDICE.variedades(cult_sel)
+            fases_disponiveis = INDICE.fases(cult_sel)
             var_sel = st.selectbox("Genética", vars_disponiveis)
         except: st.warning("Estrutura de dados incompleta."); st.stop()
     else: st.error("Banco de dados vazio."); st.stop()
@@ -109,13 +141,22 @@ with c4:
 st.markdown('</div>', unsafe_allow_html=True)
 
 # --- 6. PROCESSAMENTO & COCKPIT INTELIGENTE ---
-info = BANCO_MASTER[cult_sel]['vars'][var_sel]
-dados_fase = BANCO_MASTER[cult_sel]['fases'][fase_sel]
-df_clima = WeatherConn.get_forecast_dataframe(url_w, st.session_state['loc_lat'], st.session_state['loc_lon'], info.get('kc', 1.0), BANCO_MASTER[cult_sel].get('t_base', 10))
+info = INDICE.variedade(cult_sel, var_sel)
+dados_fase = INDICE.fase(cult_sel, fase_sel)
+# Um único parse da previsão: pontos de 3h (condição atual) + agregado diário (gráficos)
+with TRACER.span("main.previsao"):
+    previsao = WeatherConn.get_forecast(url_w, st.session_state['loc_lat'], st.session_state['loc_lon'], info.get('kc', 1.0), INDICE.cultura(cult_sel).get('t_base', 10))
+df_3h, df_clima = previsao['3h'], previsao['diario']
+
+if df_3h.attrs.get('fonte') == 'arquivo':
+    st.info("📦 Sem conexão com o serviço de clima: exibindo a última previsão arquivada localmente.")
 
 if not df_clima.empty:
-    hoje = df_clima.iloc[0]
-    gda_acum = dias * df_clima['GDA'].mean()
+    hoje = df_3h.iloc[0]
+    # GDA real: soma dos graus-dia guardados desde o plantio (consulta O(1) no histórico local)
+    with TRACER.span("main.gda"):
+        gda_hist = GDA_STORE.gda_acumulado(st.session_state['loc_lat'], st.session_state['loc_lon'], INDICE.cultura(cult_sel).get('t_base', 10), st.session_state['d_plantio'])
+    gda_acum = gda_hist['gda'] if gda_hist['gda'] is not None else dias * df_clima['GDA'].mean()
     progresso = min(1.0, gda_acum / info.get('gda_meta', 1500))
 
     # CÁLCULOS AVANÇADOS (USANDO AGRO_UTILS)
@@ -127,206 +168,274 @@ if not df_clima.empty:
     vpd_atual = AgroBrain.calcular_vpd(temp, umid)
     
     # 2. Definição de Status (Lógica de cores)
-    # Temperatura
-    t_st, t_cor = ("Ótima ✅", "#16a34a") if 18 <= temp <= 32 else ("Crítica 🔥", "#dc2626")
-    
-    # Delta T (Janela de Aplicação)
-    if 2 <= delta_t <= 8: d_st, d_cor = "APTO ✅", "#16a34a"
-    elif 8 < delta_t <= 10: d_st, d_cor = "ATENÇÃO ⚠️", "#ca8a04"
-    else: d_st, d_cor = "PARE 🛑", "#dc2626"
-    
-    # VPD Status
-    if 0.5 <= vpd_atual <= 1.5: v_st, v_cor = "Ideal 💧", "#2563eb" # Azul
-    elif vpd_atual > 2.0: v_st, v_cor = "Estresse 🌵", "#dc2626" # Vermelho (Seco)
-    else: v_st, v_cor = "Baixo ☁️", "#ca8a04" # Amarelo (Muito Úmido/Doença)
+    status = AgroBrain.status_cockpit(temp, delta_t, vpd_atual)
+    (t_st, t_cor), (d_st, d_cor), (v_st, v_cor) = status['temp'], status['delta_t'], status['vpd']
 
     # RENDERIZAÇÃO DO COCKPIT (HTML GERADO PELO AGROBRAIN)
-    c1, c2, c3, c4 = st.columns(4)
-    with c1: st.markdown(AgroBrain.gerar_cartao_kpi("🌡️ Temperatura", f"{temp:.1f}", "°C", t_st, t_cor), unsafe_allow_html=True)
-    with c2: st.markdown(AgroBrain.gerar_cartao_kpi("🛡️ Delta T", f"{delta_t}", "°C", d_st, d_cor, tooltip="Diferença Psicométrica"), unsafe_allow_html=True)
-    with c3: st.markdown(AgroBrain.gerar_cartao_kpi("💨 VPD (Pressão)", f"{vpd_atual:.2f}", "kPa", v_st, v_cor, tooltip="Déficit de Pressão de Vapor"), unsafe_allow_html=True)
-    with c4: st.markdown(AgroBrain.gerar_cartao_kpi("☀️ GDA Acumulado", f"{gda_acum:.0f}", "°GD", f"Ciclo: {dias} dias", "#1f2937"), unsafe_allow_html=True)
+    # Os quatro cartões vão num único bloco HTML (grade .kpi-grid do styles.py)
+    st.markdown(AgroBrain.gerar_painel_kpi([
+        ("🌡️ Temperatura", f"{temp:.1f}", "°C", t_st, t_cor),
+        ("🛡️ Delta T", f"{delta_t}", "°C", d_st, d_cor, "Diferença Psicométrica"),
+        ("💨 VPD (Pressão)", f"{vpd_atual:.2f}", "kPa", v_st, v_cor, "Déficit de Pressão de Vapor"),
+        ("☀️ GDA Acumulado", f"{gda_acum:.0f}", "°GD", f"Ciclo: {dias} dias" + (" (estimado)" if gda_hist['estimado'] else ""), "#1f2937", f"Dias com dado real: {gda_hist['dias_cobertos']}/{gda_hist['dias']}"),
+    ]), unsafe_allow_html=True)
 
     # --- 7. ABAS DE CONTEÚDO (ENTERPRISE) ---
-    tabs = st.tabs(["🧬 TÉCNICO & MANEJO", "☁️ CLIMA & RISCO", "📡 RADAR", "👁️ IA VISION", "💰 GESTÃO", "🗺️ GIS MAP", "📄 LAUDO"])
+    # Abas sob demanda: só a aba visível executa (Streamlit com estado de aba).
+    # Versões sem esse recurso caem no comportamento antigo (todas as abas rodam).
+    ABAS = ["🧬 TÉCNICO & MANEJO", "☁️ CLIMA & RISCO", "📡 RADAR", "👁️ IA VISION", "💰 GESTÃO", "🗺️ GIS MAP", "📄 LAUDO"]
+    try:
+        tabs = st.tabs(ABAS, key="aba_ativa", on_change="rerun")
+    except TypeError:
+        tabs = st.tabs(ABAS)
+
+    def aba_aberta(tab):
+        return getattr(tab, "open", None) is not False
+
+    def memo_aba(nome, chave, calcular):
+        """Resultado pesado da aba guardado na sessão: voltar à aba com as mesmas entradas não recalcula."""
+        memo = st.session_state.setdefault('_memo_abas', {})
+        if nome not in memo or memo[nome][0] != chave:
+            memo[nome] = (chave, calcular())
+        return memo[nome][1]
+
+    # Identifica a previsão exibida (célula + parâmetros + horizonte) para os memos das abas
+    chave_prev = (*WeatherConn._forecast_key(st.session_state['loc_lat'], st.session_state['loc_lon'], info.get('kc', 1.0), INDICE.cultura(cult_sel).get('t_base', 10)),
+                  int(df_3h['dt'].iloc[0]), int(df_3h['dt'].iloc[-1]), df_3h.attrs.get('fonte', 'api'))
 
     # ABA 1: TÉCNICO (AGRONOMIA PURA)
-    with tabs[0]:
-        st.markdown('<div class="app-card">', unsafe_allow_html=True)
-        st.caption(f"Evolução do Ciclo Fenológico ({progresso*100:.1f}%)")
-        st.progress(progresso)
-
-        # Imagem Blindada (Não quebra se falhar)
-        if "Soja" in str(cult_sel):
-            try: st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/0/06/Soybean.jpg/800px-Soybean.jpg", width=400)
-            except: pass
-
-        c_tec1, c_tec2 = st.columns(2)
-        with c_tec1:
-            st.markdown('<div class="section-title">🧬 CARACTERIZAÇÃO GENÉTICA</div>', unsafe_allow_html=True)
-            # AgroBrain busca a informação segura
-            info_txt = AgroBrain.get_info_segura(info, ['info', 'desc', 'detalhes'])
-            st.markdown(f'<div class="info-text"><b>{var_sel}</b><br>{info_txt}</div>', unsafe_allow_html=True)
+    with tabs[0], TRACER.span("main.aba_tecnico"):
+        if aba_aberta(tabs[0]):
+            st.markdown('<div class="app-card">', unsafe_allow_html=True)
+            st.caption(f"Evolução do Ciclo Fenológico ({progresso*100:.1f}%)")
+            st.progress(progresso)
+
+            # Imagem Blindada (Não quebra se falhar)
+            if "Soja" in str(cult_sel):
+                try: st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/0/06/Soybean.jpg/800px-Soybean.jpg", width=400)
+                except: pass
+
+            c_tec1, c_tec2 = st.columns(2)
+            with c_tec1:
+                st.markdown('<div class="section-title">🧬 CARACTERIZAÇÃO GENÉTICA</div>', unsafe_allow_html=True)
+                # Campos canônicos: sinônimos já resolvidos pelo data_engine
+                info_txt = info.get('info') or AgroBrain.PADRAO_INFO
+                st.markdown(f'<div class="info-text"><b>{var_sel}</b><br>{info_txt}</div>', unsafe_allow_html=True)
         
-        with c_tec2:
-            st.markdown('<div class="section-title">🌱 FISIOLOGIA DO ESTÁDIO</div>', unsafe_allow_html=True)
-            fisio_txt = AgroBrain.get_info_segura(dados_fase, ['fisiologia', 'desenvolvimento'])
-            st.markdown(f'<div class="info-text">{fisio_txt}</div>', unsafe_allow_html=True)
+            with c_tec2:
+                st.markdown('<div class="section-title">🌱 FISIOLOGIA DO ESTÁDIO</div>', unsafe_allow_html=True)
+                fisio_txt = dados_fase.get('fisiologia') or AgroBrain.PADRAO_INFO
+                st.markdown(f'<div class="info-text">{fisio_txt}</div>', unsafe_allow_html=True)
 
-        st.divider()
-        st.markdown('<div class="section-title">🛡️ DIRETRIZES TÉCNICAS (MANEJO)</div>', unsafe_allow_html=True)
-        manejo_txt = AgroBrain.get_info_segura(dados_fase, ['manejo', 'recomendacao'])
-        st.warning(f"🎯 **Ação Recomendada:** {manejo_txt}")
+            st.divider()
+            st.markdown('<div class="section-title">🛡️ DIRETRIZES TÉCNICAS (MANEJO)</div>', unsafe_allow_html=True)
+            manejo_txt = dados_fase.get('manejo') or AgroBrain.PADRAO_INFO
+            st.warning(f"🎯 **Ação Recomendada:** {manejo_txt}")
 
-        st.markdown("### 🧪 Protocolo de Defesa (Químico/Biológico)")
-        # Renderiza os cards químicos usando o motor inteligente
-        AgroBrain.render_protocolo_quimico(dados_fase.get('quimica')) 
-        st.markdown('</div>', unsafe_allow_html=True)
+            st.markdown("### 🧪 Protocolo de Defesa (Químico/Biológico)")
+            # Renderiza os cards químicos usando o motor inteligente
+            AgroBrain.render_protocolo_quimico(dados_fase.get('quimica')) 
+            st.markdown('</div>', unsafe_allow_html=True)
 
     # ABA 2: CLIMA & RISCO
-    with tabs[1]:
-        st.markdown('<div class="app-card">', unsafe_allow_html=True)
+    with tabs[1], TRACER.span("main.aba_clima"):
+        if aba_aberta(tabs[1]):
+            st.markdown('<div class="app-card">', unsafe_allow_html=True)
         
-        # Gráfico Interativo
-        fig = go.Figure()
-        fig.add_trace(go.Bar(x=df_clima['Data'], y=df_clima['Chuva'], name='Chuva (mm)', marker_color='#3b82f6'))
-        fig.add_trace(go.Scatter(x=df_clima['Data'], y=df_clima['ETc'], name='Evapo (mm)', line=dict(color='#ef4444', width=3)))
-        fig.update_layout(title="Balanço Hídrico (15 Dias)", height=350, margin=dict(l=20, r=20, t=40, b=20))
-        st.plotly_chart(fig, use_container_width=True)
+            # Gráfico Interativo
+            def montar_balanco():
+                import plotly.graph_objects as go  # só na 1ª abertura da aba
+                fig = go.Figure()
+                fig.add_trace(go.Bar(x=df_clima['Data'], y=df_clima['Chuva'], name='Chuva (mm)', marker_color='#3b82f6'))
+                fig.add_trace(go.Scatter(x=df_clima['Data'], y=df_clima['ETc'], name='Evapo (mm)', line=dict(color='#ef4444', width=3)))
+                fig.update_layout(title=f"Balanço Hídrico ({len(df_clima)} Dias)", height=350, margin=dict(l=20, r=20, t=40, b=20))
+                return fig
+            with TRACER.span("main.plotly"):
+                fig = memo_aba('balanco', chave_prev, montar_balanco)
+                st.plotly_chart(fig, use_container_width=True)
         
-        # Análise de Risco Automática (AgroBrain)
-        st.markdown('<div class="section-title">🚨 ANÁLISE DE RISCO AUTOMÁTICA</div>', unsafe_allow_html=True)
-        
-        # Simula tipo de produto (padrão sistêmico)
-        tipo_prod = "Sistêmico" 
-        status_ap, cor_ap, lista_alertas = AgroBrain.analisar_risco_aplicacao(temp, umid, delta_t, tipo_prod)
-        
-        st.markdown(f"**Condição para {tipo_prod}:** <span style='color:{cor_ap}; font-weight:bold; font-size:1.2rem;'>{status_ap}</span>", unsafe_allow_html=True)
-        
-        if lista_alertas:
-            for tit, desc in lista_alertas:
-                st.error(f"**{tit}**: {desc}")
-        else:
-            st.success("✅ Janela de aplicação favorável.")
-            
-        st.caption("Nota: Esta análise considera temperatura, umidade, Delta T e VPD (Fisiologia da planta).")
-        st.markdown('</div>', unsafe_allow_html=True)
+            # Janelas de aplicação em todo o horizonte, para cada tipo de produto da fase
+            df_janelas = memo_aba('janelas', (chave_prev, cult_sel, fase_sel, DB_VERSAO),
+                                  lambda: AgroBrain.agendar_janelas_aplicacao(df_3h, dados_fase.get('quimica')))
+
+            # Veredito: melhor janela de cada tipo de produto (status + fator limitante)
+            st.markdown('<div class="section-title">🚨 ANÁLISE DE RISCO AUTOMÁTICA</div>', unsafe_allow_html=True)
+            melhores = AgroBrain.melhor_janela_por_tipo(df_janelas)
+            if melhores.empty:
+                st.warning("Sem previsão para avaliar as janelas de aplicação.")
+            for _, j in melhores.iterrows():
+                st.markdown(f"**{j['Tipo']}:** <span style='color:{j['Cor']}; font-weight:bold; font-size:1.2rem;'>{j['Status']}</span>"
+                            f" — melhor janela {j['Inicio']:%d/%m %H:%M} a {j['Fim']:%d/%m %H:%M} ({j['Horas']}h)", unsafe_allow_html=True)
+                if j['Limitante'] != "-":
+                    aviso = st.error if j['Status'] == "PARE" else st.warning
+                    aviso(f"**{j['Limitante']}**: {AgroBrain.ORIENTACAO.get(j['Limitante'], '')}")
+            if not melhores.empty and (melhores['Status'] == "APTO").all():
+                st.success("✅ Há janela favorável para todos os tipos de produto da fase.")
+
+            st.caption("Nota: Esta análise considera temperatura, umidade, Delta T e VPD (Fisiologia da planta).")
+
+            # Todas as janelas ranqueadas, inclusive as marginais/ruins, com o fator limitante
+            st.markdown('<div class="section-title">🗓️ JANELAS DE APLICAÇÃO (PRÓXIMOS DIAS)</div>', unsafe_allow_html=True)
+            if not df_janelas.empty:
+                st.dataframe(df_janelas.drop(columns=['Cor']), use_container_width=True, hide_index=True,
+                             column_config={"Inicio": st.column_config.DatetimeColumn("Início", format="DD/MM HH:mm"),
+                                            "Fim": st.column_config.DatetimeColumn("Fim", format="DD/MM HH:mm")})
+            st.markdown('</div>', unsafe_allow_html=True)
 
     # ABA 3: RADAR
-    with tabs[2]:
-        st.markdown('<div class="app-card">', unsafe_allow_html=True)
-        st.markdown("### 📡 Radar Meteorológico (Simulação)")
-        df_r = WeatherConn.get_radar_simulation(url_w, st.session_state['loc_lat'], st.session_state['loc_lon'])
-        if not df_r.empty:
-            cols = st.columns(4)
-            for i, r in df_r.iterrows():
-                with cols[i]:
-                    bg = "#fee2e2" if r['Chuva'] == "Sim" else "#ecfdf5"
-                    cor = "#b91c1c" if r['Chuva'] == "Sim" else "#047857"
-                    st.markdown(f"""
-                    <div style="background:{bg}; padding:15px; border-radius:10px; text-align:center; border:1px solid {cor}30;">
-                        <div style="font-weight:bold; color:#64748b; font-size:0.8rem;">{r["Direcao"]}</div>
-                        <div style="font-size:1.8rem; font-weight:800; color:{cor};">{r["Temp"]:.0f}°</div>
-                        <div style="font-weight:700; color:{cor};">{r["Chuva"]}</div>
-                    </div>""", unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+    with tabs[2], TRACER.span("main.aba_radar"):
+        if aba_aberta(tabs[2]):
+            st.markdown('<div class="app-card">', unsafe_allow_html=True)
+            st.markdown("### 📡 Radar Meteorológico (Simulação)")
+            # Mesma janela de validade do cache de radar: dentro dela, voltar à aba não refaz a amostragem
+            janela_radar = int(time.time() // WeatherConn.RADAR_CACHE.ttl)
+            df_r = memo_aba('radar', (GRID.celula(st.session_state['loc_lat'], st.session_state['loc_lon']), janela_radar),
+                            lambda: WeatherConn.get_radar_simulation(url_w, st.session_state['loc_lat'], st.session_state['loc_lon']))
+            if not df_r.empty:
+                # Grade de 4 colunas por linha (o radar pode ter 4, 8, 16... pontos)
+                for ini in range(0, len(df_r), 4):
+                    cols = st.columns(4)
+                    for col, (_, r) in zip(cols, df_r.iloc[ini:ini+4].iterrows()):
+                        with col:
+                            if not r['OK']: bg, cor = "#f1f5f9", "#64748b"
+                            elif r['Chuva'] == "Sim": bg, cor = "#fee2e2", "#b91c1c"
+                            else: bg, cor = "#ecfdf5", "#047857"
+                            temp_txt = f"{r['Temp']:.0f}°" if r['OK'] else "--"
+                            st.markdown(f"""
+                            <div style="background:{bg}; padding:15px; border-radius:10px; text-align:center; border:1px solid {cor}30; margin-bottom:10px;">
+                                <div style="font-weight:bold; color:#64748b; font-size:0.8rem;">{r["Direcao"]}</div>
+                                <div style="font-size:1.8rem; font-weight:800; color:{cor};">{temp_txt}</div>
+                                <div style="font-weight:700; color:{cor};">{r["Chuva"]}</div>
+                            </div>""", unsafe_allow_html=True)
+            st.markdown('</div>', unsafe_allow_html=True)
 
     # ABA 4: IA VISION (GEMINI)
-    with tabs[3]:
-        st.markdown('<div class="app-card">', unsafe_allow_html=True)
-        c1, c2 = st.columns([1, 1])
-        with c1: 
-            st.markdown("### 📸 Diagnóstico Visual")
-            st.info("Tire uma foto da folha, praga ou sintoma.")
-            img = st.camera_input("Capturar Imagem")
-        with c2:
-            st.markdown("### 🧠 Parecer AgroBrain AI")
-            if img and url_g:
-                genai.configure(api_key=url_g)
-                with st.spinner("Analisando vetores, sintomas e morfologia..."):
-                    try:
-                        prompt = f"Atue como um Doutor em Agronomia. Cultura: {cult_sel}, Fase: {fase_sel}. Analise a imagem. 1. Identifique o problema. 2. Explique a causa. 3. Sugira controle químico (ingredientes ativos) e biológico."
-                        model = genai.GenerativeModel('gemini-1.5-flash')
-                        res = model.generate_content([prompt, Image.open(img)])
-                        st.markdown(res.text)
-                    except: st.error("Erro na comunicação com a IA.")
-            else:
-                st.markdown("Aguardo imagem para processamento...")
-        st.markdown('</div>', unsafe_allow_html=True)
+    with tabs[3], TRACER.span("main.aba_ia"):
+        if aba_aberta(tabs[3]):
+            st.markdown('<div class="app-card">', unsafe_allow_html=True)
+            c1, c2 = st.columns([1, 1])
+            with c1: 
+                st.markdown("### 📸 Diagnóstico Visual")
+                st.info("Tire uma foto da folha, praga ou sintoma.")
+                img = st.camera_input("Capturar Imagem")
+            with c2:
+                st.markdown("### 🧠 Parecer AgroBrain AI")
+                if img and url_g:
+                    with st.spinner("Analisando vetores, sintomas e morfologia..."), TRACER.span("main.gemini"):
+                        res = VisionConn.diagnosticar(url_g, img.getvalue(), cult_sel, fase_sel)
+                    if res['texto']:
+                        st.markdown(res['texto'])
+                        if res['cache']:
+                            st.caption("⚡ Parecer reaproveitado (mesma foto, cultura e fase).")
+                        else:
+                            st.caption(f"📦 Foto enviada: {res['bytes_enviado']/1024:.0f} KB (original {res['bytes_original']/1024:.0f} KB).")
+                    else:
+                        st.error(res['erro'])
+                else:
+                    st.markdown("Aguardo imagem para processamento...")
+            st.markdown('</div>', unsafe_allow_html=True)
 
     # ABA 5: CUSTOS
-    with tabs[4]:
-        st.markdown('<div class="app-card">', unsafe_allow_html=True)
-        st.markdown("### 💰 Gestão Financeira")
-        c1, c2, c3 = st.columns([2,1,1])
-        i = c1.text_input("Descrição")
-        v = c2.number_input("Valor (R$)", min_value=0.0)
-        if c3.button("➕ Adicionar") and i: st.session_state['custos'].append({"Data": date.today(), "Item": i, "Valor": v}); st.rerun()
-        
-        if st.session_state['custos']:
-            df = pd.DataFrame(st.session_state['custos'])
-            st.dataframe(df, use_container_width=True, hide_index=True)
-            st.markdown(f"<div style='text-align:right; font-size:1.5rem; font-weight:bold; color:#064e3b;'>TOTAL: R$ {df['Valor'].sum():,.2f}</div>", unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+    with tabs[4], TRACER.span("main.aba_gestao"):
+        if aba_aberta(tabs[4]):
+            st.markdown('<div class="app-card">', unsafe_allow_html=True)
+            st.markdown("### 💰 Gestão Financeira")
+            st.caption(f"Livro-caixa da fazenda `{FAZENDA}`: só esta sessão (ou quem tiver este link) vê e altera estes lançamentos.")
+            c1, c2, c3, c4, c5 = st.columns([2, 1, 1, 1, 1])
+            i = c1.text_input("Descrição")
+            cat = c2.selectbox("Categoria", CATEGORIAS)
+            talhao = c3.text_input("Talhão", value="Geral")
+            v = c4.number_input("Valor (R$)", min_value=0.0)
+            if c5.button("➕ Adicionar") and i:
+                LEDGER.lancar(i, v, categoria=cat, talhao=talhao, cultura=cult_sel, fase=fase_sel, fazenda=FAZENDA)
+                st.session_state['custos_cursor'] = [None]  # volta para os mais recentes
+                st.rerun()
+
+            with TRACER.span("main.custos"):
+                por_cat = LEDGER.por_categoria(fazenda=FAZENDA)
+                cursores = st.session_state['custos_cursor']
+                linhas = LEDGER.pagina(fazenda=FAZENDA, limite=50, antes_de=cursores[-1])
+            if linhas:
+                st.dataframe(pd.DataFrame(linhas).rename(columns={
+                    "id": "#", "talhao": "Talhão", "cultura": "Cultura", "fase": "Fase", "categoria": "Categoria",
+                    "item": "Item", "valor": "Valor", "data": "Data", "acum": "Acumulado"}).drop(columns="estorno_de"),
+                    use_container_width=True, hide_index=True)
+                p1, p2, p3 = st.columns([1, 1, 4])
+                if p1.button("⬅️ Mais recentes", disabled=len(cursores) == 1):
+                    cursores.pop(); st.rerun()
+                if p2.button("Mais antigos ➡️", disabled=len(linhas) < 50):
+                    cursores.append(linhas[-1]["id"]); st.rerun()
+                p3.caption(f"Página {len(cursores)} · {sum(c['n'] for c in por_cat.values())} lançamentos")
+                if por_cat:
+                    st.markdown(" · ".join(f"**{c}:** R$ {a['total']:,.2f}" for c, a in por_cat.items()))
+                st.markdown(f"<div style='text-align:right; font-size:1.5rem; font-weight:bold; color:#064e3b;'>TOTAL: R$ {LEDGER.total(fazenda=FAZENDA):,.2f}</div>", unsafe_allow_html=True)
+            st.markdown('</div>', unsafe_allow_html=True)
 
     # ABA 6: MAPA GIS
-    with tabs[5]:
-        st.markdown('<div class="app-card">', unsafe_allow_html=True)
-        c1, c2 = st.columns([1,3])
-        with c1:
-            st.markdown("### 📍 Pontos GPS")
-            nm = st.text_input("Nome do Ponto")
-            if st.button("Gravar Coordenada") and st.session_state.get('last'): 
-                st.session_state['pontos_mapa'].append({"n": nm, "lat": st.session_state['last'][0], "lon": st.session_state['last'][1]}); st.rerun()
-            for p in st.session_state['pontos_mapa']: st.markdown(f"**📍 {p['n']}**")
-        with c2:
-            m = folium.Map([st.session_state['loc_lat'], st.session_state['loc_lon']], zoom_start=15)
-            folium.TileLayer('https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}', attr='Esri', name='Sat').add_to(m)
-            LocateControl().add_to(m); Draw(export=True).add_to(m); Fullscreen().add_to(m)
-            for p in st.session_state['pontos_mapa']: folium.Marker([p['lat'], p['lon']], popup=p['n']).add_to(m)
-            out = st_folium(m, height=500, returned_objects=["last_clicked"])
-            if out["last_clicked"]: st.session_state['last'] = (out["last_clicked"]["lat"], out["last_clicked"]["lng"])
-        st.markdown('</div>', unsafe_allow_html=True)
+    with tabs[5], TRACER.span("main.aba_gis"):
+        if aba_aberta(tabs[5]):
+            st.markdown('<div class="app-card">', unsafe_allow_html=True)
+            c1, c2 = st.columns([1,3])
+            with c1:
+                st.markdown("### 📍 Pontos GPS")
+                nm = st.text_input("Nome do Ponto")
+                if st.button("Gravar Coordenada") and st.session_state.get('last'): 
+                    POINT_STORE.adicionar(nm, *st.session_state['last'], grupo=FAZENDA); st.rerun()
+                st.caption(f"{POINT_STORE.contar(grupo=FAZENDA)} pontos gravados")
+                recentes = POINT_STORE.recentes(grupo=FAZENDA, limite=10)
+                if recentes:
+                    # Condição atual dos últimos pontos: pontos na mesma célula de clima compartilham uma previsão
+                    t_base_pts = INDICE.cultura(cult_sel).get('t_base', 10)
+                    agora_pts = memo_aba('pontos', (chave_prev, tuple(p['id'] for p in recentes)),
+                                         lambda: GRID.resolver(recentes,
+                                                               lambda la, lo: WeatherConn.get_forecast(url_w, la, lo, info.get('kc', 1.0), t_base_pts)['3h'].head(1)))
+                    for p, a in zip(recentes, agora_pts):
+                        clima_pt = f"{a['Temp'].iloc[0]:.0f}° · ΔT {a['Delta T'].iloc[0]:.1f}" if not a.empty else "sem dados"
+                        st.markdown(f"**📍 {p['n']}** — {clima_pt}")
+            with c2, TRACER.span("main.folium"):
+                from streamlit_folium import st_folium  # só na 1ª abertura da aba
+                # Janela visível: último 'bounds' devolvido pelo mapa (estado do componente) ou o entorno da unidade
+                janela = (janela_de_bounds((st.session_state.get('mapa_gis') or {}).get('bounds'))
+                          or janela_inicial(st.session_state['loc_lat'], st.session_state['loc_lon']))
+                pontos_vis, total_vis = POINT_STORE.na_janela(*janela, grupo=FAZENDA)
+                # Base (satélite + plugins) copiada do modelo do processo; só a camada de pontos muda entre reruns
+                m = mapa_base_cache()
+                camada = memo_aba('camada', (janela, total_vis, pontos_vis[0]['id'] if pontos_vis else 0),
+                                  lambda: camada_pontos(pontos_vis))
+                out = st_folium(m, key="mapa_gis", height=500, center=(st.session_state['loc_lat'], st.session_state['loc_lon']), zoom=15,
+                                feature_group_to_add=camada, returned_objects=["last_clicked", "bounds"])
+                if total_vis > len(pontos_vis):
+                    st.caption(f"Exibindo {len(pontos_vis)} de {total_vis} pontos nesta área: aproxime o zoom para ver todos.")
+                if out["last_clicked"]: st.session_state['last'] = (out["last_clicked"]["lat"], out["last_clicked"]["lng"])
+            st.markdown('</div>', unsafe_allow_html=True)
 
     # ABA 7: LAUDO
-    with tabs[6]:
-        st.markdown('<div class="app-card">', unsafe_allow_html=True)
-        st.markdown("### 📝 Emissão de Receituário")
-        obs = st.text_area("Observações Técnicas")
+    with tabs[6], TRACER.span("main.aba_laudo"):
+        if aba_aberta(tabs[6]):
+            st.markdown('<div class="app-card">', unsafe_allow_html=True)
+            st.markdown("### 📝 Emissão de Receituário")
+            obs = st.text_area("Observações Técnicas")
         
-        if st.button("🖨️ Gerar Documento PDF"):
-            # Coleta dados seguros
-            diag = AgroBrain.get_info_segura(dados_fase, ['desc', 'diagnostico'])
-            man = AgroBrain.get_info_segura(dados_fase, ['manejo'])
-            
-            st.markdown(f"""
-            <div style="border:1px solid #9ca3af; padding:50px; background:white; font-family:'Times New Roman'; color:black;">
-                <h1 style="text-align:center; font-size:1.5rem; margin-bottom:5px;">AGRO SDI - RECEITUÁRIO TÉCNICO</h1>
-                <p style="text-align:center; font-size:0.9rem; color:#4b5563;">Sistema de Decisão Integrada | Emissão Digital</p>
-                <hr style="border-top: 2px solid black;">
-                
-                <table style="width:100%; margin-top:20px;">
-                    <tr><td><b>DATA:</b> {date.today().strftime('%d/%m/%Y')}</td><td style="text-align:right;"><b>LOCAL:</b> {city or 'Não Informado'}</td></tr>
-                </table>
-                
-                <h3 style="background:#f3f4f6; padding:8px; margin-top:20px; border-left:4px solid #10b981;">1. IDENTIFICAÇÃO</h3>
-                <p><b>Cultura:</b> {cult_sel} &nbsp;&nbsp; <b>Genética:</b> {var_sel}</p>
-                <p><b>Estádio:</b> {fase_sel}</p>
-                
-                <h3 style="background:#f3f4f6; padding:8px; margin-top:20px; border-left:4px solid #10b981;">2. DIAGNÓSTICO</h3>
-                <p>{diag}</p>
-                
-                <h3 style="background:#f3f4f6; padding:8px; margin-top:20px; border-left:4px solid #10b981;">3. PRESCRIÇÃO</h3>
-                <p>{man}</p>
-                
-                <h3 style="background:#f3f4f6; padding:8px; margin-top:20px; border-left:4px solid #10b981;">4. OBSERVAÇÕES</h3>
-                <p>{obs}</p>
-                
-                <br><br><br><br>
-                <div style="text-align:center;">
-                    _______________________________________<br>
-                    <b>Engenheiro Agrônomo Responsável</b>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+            # PDF montado em memória pelo modelo compilado; refeito só quando o conteúdo muda
+            clima_doc = {"temp": float(temp), "umid": float(umid), "delta_t": float(delta_t), "vpd": float(vpd_atual), "status_delta_t": d_st}
+            doc = dados_receita(cult_sel, var_sel, fase_sel, dados_fase, local=city, obs=obs, plantio=st.session_state['d_plantio'].strftime('%d/%m/%Y'), clima=clima_doc)
+            with TRACER.span("main.receita"):
+                pdf = memo_aba("laudo", doc, lambda: MODELO_RECEITA.gerar(doc))
+            st.download_button("🖨️ Gerar Documento PDF", data=pdf, file_name=nome_arquivo(doc), mime="application/pdf", on_click="ignore", type="primary")
+            st.caption(f"Receituário em PDF ({len(pdf)/1024:.0f} KB): identificação, diagnóstico, prescrição, protocolo da fase e condições atuais de aplicação.")
+            st.markdown('</div>', unsafe_allow_html=True)
+
+# --- 8. DESEMPENHO (TRACE DA EXECUÇÃO) ---
+# Fecha o trace deste rerun (grava no AGRO_TRACE_FILE, se configurado). Painel com ?debug=1
+resumo_trace = TRACER.finalizar()
+if st.query_params.get("debug") == "1":
+    with st.expander("🛠️ Desempenho (debug)", expanded=True):
+        if resumo_trace:
+            st.caption(f"Rerun {resumo_trace['id']}: {resumo_trace['dur_ms']:.0f} ms")
+            df_spans = pd.DataFrame(resumo_trace['spans'])
+            if not df_spans.empty:
+                st.dataframe(df_spans.sort_values('ini_ms')[['nome', 'ini_ms', 'dur_ms', 'thread']], use_container_width=True, hide_index=True)
+        st.markdown("**Etapas (processo, janela recente, ms)**")
+        st.dataframe(pd.DataFrame.from_dict(TRACER.percentis(), orient='index').round(2), use_container_width=True)
+        st.markdown("**Caches e HTTP**")
+        st.json({"previsao": WeatherConn.FORECAST_CACHE.stats(), "previsao_offline": WeatherConn.OFFLINE_CACHE.stats(), "radar": WeatherConn.RADAR_CACHE.stats(), "http": WeatherConn.HTTP.stats()})
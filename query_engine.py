@@ -0,0 +1,196 @@
+# ARQUIVO: query_engine.py
+# VERSÃO: Índices do BANCO_MASTER (cultura -> genética -> fase -> produtos)
+import re
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple
+
+import data_engine
+
+# Um produto do protocolo químico com sua localização no banco
+ProductHit = namedtuple("ProductHit", ["cultura", "fase", "posicao", "produto"])
+
+# Campos indexados: nome da consulta -> chaves aceitas no JSON
+CAMPOS_INDEXADOS = {
+    "alvo": ("Alvo",),
+    "ativo": ("Ativo",),
+    "tipo": ("Tipo",),
+    "grupo": ("Grupo", "Codigos"),
+}
+
+_RE_CODIGO = re.compile(r"^(FRAC|IRAC|HRAC)\s*(.+)$", re.IGNORECASE)
+_RE_SUFIXO = re.compile(r"^[A-Z]{0,2}\d+[A-Z]?$", re.IGNORECASE)
+
+
+def normalizar(texto):
+    """Minúsculas e sem acento: 'Sistêmico' e 'sistemico' caem na mesma chave."""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    return "".join(c for c in texto if not unicodedata.combining(c)).casefold().strip()
+
+
+def palavras(texto):
+    return set(re.findall(r"\w+", normalizar(texto)))
+
+
+def extrair_codigos(texto):
+    """
+    Extrai códigos de resistência: 'FRAC 3 (Triazol) + FRAC 11 (Estrob)' e
+    'FRAC 3 + 11' -> {'FRAC 3', 'FRAC 11'}; 'IRAC 1B' -> {'IRAC 1B'}.
+    """
+    codigos = set()
+    prefixo = None
+    sem_parenteses = re.sub(r"\([^)]*\)", " ", str(texto))
+    for parte in re.split(r"[+/,;]", sem_parenteses):
+        parte = parte.strip()
+        m = _RE_CODIGO.match(parte)
+        if m:
+            prefixo = m.group(1).upper()
+            sufixo = m.group(2).split()[0]
+        elif prefixo and _RE_SUFIXO.match(parte):
+            sufixo = parte
+        else:
+            prefixo = None
+            continue
+        codigos.add(f"{prefixo} {sufixo.upper()}")
+    return codigos
+
+
+class AgroIndex:
+    """
+    Visão indexada e somente leitura do banco, construída uma vez por versão.
+
+    Navegação (cultura/genética/fase) é acesso direto a dicionário; buscas por
+    Alvo, Ativo, Tipo e Grupo/Codigos usam índices invertidos (valor exato,
+    palavra e código FRAC/IRAC/HRAC) e intersecção de conjuntos.
+    """
+
+    def __init__(self, banco):
+        self.banco = banco
+        self._culturas = sorted(banco.keys())
+        self._vars = {}
+        self._fases = {}
+        self._produtos = []
+        self._por_fase = {}
+        self._por_cultura = defaultdict(set)
+        self._exato = {campo: defaultdict(set) for campo in CAMPOS_INDEXADOS}
+        self._palavra = {campo: defaultdict(set) for campo in CAMPOS_INDEXADOS}
+        self._codigo = defaultdict(set)
+
+        for cultura, dados in banco.items():
+            if not isinstance(dados, dict):
+                continue
+            self._vars[cultura] = list(dados.get("vars", {}).keys())
+            fases = dados.get("fases", {})
+            self._fases[cultura] = list(fases.keys())
+            for fase, dados_fase in fases.items():
+                lista = (dados_fase or {}).get("quimica") or []
+                ids = []
+                for pos, prod in enumerate(lista):
+                    if not isinstance(prod, dict):
+                        continue
+                    pid = len(self._produtos)
+                    self._produtos.append(ProductHit(cultura, fase, pos, prod))
+                    ids.append(pid)
+                    self._por_cultura[normalizar(cultura)].add(pid)
+                    self._indexar(pid, prod)
+                self._por_fase[(cultura, fase)] = ids
+
+    def _indexar(self, pid, prod):
+        for campo, chaves in CAMPOS_INDEXADOS.items():
+            for chave in chaves:
+                valor = prod.get(chave)
+                if not valor:
+                    continue
+                self._exato[campo][normalizar(valor)].add(pid)
+                for p in palavras(valor):
+                    self._palavra[campo][p].add(pid)
+                if campo == "grupo":
+                    for cod in extrair_codigos(valor):
+                        self._codigo[cod].add(pid)
+
+    # --- NAVEGAÇÃO ---
+    def culturas(self):
+        return self._culturas
+
+    def variedades(self, cultura):
+        return self._vars.get(cultura, [])
+
+    def fases(self, cultura):
+        return self._fases.get(cultura, [])
+
+    def resolver_cultura(self, nome):
+        """Nome exato ou abreviado ('soja' -> 'Soja (Glycine max)'); None se não achar."""
+        if nome in self.banco:
+            return nome
+        alvo = normalizar(nome)
+        for c in self._culturas:
+            if normalizar(c).startswith(alvo):
+                return c
+        return None
+
+    def cultura(self, cultura):
+        return self.banco.get(cultura, {})
+
+    def variedade(self, cultura, variedade):
+        return self.banco.get(cultura, {}).get("vars", {}).get(variedade, {})
+
+    def fase(self, cultura, fase):
+        return self.banco.get(cultura, {}).get("fases", {}).get(fase, {})
+
+    def produtos(self, cultura, fase):
+        return [self._produtos[i] for i in self._por_fase.get((cultura, fase), [])]
+
+    # --- CONSULTAS ---
+    def buscar_produtos(self, alvo=None, ativo=None, tipo=None, grupo=None, codigo=None, cultura=None, exato=False):
+        """
+        Produtos que atendem TODOS os filtros informados.
+        Texto: por padrão casa por palavras ('Percevejo' acha 'Percevejo Marrom');
+        com exato=True exige o valor inteiro. `codigo` usa o índice FRAC/IRAC/HRAC.
+        """
+        conjuntos = []
+        for campo, termo in (("alvo", alvo), ("ativo", ativo), ("tipo", tipo), ("grupo", grupo)):
+            if termo is None:
+                continue
+            if exato:
+                conjuntos.append(self._exato[campo].get(normalizar(termo), set()))
+            else:
+                conjuntos.extend(self._palavra[campo].get(p, set()) for p in palavras(termo) or {""})
+        if codigo is not None:
+            cods = extrair_codigos(codigo) or {str(codigo).upper().strip()}
+            for cod in cods:
+                conjuntos.append(self._codigo.get(cod, set()))
+        if cultura is not None:
+            conjuntos.append(self._por_cultura.get(normalizar(cultura), set()))
+
+        if not conjuntos:
+            ids = range(len(self._produtos))
+        else:
+            conjuntos.sort(key=len)
+            ids = sorted(set.intersection(*map(set, conjuntos)))
+        return [self._produtos[i] for i in ids]
+
+    def buscar_fases(self, **filtros):
+        """(cultura, fase) distintos que têm algum produto com os filtros de buscar_produtos."""
+        vistos = dict.fromkeys((h.cultura, h.fase) for h in self.buscar_produtos(**filtros))
+        return list(vistos)
+
+    def codigos(self):
+        return sorted(self._codigo)
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index():
+    """
+    Índice do banco atual. O data_engine publica um dicionário novo a cada
+    recarga, então o índice só é reconstruído quando a referência muda.
+    """
+    global _INDEX
+    banco = data_engine.get_database()
+    if _INDEX is None or _INDEX.banco is not banco:
+        with _INDEX_LOCK:
+            if _INDEX is None or _INDEX.banco is not banco:
+                _INDEX = AgroIndex(banco)
+    return _INDEX
@@ -0,0 +1,306 @@
+# ARQUIVO: receita_engine.py
+# VERSÃO: Receituário técnico em PDF (modelo compilado 1x, bytes em memória, gravação atômica)
+import io
+import os
+import re
+import unicodedata
+import zlib
+from datetime import date
+from pathlib import Path
+
+PADRAO_INFO = "Consulte a bula ou Engenheiro Agrônomo."
+
+# Larguras (1/1000 do corpo) das fontes padrão do PDF, ASCII 32..126
+_LARG_HELV = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_LARG_HELV_BOLD = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+
+
+def _tabela_larguras(ascii_larg):
+    """Largura por byte cp1252 (acentuados herdam a largura da letra base)."""
+    tabela = [556] * 256
+    for b in range(32, 127):
+        tabela[b] = ascii_larg[b - 32]
+    for b in range(128, 256):
+        try:
+            ch = bytes([b]).decode("cp1252")
+        except UnicodeDecodeError:
+            continue
+        base = unicodedata.normalize("NFKD", ch)[:1]
+        if base and 32 <= ord(base) < 127:
+            tabela[b] = ascii_larg[ord(base) - 32]
+    return tabela
+
+
+def _escapar(dados):
+    return dados.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"")
+
+
+def _limpar(valor):
+    """Só o que a fonte padrão desenha (cp1252): emojis e afins somem; quebras viram espaço."""
+    texto = str(valor if valor is not None else "").encode("cp1252", errors="ignore").decode("cp1252")
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def _texto_pdf(valor):
+    return _limpar(valor).encode("cp1252")
+
+
+def _tem(valor):
+    return valor is not None and str(valor) != ""
+
+
+class ModeloReceita:
+    """
+    Receituário em PDF 1.4 com as fontes padrão (Helvetica), sem dependências.
+
+    Tudo o que não muda entre documentos (cabeçalho, faixas de seção, bloco de
+    assinatura, objetos de fonte, tabela de larguras) é montado uma vez no
+    construtor; `gerar` só quebra o texto variável em linhas e monta os bytes
+    em memória. Uma instância por processo (`MODELO`).
+    """
+
+    LARGURA, ALTURA = 595, 842  # A4 em pontos
+    MARGEM = 50
+    RODAPE = 40
+    ASSINATURA = 90  # altura reservada ao bloco de assinatura
+
+    def __init__(self, titulo="AGRO SDI - RECEITUÁRIO TÉCNICO",
+                 subtitulo="Sistema de Decisão Integrada | Emissão Digital",
+                 responsavel="Engenheiro Agrônomo Responsável"):
+        self._larg = {"F1": _tabela_larguras(_LARG_HELV), "F2": _tabela_larguras(_LARG_HELV_BOLD)}
+        self.util = self.LARGURA - 2 * self.MARGEM
+        topo = self.ALTURA - self.MARGEM
+
+        # Cabeçalho da 1ª página (título centralizado + linha)
+        cab = io.BytesIO()
+        cab.write(self._linha_centro("F2", 16, titulo, topo - 16))
+        cab.write(self._linha_centro("F1", 9, subtitulo, topo - 32, cinza=0.3))
+        cab.write(b"2 w 0 G %d %d m %d %d l S\n" % (self.MARGEM, topo - 42, self.LARGURA - self.MARGEM, topo - 42))
+        self._cabecalho = cab.getvalue()
+        self._topo_corpo = topo - 60
+
+        # Assinatura ({y} = altura da linha, {y2} = do nome; preenchidos em `gerar`)
+        meio = self.LARGURA / 2
+        resp = _texto_pdf(responsavel)
+        self._assinatura = (b"0.5 w 0 G %.2f {y} m %.2f {y} l S\n" % (meio - 130, meio + 130)
+                            + b"BT 0 g /F2 10 Tf %.2f {y2} Td (%s) Tj ET\n"
+                            % (meio - self.largura(resp, "F2", 10) / 2, _escapar(resp)))
+        self._faixas = {}
+        self._recursos = (b"<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >> "
+                          b"/F2 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >> >> >>")
+
+    # --- PRIMITIVAS DE TEXTO ---
+    def largura(self, dados, fonte, corpo):
+        tabela = self._larg[fonte]
+        return sum(tabela[b] for b in dados) * corpo / 1000.0
+
+    def _texto(self, fonte, corpo, x, y, dados, cinza=0.0):
+        return b"BT %.2f g /%s %d Tf %.2f %.2f Td (%s) Tj ET\n" % (cinza, fonte.encode(), corpo, x, y, _escapar(dados))
+
+    def _linha_centro(self, fonte, corpo, texto, y, cinza=0.0):
+        dados = _texto_pdf(texto)
+        return self._texto(fonte, corpo, (self.LARGURA - self.largura(dados, fonte, corpo)) / 2, y, dados, cinza)
+
+    def quebrar(self, texto, fonte="F1", corpo=10, largura=None):
+        """Quebra em linhas que cabem em `largura` pontos (palavra maior que a linha é cortada)."""
+        largura = largura or self.util
+        espaco = self._larg[fonte][32] * corpo / 1000.0
+        linhas, atual, larg_atual = [], [], 0.0
+        for palavra in _texto_pdf(texto).split(b" "):
+            lp = self.largura(palavra, fonte, corpo)
+            while lp > largura and palavra:  # palavra sozinha não cabe: corta
+                corte = len(palavra)
+                while corte > 1 and self.largura(palavra[:corte], fonte, corpo) > largura:
+                    corte -= 1
+                if atual:
+                    linhas.append(b" ".join(atual))
+                    atual, larg_atual = [], 0.0
+                linhas.append(palavra[:corte])
+                palavra = palavra[corte:]
+                lp = self.largura(palavra, fonte, corpo)
+            if not palavra:
+                continue
+            if atual and larg_atual + espaco + lp > largura:
+                linhas.append(b" ".join(atual))
+                atual, larg_atual = [], 0.0
+            larg_atual += (espaco if atual else 0) + lp
+            atual.append(palavra)
+        if atual:
+            linhas.append(b" ".join(atual))
+        return linhas or [b""]
+
+    def _faixa(self, titulo):
+        """Faixa cinza com borda verde de uma seção (compilada na 1ª vez que aparece)."""
+        if titulo not in self._faixas:
+            m = self.MARGEM
+            self._faixas[titulo] = (
+                b"0.953 0.957 0.965 rg %d {y0} %d 20 re f 0.063 0.725 0.506 rg %d {y0} 4 20 re f\n" % (m, self.util, m)
+                + b"BT 0 g /F2 11 Tf %d {y1} Td (%s) Tj ET\n" % (m + 10, _escapar(_texto_pdf(titulo)))
+            )
+        return self._faixas[titulo]
+
+    # --- MONTAGEM ---
+    def gerar(self, dados):
+        """Dict de `dados_receita` -> bytes do PDF."""
+        paginas = [[self._cabecalho]]
+        y = self._topo_corpo
+        m = self.MARGEM
+
+        def reservar(altura):
+            nonlocal y
+            if y - altura < self.MARGEM + self.RODAPE:
+                paginas.append([])
+                y = self.ALTURA - self.MARGEM
+
+        def linha(texto_bytes, fonte="F1", corpo=10, recuo=0, cinza=0.0, entrelinha=14):
+            nonlocal y
+            reservar(entrelinha)
+            y -= entrelinha
+            paginas[-1].append(self._texto(fonte, corpo, m + recuo, y, texto_bytes, cinza))
+
+        def paragrafo(texto, recuo=0, fonte="F1", corpo=10, cinza=0.0):
+            for l in self.quebrar(texto, fonte, corpo, self.util - recuo):
+                linha(l, fonte, corpo, recuo, cinza)
+
+        # Data e local na mesma linha
+        data_txt = _texto_pdf(f"DATA: {dados['data'].strftime('%d/%m/%Y')}")
+        local_txt = _texto_pdf(f"LOCAL: {dados.get('local') or 'Não Informado'}")
+        y -= 14
+        paginas[-1].append(self._texto("F2", 10, m, y, data_txt))
+        paginas[-1].append(self._texto("F2", 10, self.LARGURA - m - self.largura(local_txt, "F2", 10), y, local_txt))
+
+        for n, (titulo, blocos) in enumerate(self._secoes(dados), start=1):
+            reservar(54)
+            y -= 30
+            paginas[-1].append(self._faixa(f"{n}. {titulo}").replace(b"{y0}", b"%.2f" % (y - 6)).replace(b"{y1}", b"%.2f" % y))
+            y -= 6
+            for tipo, valor in blocos:
+                if tipo == "campos":
+                    paragrafo("   ".join(f"{k}: {v}" for k, v in valor))
+                elif tipo == "item":
+                    paragrafo(valor, fonte="F2")
+                elif tipo == "sub":
+                    paragrafo(valor, recuo=12, corpo=9, cinza=0.25)
+                else:
+                    paragrafo(valor)
+
+        # Assinatura no fim (página nova se não couber)
+        reservar(self.ASSINATURA)
+        y -= self.ASSINATURA - 20
+        paginas[-1].append(self._assinatura.replace(b"{y}", b"%.2f" % y).replace(b"{y2}", b"%.2f" % (y - 14)))
+
+        total = len(paginas)
+        ident = f"Receituário {dados['data'].strftime('%d/%m/%Y')}" + (f" · Talhão {dados['talhao']}" if _tem(dados.get("talhao")) else "")
+        for i, conteudo in enumerate(paginas, start=1):
+            rodape = _texto_pdf(f"{ident} · Página {i}/{total}")
+            conteudo.append(self._texto("F1", 8, self.LARGURA - m - self.largura(rodape, "F1", 8), self.MARGEM - 20, rodape, 0.4))
+        return self._montar_pdf([b"".join(c) for c in paginas], dados)
+
+    @staticmethod
+    def _secoes(dados):
+        ident = [("Cultura", dados["cultura"]), ("Genética", dados["variedade"])]
+        estadio = [("Estádio", dados["fase"])]
+        if _tem(dados.get("talhao")):
+            estadio.append(("Talhão", dados["talhao"]))
+        if _tem(dados.get("plantio")):
+            estadio.append(("Plantio", dados["plantio"]))
+        secoes = [
+            ("IDENTIFICAÇÃO", [("campos", ident), ("campos", estadio)]),
+            ("DIAGNÓSTICO", [("texto", dados["diagnostico"])]),
+            ("PRESCRIÇÃO", [("texto", dados["prescricao"])]),
+        ]
+        if dados["produtos"]:
+            blocos = []
+            for p in dados["produtos"]:
+                grupo = f" · {p['grupo']}" if p["grupo"] else ""
+                blocos.append(("item", f"{p['alvo']}: {p['ativo']} ({p['tipo']}{grupo})"))
+                blocos.append(("sub", f"Estratégia: {p['estrategia']}"))
+            secoes.append(("PROTOCOLO DE PRODUTOS", blocos))
+        if dados.get("clima"):
+            c = dados["clima"]
+            blocos = [("campos", [("Temperatura", f"{c['temp']:.1f} °C"), ("Umidade", f"{c['umid']:.0f}%"),
+                                  ("Delta T", f"{c['delta_t']:.1f} °C ({_limpar(c['status_delta_t'])})"), ("VPD", f"{c['vpd']:.2f} kPa")])]
+            if c.get("janela"):
+                blocos.append(("texto", f"Próxima janela apta: {c['janela']}"))
+            secoes.append(("CONDIÇÕES DE APLICAÇÃO", blocos))
+        secoes.append(("OBSERVAÇÕES", [("texto", dados.get("obs") or "-")]))
+        return secoes
+
+    def _montar_pdf(self, conteudos, dados):
+        objs = [None, None]  # 1: catálogo, 2: árvore de páginas (preenchidos no fim)
+        paginas = []
+        for c in conteudos:
+            z = zlib.compress(c, 6)
+            objs.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(z), z))
+            objs.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>"
+                        % (self.LARGURA, self.ALTURA, self._recursos, len(objs)))
+            paginas.append(len(objs))
+        objs[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+        objs[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % p for p in paginas), len(paginas))
+        titulo = _escapar(_texto_pdf(f"Receituário - {dados['cultura']} - {dados['fase']}"))
+        objs.append(b"<< /Title (%s) /Producer (AGRO SDI) /CreationDate (D:%s) >>" % (titulo, dados["data"].strftime("%Y%m%d").encode()))
+
+        saida = io.BytesIO()
+        saida.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, corpo in enumerate(objs, start=1):
+            offsets.append(saida.tell())
+            saida.write(b"%d 0 obj\n%s\nendobj\n" % (i, corpo))
+        xref = saida.tell()
+        saida.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1))
+        saida.write(b"".join(b"%010d 00000 n \n" % o for o in offsets))
+        saida.write(b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, len(objs), xref))
+        return saida.getvalue()
+
+    def gravar(self, dados, pasta):
+        """Gera e grava em `pasta` (arquivo temporário + rename: nunca fica PDF pela metade)."""
+        destino = Path(pasta) / nome_arquivo(dados)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_suffix(".pdf.tmp")
+        tmp.write_bytes(self.gerar(dados))
+        os.replace(tmp, destino)
+        return destino
+
+
+def dados_receita(cultura, variedade, fase, dados_fase, local=None, obs="", talhao=None, plantio=None, clima=None, data=None):
+    """
+    Normaliza as entradas do documento (mesmo formato na tela e no lote).
+    `dados_fase` é o nó da fase no banco (desc, manejo, quimica);
+    `clima` (opcional): temp, umid, delta_t, status_delta_t, vpd, janela.
+    """
+    produtos = [{
+        "alvo": p.get("Alvo") or "Alvo Biológico", "ativo": p.get("Ativo") or "Ingrediente não informado",
+        "tipo": p.get("Tipo") or "Geral", "grupo": p.get("Grupo") or "",
+        "estrategia": p.get("Estrategia") or "Seguir recomendação de bula.",
+    } for p in (dados_fase.get("quimica") or [])]
+    return {
+        "data": data or date.today(), "local": local, "talhao": talhao, "plantio": plantio,
+        "cultura": cultura, "variedade": variedade, "fase": fase,
+        "diagnostico": dados_fase.get("desc") or PADRAO_INFO, "prescricao": dados_fase.get("manejo") or PADRAO_INFO,
+        "produtos": produtos, "clima": clima, "obs": obs,
+    }
+
+
+def nome_arquivo(dados):
+    partes = [dados["data"].isoformat(), dados.get("talhao"), dados["cultura"], dados["fase"]]
+    nome = "_".join(str(p) for p in partes if _tem(p))
+    nome = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode()
+    return "receita_" + re.sub(r"[^A-Za-z0-9_.-]+", "-", nome).strip("-") + ".pdf"
+
+
+# Modelo compilado do processo (na tela e em cada worker do lote)
+MODELO = ModeloReceita()
@@ -1,177 +1,287 @@
 # ARQUIVO: styles.py
-# VERSÃO: AGRO SDI ENTERPRISE SKIN (Visual Militar/Tech)
+# VERSÃO: AGRO SDI ENTERPRISE SKIN (Visual Militar/Tech) - pacote CSS estático com fontes locais
+"""
+A folha de estilo é montada uma vez num arquivo estático com hash do conteúdo
+no nome (static/agro.<hash>.css), com as fontes servidas da própria aplicação
+(static/fonts). A página só recebe, a cada rerun, uma tag <style> de uma linha
+que importa esse arquivo; o navegador guarda CSS e fontes no cache HTTP.
+Mudou o CSS, muda o nome: o arquivo antigo nunca é servido no lugar do novo,
+então um proxy na frente pode marcar /app/static/agro.* e /app/static/fonts/*
+como `Cache-Control: public, max-age=31536000, immutable` (a rota de estáticos
+do Streamlit não envia Cache-Control próprio).
+
+Requer `server.enableStaticServing = true` (.streamlit/config.toml). Sem isso,
+cai na injeção inline de antes (ainda sem depender de fontes externas).
+
+Uso: python styles.py  -> (re)gera o pacote e mostra o nome do arquivo.
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
 
 import streamlit as st
 
+BASE_DIR = Path(__file__).parent.resolve()
+STATIC_DIR = BASE_DIR / "static"
+PREFIXO_BUNDLE = "agro."
+
+# (família, peso, arquivo em static/). Só entram no pacote os arquivos presentes;
+# sem o arquivo, a família cai no próximo nome da pilha (ex: Montserrat -> Roboto).
+FONTES = [
+    ("Roboto", 300, "fonts/roboto-latin-300.woff2"),
+    ("Roboto", 400, "fonts/roboto-latin-400.woff2"),
+    ("Roboto", 500, "fonts/roboto-latin-500.woff2"),
+    ("Roboto", 700, "fonts/roboto-latin-700.woff2"),
+    ("Roboto", 900, "fonts/roboto-latin-900.woff2"),
+    ("Montserrat", 800, "fonts/montserrat-latin-800.woff2"),
+    ("Montserrat", 900, "fonts/montserrat-latin-900.woff2"),
+]
+UNICODE_LATIN = ("U+0000-00FF, U+0131, U+0152-0153, U+02BB-02BC, U+02C6, U+02DA, U+02DC, U+0304, U+0308, "
+                 "U+0329, U+2000-206F, U+20AC, U+2122, U+2191, U+2193, U+2212, U+2215, U+FEFF, U+FFFD")
+
+CSS = """
+/* 1. FONTES: @font-face gerado por montar_css() a partir de static/fonts (sem rede) */
+
+/* Configuração Base */
+html, body, [class*="css"] { 
+    font-family: 'Roboto', sans-serif; 
+    color: #1f2937; /* Cinza Chumbo */
+    background-color: #f3f4f6; /* Cinza Névoa */
+}
+
+/* 2. HEADER DA MARCA (AGRO SDI) */
+.brand-container {
+    background: linear-gradient(120deg, #064e3b 0%, #111827 100%); /* Verde Floresta -> Preto Noturno */
+    padding: 45px 40px; 
+    border-radius: 12px; 
+    margin-bottom: 30px;
+    color: white; 
+    position: relative;
+    overflow: hidden;
+    box-shadow: 0 10px 25px rgba(0,0,0,0.2);
+    border-bottom: 4px solid #10b981; /* Linha Verde Neon */
+}
+
+/* Título da Marca */
+.brand-title {
+    font-family: 'Montserrat', 'Roboto', sans-serif; 
+    font-size: 3.5rem; 
+    font-weight: 900;
+    letter-spacing: -2px; 
+    margin: 0; 
+    line-height: 1;
+    text-shadow: 0 4px 12px rgba(0,0,0,0.4);
+}
+
+.brand-accent { color: #34d399; } /* Verde Esmeralda Claro */
+
+.brand-subtitle {
+    font-family: 'Roboto', sans-serif; 
+    font-size: 0.95rem; 
+    letter-spacing: 4px;
+    text-transform: uppercase; 
+    color: #d1fae5; 
+    margin-top: 8px;
+    font-weight: 500;
+    border-left: 3px solid #34d399;
+    padding-left: 15px;
+}
+
+/* 3. CONTAINER PADRÃO (CARD BRANCO) */
+.app-card {
+    background: white; 
+    border-radius: 10px; 
+    padding: 25px;
+    box-shadow: 0 2px 8px rgba(0,0,0,0.06);
+    border: 1px solid #e5e7eb; 
+    margin-bottom: 25px;
+}
+
+/* 4. KPI COCKPIT (Geração via AgroBrain) */
+.kpi-grid {
+    display: grid;
+    grid-template-columns: repeat(4, minmax(0, 1fr));
+    gap: 1rem;
+    margin-bottom: 1rem;
+}
+@media (max-width: 900px) {
+    .kpi-grid { grid-template-columns: repeat(2, minmax(0, 1fr)); }
+}
+
+.kpi-box {
+    background: white; 
+    border-radius: 12px; 
+    padding: 0;
+    border: 1px solid #e2e8f0; 
+    overflow: hidden;
+    box-shadow: 0 4px 6px -1px rgba(0,0,0,0.05);
+    transition: transform 0.2s ease-in-out;
+    height: 100%; /* Garante altura igual */
+}
+.kpi-box:hover { 
+    transform: translateY(-4px); 
+    box-shadow: 0 10px 15px -3px rgba(0,0,0,0.1);
+    border-color: #94a3b8;
+}
+
+.kpi-header {
+    background: #f8fafc; 
+    padding: 14px 16px; 
+    font-size: 0.8rem;
+    font-weight: 700; 
+    color: #64748b; 
+    text-transform: uppercase; 
+    letter-spacing: 1px;
+    border-bottom: 1px solid #f1f5f9;
+}
+
+.kpi-value {
+    padding: 15px 20px 5px 20px; 
+    font-family: 'Montserrat', 'Roboto', sans-serif;
+    font-size: 2.6rem; 
+    font-weight: 800; 
+    color: #111827;
+    line-height: 1.1;
+}
+
+.kpi-unit { 
+    font-size: 1.1rem; 
+    color: #9ca3af; 
+    font-weight: 500; 
+    margin-left: 4px;
+}
+
+.kpi-footer {
+    padding: 10px 16px; 
+    font-size: 0.85rem; 
+    font-weight: 700; 
+    color: white; 
+    letter-spacing: 0.5px;
+}
+
+/* 5. ABAS (TABS) ENTERPRISE */
+/* Remove o estilo padrão e aplica um estilo de botão tátil */
+div[data-baseweb="tab-list"] {
+    gap: 8px;
+    background-color: transparent;
+    padding-bottom: 5px;
+}
+
+button[data-baseweb="tab"] {
+    font-family: 'Roboto', sans-serif;
+    font-size: 16px !important; 
+    font-weight: 600 !important;
+    padding: 12px 24px !important;
+    background-color: white !important;
+    border: 1px solid #e5e7eb !important;
+    border-radius: 8px !important;
+    color: #6b7280 !important;
+    margin-right: 5px !important;
+    transition: all 0.2s;
+}
+
+button[data-baseweb="tab"]:hover {
+    border-color: #10b981 !important;
+    color: #065f46 !important;
+}
+
+button[data-baseweb="tab"][aria-selected="true"] {
+    background-color: #064e3b !important; /* Verde Escuro Fundo */
+    color: white !important; /* Texto Branco */
+    border-color: #064e3b !important;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1) !important;
+}
+
+/* 6. ELEMENTOS AGRONÔMICOS */
+.section-title {
+    font-size: 1.1rem; 
+    font-weight: 700; 
+    color: #065f46; 
+    border-left: 4px solid #10b981; 
+    padding-left: 10px; 
+    margin-bottom: 15px;
+    margin-top: 10px;
+}
+
+.info-text {
+    font-size: 1rem; 
+    line-height: 1.6; 
+    color: #374151; 
+    text-align: justify;
+}
+
+/* Estilo para tabelas e dataframes */
+[data-testid="stDataFrame"] { 
+    border: 1px solid #e5e7eb; 
+    border-radius: 8px; 
+    overflow: hidden;
+}
+"""
+
+
+def _font_faces(pasta=STATIC_DIR):
+    regras = []
+    for familia, peso, arquivo in FONTES:
+        if not (pasta / arquivo).exists():
+            continue
+        # url relativa ao próprio CSS (app/static/): funciona com ou sem baseUrlPath
+        regras.append(f"@font-face{{font-family:'{familia}';font-style:normal;font-weight:{peso};font-display:swap;"
+                      f"src:url('{arquivo}') format('woff2');unicode-range:{UNICODE_LATIN};}}")
+    return regras
+
+
+def _minificar(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def montar_css(pasta=STATIC_DIR):
+    """Texto final do pacote: @font-face das fontes locais + estilos, minificado."""
+    return "".join(_font_faces(pasta)) + _minificar(CSS)
+
+
+def construir_bundle(pasta=STATIC_DIR):
+    """
+    Grava static/agro.<hash>.css se ainda não existe (pacotes antigos são
+    removidos) e devolve o nome do arquivo. Pasta só leitura: devolve o nome
+    mesmo assim se o arquivo já estiver lá (ex: gerado no build da imagem).
+    """
+    texto = montar_css(pasta)
+    nome = f"{PREFIXO_BUNDLE}{hashlib.sha256(texto.encode('utf-8')).hexdigest()[:12]}.css"
+    destino = pasta / nome
+    if destino.exists():
+        return nome
+    try:
+        pasta.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_suffix(".css.tmp")
+        tmp.write_text(texto, encoding="utf-8")
+        os.replace(tmp, destino)
+        for antigo in pasta.glob(f"{PREFIXO_BUNDLE}*.css"):
+            if antigo.name != nome:
+                antigo.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"⚠️ Pacote CSS não gravado em {pasta}: {e}")
+        return None
+    return nome
+
+
+@st.cache_resource
+def _bundle():
+    """Nome do pacote, resolvido uma vez por processo."""
+    return construir_bundle()
+
+
 def load_css():
-    st.markdown("""
-    <style>
-    /* 1. IMPORTAÇÃO DE FONTES (ROBUSTAS E LEGÍVEIS) */
-    @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700;900&family=Montserrat:wght@800;900&display=swap');
-    
-    /* Configuração Base */
-    html, body, [class*="css"] { 
-        font-family: 'Roboto', sans-serif; 
-        color: #1f2937; /* Cinza Chumbo */
-        background-color: #f3f4f6; /* Cinza Névoa */
-    }
-
-    /* 2. HEADER DA MARCA (AGRO SDI) */
-    .brand-container {
-        background: linear-gradient(120deg, #064e3b 0%, #111827 100%); /* Verde Floresta -> Preto Noturno */
-        padding: 45px 40px; 
-        border-radius: 12px; 
-        margin-bottom: 30px;
-        color: white; 
-        position: relative;
-        overflow: hidden;
-        box-shadow: 0 10px 25px rgba(0,0,0,0.2);
-        border-bottom: 4px solid #10b981; /* Linha Verde Neon */
-    }
-    
-    /* Título da Marca */
-    .brand-title {
-        font-family: 'Montserrat', sans-serif; 
-        font-size: 3.5rem; 
-        font-weight: 900;
-        letter-spacing: -2px; 
-        margin: 0; 
-        line-height: 1;
-        text-shadow: 0 4px 12px rgba(0,0,0,0.4);
-    }
-    
-    .brand-accent { color: #34d399; } /* Verde Esmeralda Claro */
-    
-    .brand-subtitle {
-        font-family: 'Roboto', sans-serif; 
-        font-size: 0.95rem; 
-        letter-spacing: 4px;
-        text-transform: uppercase; 
-        color: #d1fae5; 
-        margin-top: 8px;
-        font-weight: 500;
-        border-left: 3px solid #34d399;
-        padding-left: 15px;
-    }
-
-    /* 3. CONTAINER PADRÃO (CARD BRANCO) */
-    .app-card {
-        background: white; 
-        border-radius: 10px; 
-        padding: 25px;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.06);
-        border: 1px solid #e5e7eb; 
-        margin-bottom: 25px;
-    }
-
-    /* 4. KPI COCKPIT (Geração via AgroBrain) */
-    .kpi-box {
-        background: white; 
-        border-radius: 12px; 
-        padding: 0;
-        border: 1px solid #e2e8f0; 
-        overflow: hidden;
-        box-shadow: 0 4px 6px -1px rgba(0,0,0,0.05);
-        transition: transform 0.2s ease-in-out;
-        height: 100%; /* Garante altura igual */
-    }
-    .kpi-box:hover { 
-        transform: translateY(-4px); 
-        box-shadow: 0 10px 15px -3px rgba(0,0,0,0.1);
-        border-color: #94a3b8;
-    }
-    
-    .kpi-header {
-        background: #f8fafc; 
-        padding: 14px 16px; 
-        font-size: 0.8rem;
-        font-weight: 700; 
-        color: #64748b; 
-        text-transform: uppercase; 
-        letter-spacing: 1px;
-        border-bottom: 1px solid #f1f5f9;
-    }
-    
-    .kpi-value {
-        padding: 15px 20px 5px 20px; 
-        font-family: 'Montserrat', sans-serif;
-        font-size: 2.6rem; 
-        font-weight: 800; 
-        color: #111827;
-        line-height: 1.1;
-    }
-    
-    .kpi-unit { 
-        font-size: 1.1rem; 
-        color: #9ca3af; 
-        font-weight: 500; 
-        margin-left: 4px;
-    }
-    
-    .kpi-footer {
-        padding: 10px 16px; 
-        font-size: 0.85rem; 
-        font-weight: 700; 
-        color: white; 
-        letter-spacing: 0.5px;
-    }
-
-    /* 5. ABAS (TABS) ENTERPRISE */
-    /* Remove o estilo padrão e aplica um estilo de botão tátil */
-    div[data-baseweb="tab-list"] {
-        gap: 8px;
-        background-color: transparent;
-        padding-bottom: 5px;
-    }
-    
-    button[data-baseweb="tab"] {
-        font-family: 'Roboto', sans-serif;
-        font-size: 16px !important; 
-        font-weight: 600 !important;
-        padding: 12px 24px !important;
-        background-color: white !important;
-        border: 1px solid #e5e7eb !important;
-        border-radius: 8px !important;
-        color: #6b7280 !important;
-        margin-right: 5px !important;
-        transition: all 0.2s;
-    }
-    
-    button[data-baseweb="tab"]:hover {
-        border-color: #10b981 !important;
-        color: #065f46 !important;
-    }
-    
-    button[data-baseweb="tab"][aria-selected="true"] {
-        background-color: #064e3b !important; /* Verde Escuro Fundo */
-        color: white !important; /* Texto Branco */
-        border-color: #064e3b !important;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1) !important;
-    }
-
-    /* 6. ELEMENTOS AGRONÔMICOS */
-    .section-title {
-        font-size: 1.1rem; 
-        font-weight: 700; 
-        color: #065f46; 
-        border-left: 4px solid #10b981; 
-        padding-left: 10px; 
-        margin-bottom: 15px;
-        margin-top: 10px;
-    }
-    
-    .info-text {
-        font-size: 1rem; 
-        line-height: 1.6; 
-        color: #374151; 
-        text-align: justify;
-    }
-
-    /* Estilo para tabelas e dataframes */
-    [data-testid="stDataFrame"] { 
-        border: 1px solid #e5e7eb; 
-        border-radius: 8px; 
-        overflow: hidden;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    nome = _bundle() if st.get_option("server.enableStaticServing") else None
+    if nome:
+        # Só estilo: o Streamlit manda para o contêiner de eventos (não ocupa espaço na tela)
+        st.html(f'<style>@import url("app/static/{nome}");</style>')
+    else:
+        st.markdown(f"<style>{_minificar(CSS)}</style>", unsafe_allow_html=True)
+
+
+if __name__ == "__main__":
+    print(f"✅ static/{construir_bundle()} ({len(_font_faces())} fontes locais)")
@@ -0,0 +1,208 @@
+# ARQUIVO: trace_engine.py
+# VERSÃO: Spans de tempo por rerun (p50/p95 por etapa + arquivo JSON-lines)
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+
+class Tracer:
+    """
+    Medição leve de etapas (perf_counter + deque), sempre ligada em produção.
+
+    - `rerun(nome)`: abre o trace de uma execução do script (ou de um lote).
+    - `span(nome)` / `@traced(nome)`: mede uma etapa dentro do trace atual da thread.
+    - Cada etapa guarda as últimas `janela` durações para p50/p95 do processo.
+    - Com `arquivo`, cada trace fechado vira linhas JSON (uma por span).
+    Threads auxiliares (ex: pool do radar) herdam o trace com `contexto()`/`adotar()`.
+    """
+
+    def __init__(self, ativo=True, arquivo=None, janela=500, max_mb=50):
+        self.ativo = ativo
+        self.arquivo = Path(arquivo) if arquivo else None
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._duracoes = defaultdict(lambda: deque(maxlen=janela))
+        self._ultimos = deque(maxlen=20)  # traces fechados recentes (painel de debug)
+
+    # --- CONTEXTO DA THREAD ---
+    def _pilha(self):
+        pilha = getattr(self._local, "pilha", None)
+        if pilha is None:
+            pilha = self._local.pilha = []
+        return pilha
+
+    def contexto(self):
+        """(trace, span pai) da thread atual, para repassar a outra thread."""
+        return getattr(self._local, "trace", None), (self._pilha()[-1] if self._pilha() else None)
+
+    @contextmanager
+    def adotar(self, contexto):
+        trace, pai = contexto
+        anterior = getattr(self._local, "trace", None), list(self._pilha())
+        self._local.trace, self._local.pilha = trace, [pai] if pai else []
+        try:
+            yield
+        finally:
+            self._local.trace, self._local.pilha = anterior
+
+    # --- TRACES ---
+    def iniciar(self, nome, **attrs):
+        """Abre um trace na thread (fecha um anterior que ficou aberto, ex: st.stop())."""
+        if not self.ativo:
+            return None
+        if getattr(self._local, "trace", None) is not None:
+            self.finalizar()
+        trace = {"id": uuid.uuid4().hex[:12], "nome": nome, "attrs": attrs, "inicio": time.time(),
+                 "t0": time.perf_counter(), "spans": [], "lock": threading.Lock()}
+        self._local.trace = trace
+        self._local.pilha = []
+        return trace
+
+    def finalizar(self):
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return None
+        self._local.trace = None
+        self._local.pilha = []
+        dur = (time.perf_counter() - trace["t0"]) * 1000
+        self._registrar(f"rerun.{trace['nome']}", dur)
+        resumo = {"id": trace["id"], "nome": trace["nome"], "inicio": trace["inicio"], "dur_ms": round(dur, 2),
+                  "attrs": trace["attrs"], "spans": list(trace["spans"])}
+        with self._lock:
+            self._ultimos.append(resumo)
+        self._gravar(resumo)
+        return resumo
+
+    @contextmanager
+    def rerun(self, nome, **attrs):
+        self.iniciar(nome, **attrs)
+        try:
+            yield
+        finally:
+            self.finalizar()
+
+    # --- SPANS ---
+    @contextmanager
+    def span(self, nome, **attrs):
+        if not self.ativo:
+            yield
+            return
+        pilha = self._pilha()
+        pai = pilha[-1] if pilha else None
+        sid = uuid.uuid4().hex[:8]
+        pilha.append(sid)
+        t0 = time.perf_counter()
+        erro = None
+        try:
+            yield
+        except BaseException as e:
+            # st.stop()/st.rerun() também passam por aqui: registra o nome, não trata
+            erro = type(e).__name__
+            raise
+        finally:
+            dur = (time.perf_counter() - t0) * 1000
+            pilha.pop()
+            self._registrar(nome, dur)
+            trace = getattr(self._local, "trace", None)
+            if trace is not None:
+                item = {"span": sid, "pai": pai, "nome": nome, "ini_ms": round((t0 - trace["t0"]) * 1000, 2),
+                        "dur_ms": round(dur, 3), "thread": threading.current_thread().name}
+                if attrs:
+                    item["attrs"] = attrs
+                if erro:
+                    item["erro"] = erro
+                with trace["lock"]:
+                    trace["spans"].append(item)
+
+    def _registrar(self, nome, dur_ms):
+        with self._lock:
+            self._duracoes[nome].append(dur_ms)
+
+    # --- RELATÓRIOS ---
+    def percentis(self):
+        """{etapa: {n, p50, p95, max, ultimo}} em ms, sobre a janela recente de cada etapa."""
+        with self._lock:
+            copia = {k: list(v) for k, v in self._duracoes.items()}
+        out = {}
+        for nome, durs in sorted(copia.items()):
+            arr = np.asarray(durs)
+            out[nome] = {"n": len(arr), "p50": float(np.percentile(arr, 50)), "p95": float(np.percentile(arr, 95)),
+                         "max": float(arr.max()), "ultimo": float(arr[-1])}
+        return out
+
+    def ultimos(self):
+        with self._lock:
+            return list(self._ultimos)
+
+    def limpar(self):
+        with self._lock:
+            self._duracoes.clear()
+            self._ultimos.clear()
+
+    # --- ARQUIVO JSON-LINES ---
+    def _gravar(self, resumo):
+        if self.arquivo is None:
+            return
+        linhas = [{"trace": resumo["id"], "rerun": resumo["nome"], "ts": resumo["inicio"], **s} for s in resumo["spans"]]
+        linhas.append({"trace": resumo["id"], "rerun": resumo["nome"], "ts": resumo["inicio"], "span": "raiz",
+                       "pai": None, "nome": f"rerun.{resumo['nome']}", "ini_ms": 0.0, "dur_ms": resumo["dur_ms"],
+                       "attrs": resumo["attrs"]})
+        texto = "".join(json.dumps(l, ensure_ascii=False, default=str) + "\n" for l in linhas)
+        try:
+            with self._lock:
+                self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+                if self.arquivo.exists() and self.arquivo.stat().st_size > self.max_bytes:
+                    os.replace(self.arquivo, self.arquivo.with_suffix(self.arquivo.suffix + ".1"))
+                with open(self.arquivo, "a", encoding="utf-8") as f:
+                    f.write(texto)
+        except OSError as e:
+            print(f"⚠️ Trace não gravado em {self.arquivo}: {e}")
+
+
+def traced(nome):
+    """Decorador: mede a função como um span de `TRACER`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(nome):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def percentis_de_arquivo(caminho):
+    """p50/p95 por etapa a partir de um arquivo JSON-lines (análise offline)."""
+    duracoes = defaultdict(list)
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                reg = json.loads(linha)
+            except ValueError:
+                continue
+            duracoes[reg["nome"]].append(reg["dur_ms"])
+    return {nome: {"n": len(d), "p50": float(np.percentile(d, 50)), "p95": float(np.percentile(d, 95)),
+                   "max": float(max(d))} for nome, d in sorted(duracoes.items())}
+
+
+# Instância do processo (env AGRO_TRACE=0 desliga; AGRO_TRACE_FILE grava JSON-lines)
+TRACER = Tracer(
+    ativo=os.environ.get("AGRO_TRACE", "1") != "0",
+    arquivo=os.environ.get("AGRO_TRACE_FILE") or None,
+    janela=int(os.environ.get("AGRO_TRACE_JANELA", 500)),
+)
+
+if __name__ == "__main__":
+    # Uso: python trace_engine.py traces.jsonl  -> p50/p95 por etapa
+    import sys
+
+    for etapa, m in percentis_de_arquivo(sys.argv[1] if len(sys.argv) > 1 else os.environ["AGRO_TRACE_FILE"]).items():
+        print(f"{etapa:<40} n={m['n']:<6} p50={m['p50']:9.2f} ms  p95={m['p95']:9.2f} ms  max={m['max']:9.2f} ms")
@@ -0,0 +1,131 @@
+# ARQUIVO: vision_engine.py
+# VERSÃO: Diagnóstico por imagem (Gemini via REST) com imagem reduzida, cache e timeout
+import base64
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from cache_engine import TTLCache, env_float
+from http_engine import HttpTransport, TransportError
+from trace_engine import traced
+
+
+class VisionConn:
+    """
+    Caminho da aba IA VISION.
+
+    - A foto é reduzida (lado maior <= LADO_MAX) e recomprimida em JPEG antes do envio.
+    - Uma sessão HTTP por processo (keep-alive) fala direto com a API REST do modelo;
+      a chave vai no cabeçalho, então não há estado global por chave para configurar.
+    - Respostas em cache por hash do conteúdo da imagem + cultura + fase + modelo:
+      a mesma foto não é reanalisada a cada interação com a tela.
+    - Prazo duro (TIMEOUT_TOTAL) contado antes do preparo da foto (decodificar e
+      reduzir um arquivo grande entra na conta); se o modelo responder depois,
+      o resultado ainda entra no cache para a próxima tentativa. O timeout e os
+      retries do HTTP saem do que resta do prazo (`orcamento_http`).
+    """
+
+    BASE_URL = os.environ.get("AGRO_VISION_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+    MODELO = os.environ.get("AGRO_VISION_MODEL", "gemini-1.5-flash")
+
+    LADO_MAX = int(env_float("AGRO_VISION_LADO_MAX", 1024))
+    QUALIDADE_JPEG = int(env_float("AGRO_VISION_QUALIDADE", 80))
+    TIMEOUT_TOTAL = env_float("AGRO_VISION_TIMEOUT", 25)
+    # Tentativas do generateContent: o que sobra do prazo após o preparo é repartido
+    # entre elas, então um retry iniciado sempre cabe em TIMEOUT_TOTAL
+    TENTATIVAS = 2
+    MIN_POR_TENTATIVA = 3.0  # abaixo disso por tentativa, usa uma tentativa só
+
+    CACHE = TTLCache(
+        ttl=env_float("AGRO_VISION_TTL", 24 * 3600),
+        max_size=int(env_float("AGRO_VISION_CACHE_SIZE", 256)),
+        nome="visao",
+    )
+    HTTP = HttpTransport(endpoints={"visao": {"timeout": 10, "retries": 1}}, pool_maxsize=4)
+    _pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="visao")
+
+    PROMPT = ("Atue como um Doutor em Agronomia. Cultura: {cultura}, Fase: {fase}. Analise a imagem. "
+              "1. Identifique o problema. 2. Explique a causa. 3. Sugira controle químico (ingredientes ativos) e biológico.")
+
+    @staticmethod
+    @traced("visao.preparar_imagem")
+    def preparar_imagem(dados, lado_max=None, qualidade=None):
+        """Bytes da foto -> JPEG reduzido (orientação EXIF aplicada, sem metadados)."""
+        from PIL import Image, ImageOps  # só quem analisa imagem paga o import
+
+        lado_max = lado_max or VisionConn.LADO_MAX
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(dados)))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((lado_max, lado_max), Image.LANCZOS)
+        saida = io.BytesIO()
+        img.save(saida, format="JPEG", quality=qualidade or VisionConn.QUALIDADE_JPEG, optimize=True)
+        return saida.getvalue()
+
+    @staticmethod
+    def chave_cache(dados, cultura, fase):
+        return (hashlib.sha256(dados).hexdigest(), str(cultura), str(fase), VisionConn.MODELO)
+
+    @staticmethod
+    @traced("visao.gerar")
+    def _gerar(api_key, jpeg, cultura, fase, timeout=None, retries=None):
+        """Chamada ao generateContent (levanta TransportError/KeyError)."""
+        corpo = {"contents": [{"parts": [
+            {"text": VisionConn.PROMPT.format(cultura=cultura, fase=fase)},
+            {"inline_data": {"mime_type": "image/jpeg", "data": base64.b64encode(jpeg).decode("ascii")}},
+        ]}]}
+        r = VisionConn.HTTP.post_json("visao", f"{VisionConn.BASE_URL}/models/{VisionConn.MODELO}:generateContent",
+                                      corpo, headers={"x-goog-api-key": api_key}, timeout=timeout, retries=retries)
+        partes = r["candidates"][0]["content"]["parts"]
+        return "\n".join(p["text"] for p in partes if "text" in p)
+
+    @staticmethod
+    def orcamento_http(restante):
+        """(timeout por tentativa, retries) que cabem em `restante` segundos, já contando o backoff."""
+        tentativas = VisionConn.TENTATIVAS
+        while tentativas > 1 and restante / tentativas < VisionConn.MIN_POR_TENTATIVA:
+            tentativas -= 1
+        # Backoff do transporte: no máximo backoff_base * 2^i antes da tentativa i+1
+        espera = sum(min(VisionConn.HTTP.backoff_max, VisionConn.HTTP.backoff_base * 2 ** i) for i in range(tentativas - 1))
+        return max(0.1, (restante - espera) / tentativas), tentativas - 1
+
+    @staticmethod
+    def _analisar(api_key, dados, cultura, fase, res, prazo):
+        """Preparo da foto + chamada ao modelo, numa tarefa só (o prazo cobre as duas etapas)."""
+        jpeg = VisionConn.preparar_imagem(dados)
+        res["bytes_enviado"] = len(jpeg)
+        timeout, retries = VisionConn.orcamento_http(prazo - time.monotonic())
+        return VisionConn._gerar(api_key, jpeg, cultura, fase, timeout=timeout, retries=retries)
+
+    @staticmethod
+    @traced("visao.diagnosticar")
+    def diagnosticar(api_key, dados, cultura, fase):
+        """
+        Parecer para a foto. Devolve dict com 'texto' (None em falha), 'erro',
+        'cache' (True se veio do cache), 'bytes_original' e 'bytes_enviado'.
+        """
+        res = {"texto": None, "erro": None, "cache": True, "bytes_original": len(dados), "bytes_enviado": 0}
+        chave = VisionConn.chave_cache(dados, cultura, fase)
+
+        def carregar():
+            res["cache"] = False
+            prazo = time.monotonic() + VisionConn.TIMEOUT_TOTAL
+            fut = VisionConn._pool.submit(VisionConn._analisar, api_key, dados, cultura, fase, res, prazo)
+
+            def guardar_atrasada(f):
+                # Resposta que chega depois do prazo ainda alimenta o cache (a próxima tentativa sai na hora)
+                if f.exception() is None and f.result():
+                    VisionConn.CACHE.guardar(chave, f.result())
+            fut.add_done_callback(guardar_atrasada)
+            return fut.result(timeout=VisionConn.TIMEOUT_TOTAL)
+
+        try:
+            res["texto"] = VisionConn.CACHE.get_or_load(chave, carregar, valido=bool)
+        except FuturesTimeout:
+            res["erro"] = f"O modelo não respondeu em {VisionConn.TIMEOUT_TOTAL:.1f}s. Tente novamente em instantes."
+        except (TransportError, KeyError, IndexError, TypeError, OSError) as e:
+            print(f"⚠️ Diagnóstico por imagem falhou: {e}")
+            res["erro"] = "Erro na comunicação com a IA."
+        return res
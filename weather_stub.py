@@ -0,0 +1,369 @@
+# ARQUIVO: weather_stub.py
+# VERSÃO: Servidor local que imita o OpenWeather (fixtures gravadas ou gerador sintético)
+"""
+Substituto local do OpenWeather para teste de carga, reprodução de um dia ruim
+e uso em laboratório sem internet. Atende os mesmos caminhos usados pelo app:
+
+    /geo/1.0/direct?q=...        /data/2.5/forecast?lat=&lon=     /data/2.5/weather?lat=&lon=
+
+e, para a aba IA VISION, o modelo de visão (POST):
+
+    /v1beta/models/<modelo>:generateContent
+
+Uso:
+    python weather_stub.py --porta 8765 [--latencia-ms 120 --jitter-ms 40]
+        [--taxa-erro 0.05] [--limite-rps 20] [--fixtures gravacoes/]
+        [--gravar gravacoes/ --upstream https://api.openweathermap.org]
+        [--cenario normal|calor|chuvoso] [--agora 1767225600]
+
+Aponte o app para ele com:
+    AGRO_WEATHER_BASE_URL=http://127.0.0.1:8765/data/2.5
+    AGRO_GEO_BASE_URL=http://127.0.0.1:8765/geo/1.0
+    AGRO_VISION_BASE_URL=http://127.0.0.1:8765/v1beta
+
+Fixtures: <pasta>/<endpoint>/<chave>.json, onde a chave é a célula da grade
+(geo_engine.GRID) para forecast/weather e o nome normalizado para geo. Sem
+fixture, responde com o gerador sintético (determinístico por célula e horário),
+a não ser com --estrito (404). GET /__stats devolve os contadores do servidor.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from geo_engine import GRID
+
+CENARIOS = {
+    # temp média, amplitude diária, umidade média, prob. de chuva por ponto
+    "normal": (24.0, 8.0, 65.0, 0.2),
+    "calor": (33.0, 9.0, 30.0, 0.02),     # Delta T alto / VPD alto o dia todo
+    "chuvoso": (21.0, 4.0, 92.0, 0.7),    # Delta T baixo, chuva frequente
+}
+
+
+def _seed(*partes):
+    return int(hashlib.sha1("|".join(map(str, partes)).encode()).hexdigest()[:12], 16)
+
+
+def _normalizar_nome(texto):
+    return re.sub(r"[^a-z0-9]+", "_", str(texto).casefold()).strip("_") or "vazio"
+
+
+# --- GERADOR SINTÉTICO ---
+def _ponto(lat, lon, dt, fuso, cenario, rng):
+    t_med, amp, u_med, p_chuva = CENARIOS.get(cenario, CENARIOS["normal"])
+    hora = ((dt + fuso) % 86400) / 3600
+    ciclo = math.sin((hora - 9) / 24 * 2 * math.pi)  # máx ~15h, mín ~3h
+    # Latitude mexe na média (mais frio longe do equador)
+    temp = t_med - abs(lat) * 0.15 + amp * ciclo + rng.uniform(-1.5, 1.5)
+    umid = min(100, max(8, u_med - 18 * ciclo + rng.uniform(-6, 6)))
+    item = {
+        "dt": int(dt),
+        "main": {"temp": round(temp, 2), "humidity": int(umid)},
+        "wind": {"speed": round(rng.uniform(0.5, 6.0), 2)},
+        "weather": [{"description": "céu limpo"}],
+    }
+    if rng.random() < p_chuva:
+        item["rain"] = {"3h": round(rng.uniform(0.2, 12.0), 1)}
+        item["weather"][0]["description"] = "chuva moderada"
+    return item
+
+
+def gerar_forecast(lat, lon, n_pontos=40, inicio=None, fuso=-10800, cenario="normal", seed=0):
+    """
+    Resposta /forecast no formato do OpenWeather: `n_pontos` de 3h a partir do
+    próximo horário cheio múltiplo de 3h (UTC) de `inicio` (padrão: agora).
+    """
+    inicio = int(time.time() if inicio is None else inicio)
+    inicio = inicio - inicio % 10800 + 10800
+    rng = random.Random(_seed(GRID.celula(lat, lon), inicio, cenario, seed))
+    itens = [_ponto(lat, lon, inicio + i * 10800, fuso, cenario, rng) for i in range(n_pontos)]
+    return {"cod": "200", "message": 0, "cnt": n_pontos, "list": itens,
+            "city": {"name": "Sintético", "coord": {"lat": lat, "lon": lon}, "timezone": fuso}}
+
+
+def gerar_weather(lat, lon, agora=None, fuso=-10800, cenario="normal", seed=0):
+    """Resposta /weather (tempo atual); muda a cada 10 min como o serviço real."""
+    agora = int(time.time() if agora is None else agora)
+    bloco = agora - agora % 600
+    rng = random.Random(_seed(GRID.celula(lat, lon), bloco, cenario, seed, "w"))
+    item = _ponto(lat, lon, bloco, fuso, cenario, rng)
+    r = {"coord": {"lat": lat, "lon": lon}, "weather": item["weather"], "main": item["main"],
+         "wind": item["wind"], "dt": bloco, "timezone": fuso, "cod": 200}
+    if "rain" in item:
+        r["rain"] = {"1h": round(item["rain"]["3h"] / 3, 1)}
+    return r
+
+
+def gerar_geo(nome):
+    """Geocodificação sintética: coordenada estável por nome, dentro do Brasil."""
+    rng = random.Random(_seed(_normalizar_nome(nome)))
+    return [{"name": str(nome), "lat": round(rng.uniform(-30, -3), 4), "lon": round(rng.uniform(-57, -38), 4),
+             "country": "BR"}]
+
+
+def gerar_diagnostico(corpo):
+    """Resposta generateContent sintética: ecoa o contexto do prompt e o tamanho da imagem."""
+    partes = corpo["contents"][0]["parts"]
+    prompt = next((p["text"] for p in partes if "text" in p), "")
+    imagem = next((p["inline_data"]["data"] for p in partes if "inline_data" in p), "")
+    kb = len(imagem) * 3 // 4 // 1024
+    texto = (f"**Diagnóstico (modelo local de teste)**\n\nImagem recebida: ~{kb} KB.\n\n"
+             f"Contexto: {prompt[:160]}\n\n1. Problema: sintoma compatível com mancha foliar.\n"
+             "2. Causa: fungo favorecido por molhamento prolongado.\n3. Controle: fungicida protetor + biológico à base de Bacillus.")
+    return {"candidates": [{"content": {"parts": [{"text": texto}], "role": "model"}, "finishReason": "STOP"}]}
+
+
+# --- SERVIDOR ---
+class WeatherStub:
+    """Estado do servidor: configuração, balde de rate limit, gravação/replay e contadores."""
+
+    ENDPOINTS = {
+        "/geo/1.0/direct": "geo",
+        "/data/2.5/forecast": "forecast",
+        "/data/2.5/weather": "weather",
+    }
+    PREFIXO_VISAO = "/v1beta/models/"
+
+    def __init__(self, latencia_ms=0, jitter_ms=0, taxa_erro=0.0, limite_rps=0, fixtures=None,
+                 gravar=None, upstream=None, estrito=False, cenario="normal", agora=None, seed=0):
+        self.latencia = latencia_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.taxa_erro = taxa_erro
+        self.limite_rps = limite_rps
+        self.fixtures = Path(fixtures) if fixtures else None
+        self.gravar = Path(gravar) if gravar else None
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.estrito = estrito
+        self.cenario = cenario
+        self.agora = agora
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._tokens = float(limite_rps)
+        self._ultimo = time.monotonic()
+        self.contadores = {"total": 0, "ok": 0, "erro_injetado": 0, "limitado": 0, "fixture": 0,
+                           "sintetico": 0, "gravado": 0, "nao_encontrado": 0, "visao": 0}
+
+    def _contar(self, nome):
+        with self._lock:
+            self.contadores[nome] += 1
+
+    def _permitir(self):
+        """Balde de fichas: `limite_rps` requisições/s com rajada do mesmo tamanho."""
+        if not self.limite_rps:
+            return True
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = min(self.limite_rps, self._tokens + (agora - self._ultimo) * self.limite_rps)
+            self._ultimo = agora
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def _sortear(self):
+        with self._lock:
+            atraso = max(0.0, self.latencia + self._rng.uniform(-self.jitter, self.jitter))
+            erro = self._rng.random() < self.taxa_erro
+            codigo = self._rng.choice((500, 502, 503))
+        return atraso, (codigo if erro else None)
+
+    @staticmethod
+    def chave_fixture(endpoint, params):
+        if endpoint == "geo":
+            return _normalizar_nome(params.get("q", ""))
+        return GRID.celula(float(params["lat"]), float(params["lon"]))
+
+    def _caminho_fixture(self, base, endpoint, params):
+        return base / endpoint / f"{self.chave_fixture(endpoint, params)}.json"
+
+    def responder(self, caminho, params):
+        """Devolve (status, corpo) para uma requisição. Inclui latência, erros e limite."""
+        if caminho == "/__stats":
+            with self._lock:
+                return 200, dict(self.contadores)
+        self._contar("total")
+        atraso, erro = self._sortear()
+        if atraso:
+            time.sleep(atraso)
+        endpoint = self.ENDPOINTS.get(caminho)
+        if endpoint is None:
+            self._contar("nao_encontrado")
+            return 404, {"cod": "404", "message": "Internal error"}
+        if not self._permitir():
+            self._contar("limitado")
+            return 429, {"cod": 429, "message": "Your account is temporary blocked due to exceeding of requests limitation"}
+        if erro:
+            self._contar("erro_injetado")
+            return erro, {"cod": erro, "message": "Internal error (injetado)"}
+        try:
+            corpo = self._corpo(endpoint, caminho, params)
+        except (KeyError, ValueError) as e:
+            return 400, {"cod": "400", "message": f"parâmetro inválido: {e}"}
+        if corpo is None:
+            self._contar("nao_encontrado")
+            return 404, {"cod": "404", "message": "fixture não encontrada"}
+        self._contar("ok")
+        return 200, corpo
+
+    def responder_post(self, caminho, corpo):
+        """POST: só o generateContent do modelo de visão (mesma latência/erros/limite)."""
+        self._contar("total")
+        atraso, erro = self._sortear()
+        if atraso:
+            time.sleep(atraso)
+        if not (caminho.startswith(self.PREFIXO_VISAO) and caminho.endswith(":generateContent")):
+            self._contar("nao_encontrado")
+            return 404, {"error": {"code": 404, "message": "not found"}}
+        if not self._permitir():
+            self._contar("limitado")
+            return 429, {"error": {"code": 429, "message": "Resource has been exhausted"}}
+        if erro:
+            self._contar("erro_injetado")
+            return erro, {"error": {"code": erro, "message": "Internal error (injetado)"}}
+        try:
+            resposta = gerar_diagnostico(corpo)
+        except (KeyError, IndexError, TypeError) as e:
+            return 400, {"error": {"code": 400, "message": f"corpo inválido: {e}"}}
+        self._contar("visao")
+        self._contar("ok")
+        return 200, resposta
+
+    def _corpo(self, endpoint, caminho, params):
+        if self.gravar and self.upstream:
+            return self._gravar(endpoint, caminho, params)
+        if self.fixtures:
+            path = self._caminho_fixture(self.fixtures, endpoint, params)
+            if path.exists():
+                self._contar("fixture")
+                return json.loads(path.read_text(encoding="utf-8"))
+            if self.estrito:
+                return None
+        self._contar("sintetico")
+        if endpoint == "geo":
+            return gerar_geo(params.get("q", ""))
+        lat, lon = float(params["lat"]), float(params["lon"])
+        if endpoint == "forecast":
+            return gerar_forecast(lat, lon, inicio=self.agora, cenario=self.cenario, seed=self._seed)
+        return gerar_weather(lat, lon, agora=self.agora, cenario=self.cenario, seed=self._seed)
+
+    def _gravar(self, endpoint, caminho, params):
+        """Repassa ao serviço real e guarda a resposta como fixture (a chave não é gravada)."""
+        import requests  # só o modo de gravação precisa
+
+        r = requests.get(f"{self.upstream}{caminho}?{urlencode(params)}", timeout=10)
+        r.raise_for_status()
+        corpo = r.json()
+        path = self._caminho_fixture(self.gravar, endpoint, params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(corpo, ensure_ascii=False), encoding="utf-8")
+        self._contar("gravado")
+        return corpo
+
+
+def _handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive: o cliente reaproveita a conexão
+
+        def setup(self):
+            super().setup()
+            # Cabeçalho e corpo saem em escritas separadas: sem NODELAY o ACK atrasado soma ~40 ms
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                status, corpo = stub.responder(url.path, params)
+            except Exception as e:
+                status, corpo = 502, {"cod": 502, "message": f"upstream: {type(e).__name__}"}
+            self._enviar(status, corpo)
+
+        def do_POST(self):
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            try:
+                corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+            except ValueError:
+                return self._enviar(400, {"error": {"code": 400, "message": "JSON inválido"}})
+            self._enviar(*stub.responder_post(urlparse(self.path).path, corpo))
+
+        def _enviar(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass  # silencioso: em teste de carga o log custaria mais que a resposta
+
+    return Handler
+
+
+def criar_servidor(stub, host="127.0.0.1", porta=8765):
+    servidor = ThreadingHTTPServer((host, porta), _handler(stub))
+    servidor.daemon_threads = True
+    return servidor
+
+
+def iniciar_em_thread(stub=None, host="127.0.0.1", porta=0):
+    """
+    Sobe o servidor numa thread (porta 0 = livre). Para benchmarks e testes de
+    carga no mesmo processo. Devolve (servidor, base_url_dados, base_url_geo);
+    o modelo de visão responde em http://host:porta/v1beta.
+    """
+    servidor = criar_servidor(stub or WeatherStub(), host, porta)
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="weather-stub").start()
+    h, p = servidor.server_address[:2]
+    return servidor, f"http://{h}:{p}/data/2.5", f"http://{h}:{p}/geo/1.0"
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Agro SDI - servidor local que imita o OpenWeather")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--porta", type=int, default=8765)
+    p.add_argument("--latencia-ms", type=float, default=0, help="Latência média por resposta")
+    p.add_argument("--jitter-ms", type=float, default=0, help="Variação uniforme (+/-) da latência")
+    p.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas 5xx injetadas (0 a 1)")
+    p.add_argument("--limite-rps", type=float, default=0, help="Requisições/s antes de responder 429 (0 = sem limite)")
+    p.add_argument("--fixtures", default=None, help="Pasta de fixtures gravadas (replay)")
+    p.add_argument("--estrito", action="store_true", help="Sem fixture: 404 em vez do gerador sintético")
+    p.add_argument("--gravar", default=None, help="Pasta onde gravar as respostas do --upstream")
+    p.add_argument("--upstream", default=None, help="Serviço real para o modo de gravação")
+    p.add_argument("--cenario", choices=sorted(CENARIOS), default="normal")
+    p.add_argument("--agora", type=int, default=None, help="Epoch fixo do gerador (reprodutível)")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    if args.gravar and not args.upstream:
+        p.error("--gravar exige --upstream")
+
+    stub = WeatherStub(args.latencia_ms, args.jitter_ms, args.taxa_erro, args.limite_rps, args.fixtures,
+                       args.gravar, args.upstream, args.estrito, args.cenario, args.agora, args.seed)
+    servidor = criar_servidor(stub, args.host, args.porta)
+    h, porta = servidor.server_address[:2]
+    print(f"🛰️ OpenWeather local em http://{h}:{porta}")
+    print(f"   AGRO_WEATHER_BASE_URL=http://{h}:{porta}/data/2.5")
+    print(f"   AGRO_GEO_BASE_URL=http://{h}:{porta}/geo/1.0")
+    print(f"   AGRO_VISION_BASE_URL=http://{h}:{porta}/v1beta")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())